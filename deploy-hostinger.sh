@@ -132,6 +132,9 @@ python manage.py collectstatic --noinput
 python manage.py create_admin
 
 # Create Gunicorn service
+# Sync (WSGI) workers: the mensagens page polls get_messages_api every MESSAGE_POLL_INTERVAL_SECONDS and no
+# request waits for new messages. For Server-Sent Events serve setup.asgi:application with
+# -k uvicorn.workers.UvicornWorker instead (see setup/asgi.py and HOSTINGER_DEPLOYMENT_GUIDE.md).
 print_status "Setting up Gunicorn service..."
 cat > /etc/systemd/system/innovasus.service << EOF
 [Unit]
@@ -151,10 +154,33 @@ Restart=always
 WantedBy=multi-user.target
 EOF
 
-# Start Gunicorn service
+# Create background job worker service
+# E-mails, upload processing and file cleanup are queued (feed/jobs.py) and only run by run_jobs;
+# settings_hostinger.py leaves JOB_QUEUE_EAGER off because this worker is installed.
+print_status "Setting up background job worker..."
+cat > /etc/systemd/system/innovasus-jobs.service << EOF
+[Unit]
+Description=InnovaSus background jobs
+After=network.target mysql.service
+
+[Service]
+User=www-data
+Group=www-data
+WorkingDirectory=/var/www/innovasus
+Environment="PATH=/var/www/innovasus/venv/bin"
+EnvironmentFile=/var/www/innovasus/.env.production
+ExecStart=/var/www/innovasus/venv/bin/python manage.py run_jobs --prune --max-jobs 1000
+Restart=always
+RestartSec=5
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# Start Gunicorn and worker services
 systemctl daemon-reload
-systemctl start innovasus
-systemctl enable innovasus
+systemctl start innovasus innovasus-jobs
+systemctl enable innovasus innovasus-jobs
 
 # Create Nginx configuration
 print_status "Setting up Nginx..."
@@ -171,12 +197,25 @@ server {
         add_header Cache-Control "public, immutable";
     }
     
+    # Originals of media post files are served only through Django's access check
+    # (feed/protected_media.py); resized images under /media/derivatives/ stay public
+    location /media/media_posts/ {
+        return 404;
+    }
+    
     location /media/ {
         root /var/www/innovasus;
         expires 1y;
         add_header Cache-Control "public";
     }
     
+    # PROTECTED_MEDIA_BACKEND = 'x-accel' (settings_hostinger.py): Django answers with X-Accel-Redirect,
+    # nginx sends the file
+    location /protected-media/ {
+        internal;
+        alias /var/www/innovasus/media/;
+    }
+    
     location / {
         include proxy_params;
         proxy_pass http://unix:/var/www/innovasus/innovasus.sock;
@@ -223,6 +262,7 @@ fi
 # Final status check
 print_status "Checking service status..."
 systemctl status innovasus --no-pager
+systemctl status innovasus-jobs --no-pager
 systemctl status nginx --no-pager
 
 print_status "🎉 Deployment completed successfully!"
@@ -237,4 +277,5 @@ echo "  - Password: InnovaAdmin2025!"
 echo ""
 print_status "To check logs:"
 echo "  - Django: journalctl -u innovasus -f"
+echo "  - Jobs: journalctl -u innovasus-jobs -f"
 echo "  - Nginx: tail -f /var/log/nginx/error.log"
\ No newline at end of file
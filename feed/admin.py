@@ -2,7 +2,11 @@
 
 from django.contrib import admin
 from .article_access_models import ArticleAccess, ArticleAccessRequest
+from .archive_models import ArchivedCommunityMessage, ArchivedMessage
 from .community_message_models import CommunityMessage
+from .file_models import StoredFile
+from .job_models import Job
+from .upload_models import UploadSession
 from .models import MediaPost, MediaLike, MediaComment, MediaFile, MediaAccess, MediaAccessRequest, Product
 
 @admin.register(ArticleAccessRequest)
@@ -18,6 +22,56 @@ class CommunityMessageAdmin(admin.ModelAdmin):
     list_filter = ("community", "user")
 
 
+@admin.register(ArchivedMessage)
+class ArchivedMessageAdmin(admin.ModelAdmin):
+    list_display = ("sender", "recipient", "body", "created_at", "archived_at")
+    search_fields = ("body", "sender__fullname", "recipient__fullname")
+    list_select_related = ("sender", "recipient")
+
+
+@admin.register(ArchivedCommunityMessage)
+class ArchivedCommunityMessageAdmin(admin.ModelAdmin):
+    list_display = ("community", "user", "body", "created_at", "archived_at")
+    search_fields = ("body", "user__fullname", "community__name")
+    list_filter = ("community",)
+
+
+@admin.register(StoredFile)
+class StoredFileAdmin(admin.ModelAdmin):
+    list_display = ("name", "size", "content_type", "width", "height", "exists", "checked_at")
+    search_fields = ("name",)
+    list_filter = ("exists", "content_type")
+    readonly_fields = (
+        "name", "size", "content_type", "checksum", "exists", "width", "height", "variants", "created_at", "checked_at",
+    )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("name", "key", "status", "attempts", "run_at", "locked_by", "finished_at")
+    list_filter = ("status", "name")
+    search_fields = ("key",)
+    readonly_fields = ("created_at", "finished_at", "locked_at", "locked_by", "last_error")
+    actions = ["retry_jobs"]
+
+    @admin.action(description="Executar novamente")
+    def retry_jobs(self, request, queryset):
+        from django.utils import timezone
+
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now(), finished_at=None, last_error="",
+        )
+        self.message_user(request, f"{count} tarefas colocadas na fila novamente.")
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ("filename", "user", "offset", "size", "status", "updated_at")
+    list_filter = ("status",)
+    search_fields = ("filename", "user__email")
+    raw_id_fields = ("user",)
+
+
 @admin.register(MediaPost)
 class MediaPostAdmin(admin.ModelAdmin):
     list_display = ("title", "user", "file_count", "is_paid", "created_at")
@@ -33,6 +87,7 @@ class MediaPostAdmin(admin.ModelAdmin):
     def file_count(self, obj):
         return obj.file_count
     file_count.short_description = "Arquivos"
+    file_count.admin_order_field = "file_total"
 
 
 
@@ -47,10 +102,11 @@ class MediaLikeAdmin(admin.ModelAdmin):
 
 @admin.register(MediaComment)
 class MediaCommentAdmin(admin.ModelAdmin):
-    list_display = ("user", "media_post", "body_preview", "created_at")
+    list_display = ("user", "media_post", "body_preview", "reply_count", "created_at")
     search_fields = ("body", "user__fullname", "media_post__title")
     list_filter = ("created_at", "media_post__user")
     readonly_fields = ("created_at", "updated_at")
+    raw_id_fields = ("parent",)
     
     def body_preview(self, obj):
         return obj.body[:50] + "..." if len(obj.body) > 50 else obj.body
@@ -59,10 +115,10 @@ class MediaCommentAdmin(admin.ModelAdmin):
 
 @admin.register(MediaFile)
 class MediaFileAdmin(admin.ModelAdmin):
-    list_display = ("media_post", "media_type", "get_file_size", "created_at")
+    list_display = ("media_post", "media_type", "video_status", "get_file_size", "created_at")
     search_fields = ("media_post__title",)
-    list_filter = ("media_type", "created_at")
-    readonly_fields = ("created_at", "media_type")
+    list_filter = ("media_type", "video_status", "created_at")
+    readonly_fields = ("created_at", "media_type", "video_status", "video_rendition", "video_poster")
 
 
 @admin.register(MediaAccess)
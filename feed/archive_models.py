@@ -0,0 +1,49 @@
+"""
+Cold storage for old messages.
+
+The archive_messages command moves messages older than
+MESSAGE_ARCHIVE_AFTER_DAYS out of Message and CommunityMessage into these
+tables, so the tables every page view reads stay small. Archived rows keep
+their original id, which lets keyset cursors continue across both tables.
+"""
+from django.conf import settings
+from django.db import models
+
+from .community_message_models import CommunityMessageFileMixin
+from .community_models import Community
+
+
+class ArchivedMessage(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    body = models.TextField()
+    created_at = models.DateTimeField()
+    read = models.BooleanField(default=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['sender', 'recipient', 'created_at', 'id'], name='feed_archmsg_pair_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sender} -> {self.recipient}: {self.body[:30]}"
+
+
+class ArchivedCommunityMessage(CommunityMessageFileMixin, models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='archived_messages')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    body = models.TextField(blank=True)
+    # Same upload_to as CommunityMessage: the file itself is not moved, only the row
+    pdf = models.FileField(upload_to='community_messages/', blank=True, null=True, verbose_name="Arquivo")
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['community', 'created_at'], name='feed_archcommmsg_idx'),
+        ]
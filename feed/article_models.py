@@ -22,6 +22,7 @@ class Article(models.Model):
     research_area = models.CharField(max_length=50, choices=RESEARCH_AREA_CHOICES)
     qualis_capes = models.CharField(max_length=2, choices=QUALIS_CAPES_CHOICES, verbose_name="Qualis Capes", default='A1')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.title} ({self.user.fullname})"
@@ -30,16 +31,7 @@ class Article(models.Model):
         return dict(RESEARCH_AREA_CHOICES).get(self.research_area, 'Desconhecida')
     
     def get_pdf_url(self):
-        """Return the URL of the PDF file if it exists"""
-        if self.pdf:
-            # Check if the file actually exists on disk
-            try:
-                if self.pdf.storage.exists(self.pdf.name):
-                    return self.pdf.url
-                else:
-                    # File doesn't exist (maybe moved to iCloud), return None
-                    return None
-            except:
-                # Any error accessing the file, return None
-                return None
-        return None
+        """Return the URL of the PDF file, or None if it is known to be missing (see feed/file_metadata.py)"""
+        from .file_metadata import file_url
+
+        return file_url(self.pdf)
@@ -6,7 +6,8 @@ from django.http import HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.db.models import Q
 from .community_message_models import CommunityMessage
-from .utils import get_regular_users
+from django.conf import settings
+from .utils import get_archived_community_page, get_regular_users
 
 User = get_user_model()
 
@@ -60,6 +61,23 @@ def community_detail(request, community_id):
     
     # Get messages that have files for the files tab
     messages_with_files = messages.filter(pdf__isnull=False).order_by('-created_at')
+
+    # Archived messages are only read when the user asks for the older history, a page at a time
+    # (?historico=1, then &before_id= the oldest one shown)
+    older_archived_id = None
+    if request.GET.get('historico') == '1':
+        page_size = getattr(settings, 'COMMUNITY_ARCHIVE_PAGE_SIZE', 50)
+        archived, has_older = get_archived_community_page(community, page_size, request.GET.get('before_id'))
+        messages = archived + list(messages)
+        messages_with_files = sorted(
+            [m for m in archived if m.pdf] + list(messages_with_files),
+            key=lambda m: m.created_at, reverse=True,
+        )
+        has_archived_messages = has_older
+        if has_older:
+            older_archived_id = archived[0].id
+    else:
+        has_archived_messages = community.archived_messages.exists()
     
     # For inviting members, get users the current user follows who are not already members
     try:
@@ -74,6 +92,8 @@ def community_detail(request, community_id):
         'community': community,
         'community_messages': messages,
         'community_files': messages_with_files,
+        'has_archived_messages': has_archived_messages,
+        'older_archived_id': older_archived_id,
         'possible_invites': possible_invites,
         'profile_user': request.user,
     })
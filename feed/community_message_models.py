@@ -2,15 +2,8 @@ from django.db import models
 from django.conf import settings
 from .community_models import Community
 
-class CommunityMessage(models.Model):
-    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='messages')
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    body = models.TextField(help_text="Texto da mensagem.", blank=True)
-    pdf = models.FileField(upload_to='community_messages/', blank=True, null=True, verbose_name="Arquivo", help_text="Arquivos permitidos: PDF, imagens, documentos Word, arquivos de texto")
-    created_at = models.DateTimeField(auto_now_add=True)
-
-    class Meta:
-        ordering = ['created_at']
+class CommunityMessageFileMixin:
+    """Attachment helpers shared by CommunityMessage and ArchivedCommunityMessage"""
 
     def __str__(self):
         return f"{self.user.fullname}: {self.body[:30]}{' [Arquivo]' if self.pdf else ''}"
@@ -38,18 +31,12 @@ class CommunityMessage(models.Model):
     
     @property
     def pdf_size(self):
-        """Get PDF file size in human readable format"""
-        if self.pdf and hasattr(self.pdf, 'file'):
-            try:
-                size = self.pdf.size
-                # Convert bytes to human readable format
-                for unit in ['B', 'KB', 'MB', 'GB']:
-                    if size < 1024.0:
-                        return f"{size:.1f} {unit}"
-                    size /= 1024.0
-                return f"{size:.1f} TB"
-            except (OSError, AttributeError):
-                return "Unknown size"
+        """Get PDF file size in human readable format, as recorded at upload"""
+        from .file_metadata import file_size, format_size
+
+        if self.pdf:
+            size = file_size(self.pdf)
+            return format_size(size) if size is not None else "Unknown size"
         return None
     
     def get_pdf_url(self):
@@ -57,3 +44,17 @@ class CommunityMessage(models.Model):
         if self.pdf:
             return self.pdf.url
         return None
+
+
+class CommunityMessage(CommunityMessageFileMixin, models.Model):
+    community = models.ForeignKey(Community, on_delete=models.CASCADE, related_name='messages')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    body = models.TextField(help_text="Texto da mensagem.", blank=True)
+    pdf = models.FileField(upload_to='community_messages/', blank=True, null=True, verbose_name="Arquivo", help_text="Arquivos permitidos: PDF, imagens, documentos Word, arquivos de texto")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['community', 'created_at'], name='feed_commmsg_community_idx'),
+        ]
@@ -6,13 +6,14 @@ class Community(models.Model):
     description = models.TextField(blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="created_communities")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     members = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="joined_communities", blank=True)
     community_pic = models.ImageField(upload_to='community_pics/', blank=True, null=True)
 
     def __str__(self):
         return self.name
 
-    def get_community_picture_url(self):
-        if self.community_pic:
-            return self.community_pic.url
-        return settings.STATIC_URL + "assets/img/no_pic.jpg"
+    def get_community_picture_url(self, size=None):
+        from .images import image_url
+
+        return image_url(self.community_pic, size) or settings.STATIC_URL + "assets/img/no_pic.jpg"
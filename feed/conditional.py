@@ -0,0 +1,88 @@
+"""
+Conditional GET (ETag / Last-Modified) for feed pages and JSON endpoints.
+
+A validator returns (state, last_modified) for what a view is about to send,
+computed from one or two small queries: typically the row count and newest
+change of the listed rows, plus, for HTML pages, the viewer's page chrome
+(topbar badge and right sidebar, see viewer_state). The conditional decorator
+hashes the state into an ETag and answers 304 while the client's
+If-None-Match still matches, before the view builds its body.
+
+Last-Modified is sent for information only: deleting a row does not move it,
+so the 304 decision is made on the ETag, which includes the row count.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+
+def make_etag(state):
+    return '"%s"' % hashlib.md5(repr(state).encode(), usedforsecurity=False).hexdigest()
+
+
+def collection_state(queryset, field):
+    """(row count, newest value of field) of queryset, in one aggregate query"""
+    from django.db.models import Count, Max
+
+    result = queryset.order_by().aggregate(rows=Count('pk'), last=Max(field))
+    return result['rows'], result['last']
+
+
+def viewer_state(request):
+    """
+    What the topbar and right sidebar of any feed page show this viewer, or None when the
+    page must be rendered anyway (flash messages are shown once and are not in the state).
+    The session and CSRF secret are part of it: both change at login, and a page kept from
+    before would post a csrfmiddlewaretoken the new secret rejects.
+    """
+    from django.contrib.messages import get_messages
+    from django.middleware.csrf import get_token
+    from .context_processors import unread_message_total
+    from .utils import get_sidebar_data
+
+    if len(get_messages(request)):
+        return None
+    user = request.user
+    sidebar = get_sidebar_data(user)
+    get_token(request)  # Makes sure the secret exists (and its cookie is sent) before it is read
+    return (
+        request.session.session_key, request.META['CSRF_COOKIE'],
+        user.pk, user.fullname, user.profile_picture.name,
+        unread_message_total(request),
+        [(u.pk, u.fullname, u.institution, u.profile_picture.name) for u in sidebar['top_message_users']],
+        [(c.pk, c.name, c.community_pic.name) for c in sidebar['sidebar_communities']],
+    )
+
+
+def conditional(validator):
+    """
+    Answer GET/HEAD with 304 Not Modified when validator(request, *args, **kwargs) matches the
+    client's If-None-Match, and stamp ETag / Last-Modified on full responses. A validator that
+    returns None (e.g. the request is invalid) leaves the view alone.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            validated = validator(request, *args, **kwargs)
+            if validated is None:
+                return view(request, *args, **kwargs)
+            state, last_modified = validated
+            etag = make_etag(state)
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            # Per viewer, and always revalidated so a 304 is never served for changed content
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
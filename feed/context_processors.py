@@ -0,0 +1,34 @@
+"""
+Template context shared by every feed page
+"""
+from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject
+
+
+def unread_message_total(request):
+    """Total unread direct messages of the viewer, queried once per request"""
+    if not request.user.is_authenticated:
+        return 0
+    if not hasattr(request, '_unread_message_total'):
+        from .models import Conversation
+        result = Conversation.objects.filter(user=request.user, unread_count__gt=0).aggregate(total=Sum('unread_count'))
+        request._unread_message_total = result['total'] or 0
+    return request._unread_message_total
+
+
+def unread_messages(request):
+    """Total unread direct messages for the topbar badge, computed only if a template uses it"""
+    return {'unread_message_count': SimpleLazyObject(lambda: unread_message_total(request))}
+
+
+def sidebar(request):
+    """Right sidebar conversations and communities, read from the per-user cache only if a template uses them"""
+    if not request.user.is_authenticated:
+        return {'top_message_users': [], 'sidebar_communities': []}
+
+    from .utils import get_sidebar_data
+    data = SimpleLazyObject(lambda: get_sidebar_data(request.user))
+    return {
+        'top_message_users': SimpleLazyObject(lambda: data['top_message_users']),
+        'sidebar_communities': SimpleLazyObject(lambda: data['sidebar_communities']),
+    }
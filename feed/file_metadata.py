@@ -0,0 +1,185 @@
+"""
+Recording and reading StoredFile rows (see feed/file_models.py).
+
+file_metadata(field_file) answers from, in order: the instance's memo (filled
+in bulk by prefetch_file_metadata), the default cache, then the table. It
+never touches the storage backend. A file without a row (uploaded before the
+table existed and not audited yet) is assumed to exist, as before;
+audit_file_metadata records those.
+"""
+import hashlib
+import mimetypes
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Cached for names without a row, so they are not queried again on every page. Only briefly: the row
+# may be recorded soon after by another worker, whose cache_metadata does not reach this process's cache
+_NO_ROW = 'no-row'
+
+
+def _cache_key(name):
+    return 'file_meta:' + hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()
+
+
+def _cache_seconds():
+    return getattr(settings, 'FILE_METADATA_CACHE_SECONDS', 3600)
+
+
+def _miss_cache_seconds():
+    return min(getattr(settings, 'FILE_METADATA_MISS_CACHE_SECONDS', 60), _cache_seconds())
+
+
+def cache_metadata(meta):
+    cache.set(_cache_key(meta.name), meta, _cache_seconds())
+
+
+def _memo(instance):
+    return instance.__dict__.setdefault('_file_metadata', {})
+
+
+def lookup(names):
+    """{name: StoredFile or None} for these storage names: one cache round trip, one query for the rest"""
+    from .file_models import StoredFile
+
+    keys = {name: _cache_key(name) for name in set(names) if name}
+    cached = cache.get_many(keys.values())
+    found = {name: cached[key] for name, key in keys.items() if key in cached}
+    missing = keys.keys() - found.keys()
+    if missing:
+        rows = {row.name: row for row in StoredFile.objects.filter(name__in=missing)}
+        fetched = {name: rows.get(name, _NO_ROW) for name in missing}
+        cache.set_many({keys[name]: meta for name, meta in fetched.items() if meta != _NO_ROW}, _cache_seconds())
+        cache.set_many({keys[name]: meta for name, meta in fetched.items() if meta == _NO_ROW}, _miss_cache_seconds())
+        found.update(fetched)
+    return {name: None if meta == _NO_ROW else meta for name, meta in found.items()}
+
+
+def prefetch_file_metadata(instances, *fields):
+    """Load the metadata of these FileFields of every instance at once, for the helpers below"""
+    instances = list(instances)
+    found = lookup(getattr(instance, field).name for instance in instances for field in fields)
+    for instance in instances:
+        memo = _memo(instance)
+        for field in fields:
+            name = getattr(instance, field).name
+            if name:
+                memo[name] = found.get(name)
+
+
+def file_metadata(field_file):
+    """StoredFile of a FieldFile, or None if it was never recorded"""
+    if not field_file:
+        return None
+    memo = _memo(field_file.instance)
+    if field_file.name not in memo:
+        memo[field_file.name] = lookup([field_file.name]).get(field_file.name)
+    return memo[field_file.name]
+
+
+def file_url(field_file):
+    """URL of field_file, or None if there is no file or it is known to be missing"""
+    if not field_file:
+        return None
+    meta = file_metadata(field_file)
+    if meta is not None and not meta.exists:
+        return None
+    return field_file.url
+
+
+def file_size(field_file):
+    """Size in bytes as recorded at upload, or None if unknown"""
+    meta = file_metadata(field_file)
+    return meta.size if meta is not None else None
+
+
+def format_size(size):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
+
+
+def record_stored_file(storage, name):
+    """Read a stored file once and save its size, type and checksum; returns the StoredFile"""
+    from .file_models import StoredFile
+
+    digest, size = hashlib.sha256(), 0
+    try:
+        with storage.open(name, 'rb') as f:
+            for chunk in f.chunks():
+                digest.update(chunk)
+                size += len(chunk)
+        values = {'size': size, 'checksum': digest.hexdigest(), 'exists': True}
+    except OSError:
+        values = {'size': None, 'checksum': '', 'exists': False}
+    values['content_type'] = mimetypes.guess_type(name)[0] or ''
+
+    meta, _ = StoredFile.objects.update_or_create(name=name, defaults=values)
+    cache_metadata(meta)
+    return meta
+
+
+def record_file(field_file):
+    meta = record_stored_file(field_file.storage, field_file.name)
+    _memo(field_file.instance)[field_file.name] = meta
+    return meta
+
+
+def ensure_recorded(field_file):
+    """Record field_file unless it already has metadata; called when a model with an upload is saved"""
+    if field_file and file_metadata(field_file) is None:
+        record_file(field_file)
+
+
+def refresh_stored_file(storage, meta):
+    """Re-check existence and size of a recorded file with a stat, without reading it; returns True if it changed"""
+    exists = storage.exists(meta.name)
+    size = storage.size(meta.name) if exists else None
+    if (exists, size) == (meta.exists, meta.size):
+        return False
+    if exists and size != meta.size:
+        # The content changed behind our back; the checksum is re-read on the next --checksums audit
+        meta.checksum = ''
+    meta.exists, meta.size = exists, size
+    meta.save()
+    cache_metadata(meta)
+    return True
+
+
+def forget_stored_file(name):
+    """Drop the row of a file deleted from the storage"""
+    from .file_models import StoredFile
+
+    StoredFile.objects.filter(name=name).delete()
+    cache.delete(_cache_key(name))
+
+
+def is_referenced(name):
+    """True if a FileField of any installed model still points at name"""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    return any(
+        model._default_manager.filter(**{field.name: name}).exists()
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField)
+    )
+
+
+def referenced_file_names():
+    """Yield (model, field, storage name) for every file a FileField of an installed model points at"""
+    from django.apps import apps
+    from django.db.models import FileField
+
+    for model in apps.get_models():
+        for field in model._meta.concrete_fields:
+            if isinstance(field, FileField):
+                names = (
+                    model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+                    .order_by().values_list(field.name, flat=True).distinct().iterator()
+                )
+                for name in names:
+                    yield model, field, name
@@ -0,0 +1,34 @@
+"""
+Metadata of uploaded files, recorded once at upload.
+
+Rendering reads size, type and existence from StoredFile instead of asking
+the storage backend (a stat per file on disk, a HEAD request on S3), and
+image URLs pick a resized derivative from the variants recorded here. Rows
+are keyed by the storage name the FileField holds, so every model's files
+share the table; feed/file_metadata.py records and reads them and the
+audit_file_metadata command re-checks them against the storage.
+"""
+from django.db import models
+
+
+class StoredFile(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    # sha256 of the content, hex
+    checksum = models.CharField(max_length=64, blank=True)
+    exists = models.BooleanField(default=True)
+    # Images only (feed/images.py): original dimensions after EXIF rotation, and the derivatives
+    # written for it as "<size>.<format>"; None until processed, [] if Pillow could not read it
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    checked_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Metadados de Arquivo"
+        verbose_name_plural = "Metadados de Arquivos"
+
+    def __str__(self):
+        return self.name
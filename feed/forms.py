@@ -1,5 +1,6 @@
 from .community_models import Community
 from django import forms
+from django.core.exceptions import ValidationError
 from .models import MediaPost, Product
 from django.forms.widgets import FileInput
 from .constants import RESEARCH_AREA_CHOICES
@@ -7,6 +8,41 @@ from .constants import RESEARCH_AREA_CHOICES
 from .article_models import Article
 
 
+# Media post uploads, checked here and by the chunked upload API (feed/views_upload_api.py)
+MEDIA_MAX_FILES = 10
+MEDIA_MAX_FILE_SIZE = 50 * 1024 * 1024
+MEDIA_MAX_TOTAL_SIZE = 200 * 1024 * 1024
+MEDIA_ALLOWED_TYPES = [
+    # Images
+    'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/bmp', 'image/webp',
+    # Videos
+    'video/mp4', 'video/avi', 'video/mov', 'video/wmv', 'video/quicktime', 'video/webm',
+    # Documents
+    'application/pdf',
+    'application/vnd.openxmlformats-officedocument.presentationml.presentation',  # .pptx
+    'application/vnd.ms-powerpoint',  # .ppt
+]
+MEDIA_ALLOWED_EXTENSIONS = [
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp',
+    '.mp4', '.avi', '.mov', '.wmv', '.webm', '.mkv',
+    '.pdf', '.pptx', '.ppt',
+]
+
+
+def validate_media_file(name, size, content_type):
+    """Raise ValidationError unless a media post may hold this file"""
+    import os
+
+    # Check individual file size (50MB limit)
+    if size > MEDIA_MAX_FILE_SIZE:
+        raise forms.ValidationError(f"O arquivo '{name}' é muito grande. O tamanho máximo é de 50MB por arquivo.")
+
+    # Check file type, by extension as a fallback
+    file_extension = os.path.splitext(name)[1].lower()
+    if content_type not in MEDIA_ALLOWED_TYPES and file_extension not in MEDIA_ALLOWED_EXTENSIONS:
+        raise forms.ValidationError(
+            f"Arquivo '{name}' não é suportado. Use formatos de imagem (JPG, PNG, GIF, etc.), vídeo (MP4, AVI, MOV, etc.) ou documentos (PDF, PPTX)."
+        )
 
 
 class ArticleForm(forms.ModelForm):
@@ -163,6 +199,28 @@ class MediaPostForm(forms.ModelForm):
     # This field won't be rendered - we use JavaScript to create the actual file inputs
     # But we need it for form validation
     media_files = forms.Field(required=False)
+
+    def completed_uploads(self):
+        """This user's finished chunked uploads named by the upload_ids inputs, in the order sent"""
+        from .upload_models import UploadSession
+
+        ids = self.data.getlist('upload_ids') if hasattr(self.data, 'getlist') else []
+        if not ids:
+            return []
+        if len(ids) > MEDIA_MAX_FILES:
+            raise forms.ValidationError("Máximo de 10 arquivos por post.")
+        try:
+            ids = [UploadSession._meta.pk.to_python(i) for i in ids]
+        except ValidationError:
+            raise forms.ValidationError("Envio de arquivo inválido.")
+        # Each upload becomes one MediaFile; the same one twice would be moved out of staging twice
+        if len(set(ids)) != len(ids):
+            raise forms.ValidationError("O mesmo arquivo foi enviado mais de uma vez.")
+        found = UploadSession.objects.in_bulk(ids)
+        uploads = [found.get(i) for i in ids]
+        if any(u is None or u.user_id != self.user.pk or u.status != UploadSession.COMPLETE for u in uploads):
+            raise forms.ValidationError("Um dos arquivos não terminou de ser enviado. Tente novamente.")
+        return uploads
         
     class Meta:
         model = MediaPost
@@ -189,49 +247,23 @@ class MediaPostForm(forms.ModelForm):
         if payment_type == 'paid' and not price:
             self.add_error('price', 'Informe o valor para conteúdo pago.')
         
-        # Validate uploaded files
+        # Validate uploaded files: sent with the form, or uploaded beforehand in chunks (feed/uploads.py)
         files = self.files.getlist('media_files')
-        
-        if not files:
+        uploads = self.cleaned_data['uploads'] = self.completed_uploads()
+
+        if not files and not uploads:
             raise forms.ValidationError("Selecione pelo menos um arquivo.")
         
-        if len(files) > 10:  # Limit to 10 files per post
+        if len(files) + len(uploads) > MEDIA_MAX_FILES:  # Limit to 10 files per post
             raise forms.ValidationError("Máximo de 10 arquivos por post.")
         
-        total_size = 0
+        total_size = sum(upload.size for upload in uploads)
         for file in files:
-            # Check individual file size (50MB limit)
-            if file.size > 50 * 1024 * 1024:
-                raise forms.ValidationError(f"O arquivo '{file.name}' é muito grande. O tamanho máximo é de 50MB por arquivo.")
-            
+            validate_media_file(file.name, file.size, file.content_type)
             total_size += file.size
-            
-            # Check file type
-            allowed_types = [
-                # Images
-                'image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/bmp', 'image/webp',
-                # Videos
-                'video/mp4', 'video/avi', 'video/mov', 'video/wmv', 'video/quicktime', 'video/webm',
-                # Documents
-                'application/pdf',
-                'application/vnd.openxmlformats-officedocument.presentationml.presentation',  # .pptx
-                'application/vnd.ms-powerpoint',  # .ppt
-            ]
-            
-            # Also check by file extension as a fallback
-            import os
-            file_extension = os.path.splitext(file.name)[1].lower()
-            allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', 
-                                '.mp4', '.avi', '.mov', '.wmv', '.webm', '.mkv',
-                                '.pdf', '.pptx', '.ppt']
-            
-            if file.content_type not in allowed_types and file_extension not in allowed_extensions:
-                raise forms.ValidationError(
-                    f"Arquivo '{file.name}' não é suportado. Use formatos de imagem (JPG, PNG, GIF, etc.), vídeo (MP4, AVI, MOV, etc.) ou documentos (PDF, PPTX)."
-                )
         
         # Check total size (200MB limit for all files combined)
-        if total_size > 200 * 1024 * 1024:
+        if total_size > MEDIA_MAX_TOTAL_SIZE:
             raise forms.ValidationError("O tamanho total dos arquivos não pode exceder 200MB.")
         
         # Handle custom research area
@@ -265,11 +297,14 @@ class MediaPostForm(forms.ModelForm):
             
             # Create MediaFile objects for all uploaded files
             from .models import MediaFile
+            from .uploads import consume_upload
             for file in files:
                 MediaFile.objects.create(
                     media_post=instance,
                     media_file=file
                 )
+            for upload in self.cleaned_data.get('uploads', []):
+                consume_upload(upload, lambda file: MediaFile.objects.create(media_post=instance, media_file=file))
             
         return instance
 
@@ -0,0 +1,146 @@
+"""
+Resized WebP/JPEG derivatives of uploaded images.
+
+process_image() runs once per uploaded image (see feed/signals.py): it reads
+the original, applies its EXIF orientation, records the dimensions on its
+StoredFile row and writes one derivative per size in IMAGE_DERIVATIVE_SIZES
+and format, without EXIF. Derivatives live next to each other under
+derivatives/<original name>/ and are listed in StoredFile.variants, so
+image_url() picks one without asking the storage. A row whose variants are
+set (even to an empty list, for files Pillow cannot read) is never processed
+again.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .file_metadata import cache_metadata, file_metadata, file_url, record_file
+
+# kind -> (sizes in px, square crop). Avatars are shown as circles, media images keep their ratio.
+DEFAULT_SIZES = {
+    'avatar': ([40, 80, 120, 240], True),
+    'media': ([640, 1280], False),
+}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}), 'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+
+
+# (model label, image field, kind) of every upload that gets derivatives
+IMAGE_FIELDS = [
+    (settings.AUTH_USER_MODEL, 'profile_picture', 'avatar'),
+    ('feed.Community', 'community_pic', 'avatar'),
+    ('feed.MediaFile', 'media_file', 'media'),
+]
+
+
+def image_fields(instance):
+    """(field_file, kind) of the non-empty image uploads of a model instance"""
+    fields = []
+    for label, field, kind in IMAGE_FIELDS:
+        if instance._meta.label == label:
+            field_file = getattr(instance, field)
+            # MediaFile also holds videos and documents
+            if field_file and getattr(instance, 'is_image', True):
+                fields.append((field_file, kind))
+    return fields
+
+
+def _sizes(kind):
+    sizes, square = DEFAULT_SIZES[kind]
+    return getattr(settings, 'IMAGE_DERIVATIVE_SIZES', {}).get(kind, sizes), square
+
+
+def derivative_name(name, size, fmt):
+    return f'derivatives/{os.path.splitext(name)[0]}/{size}.{fmt}'
+
+
+def process_image(field_file, kind):
+    """Write the derivatives of field_file unless that was already done; returns its StoredFile"""
+    from PIL import Image, ImageOps
+
+    meta = file_metadata(field_file) or record_file(field_file)
+    if meta.variants is not None or not meta.exists:
+        return meta
+
+    variants = []
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as f:
+            with Image.open(f) as original:
+                image = ImageOps.exif_transpose(original)
+                image.load()
+        meta.width, meta.height = image.size
+
+        sizes, square = _sizes(kind)
+        for size in sizes:
+            if square:
+                resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            else:
+                if size >= image.width:
+                    continue
+                resized = image.copy()
+                resized.thumbnail((size, size * 10), Image.Resampling.LANCZOS)
+            for fmt, (pil_format, options) in FORMATS.items():
+                converted = resized
+                if pil_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                    converted = resized.convert('RGB')
+                elif pil_format == 'WEBP' and resized.mode not in ('RGB', 'RGBA'):
+                    converted = resized.convert('RGBA' if 'A' in resized.mode or 'transparency' in resized.info else 'RGB')
+                buffer = io.BytesIO()
+                # No exif= argument: derivatives carry no EXIF (camera, GPS)
+                converted.save(buffer, pil_format, **options)
+                name = derivative_name(field_file.name, size, fmt)
+                if field_file.storage.exists(name):
+                    field_file.storage.delete(name)
+                field_file.storage.save(name, ContentFile(buffer.getvalue()))
+                variants.append(f'{size}.{fmt}')
+    except (OSError, Image.DecompressionBombError, ValueError):
+        # Not an image Pillow can read: remember that, so it is not tried again
+        variants = []
+
+    meta.variants = variants
+    meta.save(update_fields=['width', 'height', 'variants', 'checked_at'])
+    cache_metadata(meta)
+    return meta
+
+
+def bump_cards(label, instances):
+    """Re-render the cached media cards showing images of these instances (of model label), now derivatives exist"""
+    from django.contrib.auth import get_user_model
+    from django.db.models import F
+    from django.utils import timezone
+    from .models import MediaPost
+
+    if not instances:
+        return
+    if label == 'feed.MediaFile':
+        posts = MediaPost.objects.filter(pk__in={f.media_post_id for f in instances})
+    elif label == settings.AUTH_USER_MODEL:
+        # Their avatar URL changes too: responses whose ETag includes updated_at are sent again
+        get_user_model().objects.filter(pk__in=[u.pk for u in instances]).update(updated_at=timezone.now())
+        posts = MediaPost.objects.filter(user_id__in=[u.pk for u in instances])
+    else:
+        return
+    posts.update(render_version=F('render_version') + 1)
+
+
+def derivative_url(field_file, size, fmt='webp'):
+    """URL of the smallest derivative of field_file at least size px wide (the largest one if none is), or None"""
+    meta = file_metadata(field_file)
+    variants = (meta.variants or []) if meta is not None else []
+    sizes = sorted(int(v.split('.')[0]) for v in variants if v.endswith('.' + fmt))
+    if not sizes:
+        return None
+    chosen = next((s for s in sizes if s >= int(size)), sizes[-1])
+    return field_file.storage.url(derivative_name(field_file.name, chosen, fmt))
+
+
+def image_url(field_file, size=None, fmt='webp'):
+    """
+    URL of the derivative of field_file for size (see derivative_url), or of the original when size
+    is None or no derivative was made. None if there is no file.
+    """
+    url = file_url(field_file)
+    if url is None or size is None:
+        return url
+    return derivative_url(field_file, size, fmt) or url
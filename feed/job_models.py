@@ -0,0 +1,49 @@
+"""
+Background jobs, queued in the database.
+
+Work that does not have to finish before the response (e-mail, reading and
+resizing uploads, deleting files) is saved here by feed.jobs.enqueue and run
+by the run_jobs worker, so request latency no longer depends on SMTP or the
+disk. A job row is written in the request's transaction: a rolled back
+request leaves no job behind.
+"""
+from django.db import models
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pendente'),
+        (RUNNING, 'Executando'),
+        (DONE, 'Concluído'),
+        (FAILED, 'Falhou'),
+    ]
+
+    # Name a function was registered under with @feed.jobs.job
+    name = models.CharField(max_length=100)
+    # Idempotency key: enqueueing a key that already has a job returns that job
+    key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Tarefa em Segundo Plano"
+        verbose_name_plural = "Tarefas em Segundo Plano"
+        indexes = [
+            # The worker's poll: due pending jobs, oldest first
+            models.Index(fields=['status', 'run_at'], name='feed_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
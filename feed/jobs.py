@@ -0,0 +1,169 @@
+"""
+A small job queue on the Job table (feed/job_models.py), no broker needed.
+
+    @job('send_email')
+    def send_email(subject, message, recipient_list): ...
+
+    enqueue('send_email', key=f'approval-email:{pk}', subject=..., message=..., recipient_list=[...])
+
+Job functions live in feed/tasks.py and take JSON-serializable keyword
+arguments. The run_jobs command claims due jobs with a conditional UPDATE
+(so several workers never run the same job), renews each lock just before
+running the job in a transaction (unless registered with atomic=False) and
+retries failures with exponential backoff until max_attempts. A job whose worker died is claimed again once
+its lock is older than JOB_LOCK_TIMEOUT_SECONDS, so job functions must be
+safe to run twice.
+"""
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+_registry = {}
+# Jobs run without the transaction: long ones that mostly wait on something else (ffmpeg)
+_not_atomic = set()
+# Jobs left for run_jobs even with JOB_QUEUE_EAGER: too long to run inside a request
+_not_eager = set()
+
+
+def job(name, atomic=True, eager=True):
+    """
+    Register a function as the job called name. With atomic=False it does not run in a transaction,
+    so it must keep its own writes consistent; meant for jobs that would otherwise hold one open
+    for minutes. With eager=False it always waits for run_jobs, even under JOB_QUEUE_EAGER.
+    """
+    def decorator(func):
+        _registry[name] = func
+        if not atomic:
+            _not_atomic.add(name)
+        if not eager:
+            _not_eager.add(name)
+        return func
+    return decorator
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def enqueue(name, /, key=None, delay=0, max_attempts=None, requeue=False, **payload):
+    """
+    Queue name(**payload) to run in delay seconds. With a key, a job already queued (or run)
+    under that key is returned instead of adding another; with requeue, one that already
+    finished is queued again with this payload, for keys whose subject can come back (a file
+    name reused after its file was deleted). Returns the Job.
+    """
+    from .job_models import Job
+
+    if name not in _registry:
+        raise ValueError(f'Unknown job: {name}')
+    values = {
+        'name': name,
+        'payload': payload,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'max_attempts': max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    }
+    if key is None:
+        queued, created = Job.objects.create(**values), True
+    else:
+        queued, created = Job.objects.get_or_create(key=key, defaults=values)
+        if not created and requeue and queued.status in (Job.DONE, Job.FAILED):
+            # Conditional, so two requests reusing the key queue it once
+            created = bool(Job.objects.filter(pk=queued.pk, status__in=(Job.DONE, Job.FAILED)).update(
+                status=Job.PENDING, attempts=0, finished_at=None, last_error='', **values,
+            ))
+            queued.refresh_from_db()
+
+    if created and getattr(settings, 'JOB_QUEUE_EAGER', True) and name not in _not_eager:
+        # No worker (e.g. local development): run it in this process once the row is committed
+        transaction.on_commit(lambda: run_claimed(claim(worker_name(), pks=[queued.pk])))
+    return queued
+
+
+def _due(now):
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT_SECONDS', 600))
+    return Q(status='pending', run_at__lte=now) | Q(status='running', locked_at__lt=stale)
+
+
+def claim(worker, limit=10, pks=None):
+    """Lock up to limit due jobs (or these pks, if due) for worker; returns them, oldest first"""
+    from .job_models import Job
+
+    now = timezone.now()
+    due = Job.objects.filter(_due(now))
+    if pks is None:
+        pks = list(due.order_by('run_at').values_list('pk', flat=True)[:limit])
+    claimed = [
+        pk for pk in pks
+        # Only one worker's UPDATE matches a row that is still due
+        if due.filter(pk=pk).update(status='running', locked_at=now, locked_by=worker, attempts=F('attempts') + 1)
+    ]
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'pk'))
+
+
+def retry_delay(attempts):
+    """Seconds before retry number attempts: JOB_RETRY_BASE_SECONDS doubled per attempt, capped"""
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 30)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_SECONDS', 3600))
+
+
+def _renew(queued):
+    """
+    Restart the lock timeout of a claimed job just before it runs; False if another worker took it
+    over meanwhile (the jobs before it in the batch ran past JOB_LOCK_TIMEOUT_SECONDS).
+    """
+    from .job_models import Job
+
+    now = timezone.now()
+    renewed = Job.objects.filter(
+        pk=queued.pk, status='running', locked_by=queued.locked_by, locked_at=queued.locked_at,
+    ).update(locked_at=now)
+    queued.locked_at = now
+    return bool(renewed)
+
+
+def run_claimed(jobs):
+    """Run claimed jobs; returns (succeeded, failed) counts. Failures are rescheduled or given up on."""
+    succeeded = failed = 0
+    for queued in jobs:
+        if not _renew(queued):
+            continue
+        func = _registry.get(queued.name)
+        try:
+            if func is None:
+                raise LookupError(f'Unknown job: {queued.name}')
+            if queued.attempts > queued.max_attempts:
+                raise RuntimeError('Worker stopped while running this job too many times')
+            if queued.name in _not_atomic:
+                func(**queued.payload)
+            else:
+                with transaction.atomic():
+                    func(**queued.payload)
+        except Exception:
+            failed += 1
+            queued.last_error = traceback.format_exc()[-4000:]
+            if func is None or queued.attempts >= queued.max_attempts:
+                queued.status, queued.finished_at = 'failed', timezone.now()
+            else:
+                queued.status = 'pending'
+                queued.run_at = timezone.now() + timedelta(seconds=retry_delay(queued.attempts))
+        else:
+            succeeded += 1
+            queued.status, queued.finished_at, queued.last_error = 'done', timezone.now(), ''
+        queued.locked_at, queued.locked_by = None, ''
+        queued.save(update_fields=['status', 'run_at', 'finished_at', 'last_error', 'locked_at', 'locked_by'])
+    return succeeded, failed
+
+
+def prune_jobs(days=None):
+    """Delete jobs that finished successfully more than days (JOB_RETENTION_DAYS) ago; returns the count"""
+    from .job_models import Job
+
+    days = getattr(settings, 'JOB_RETENTION_DAYS', 7) if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status='done', finished_at__lt=cutoff).delete()[0]
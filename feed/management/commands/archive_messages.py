@@ -0,0 +1,66 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from feed.archive_models import ArchivedCommunityMessage, ArchivedMessage
+from feed.community_message_models import CommunityMessage
+from feed.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Move direct and community messages older than MESSAGE_ARCHIVE_AFTER_DAYS into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=getattr(settings, 'MESSAGE_ARCHIVE_AFTER_DAYS', 180),
+                            help='Archive messages older than this many days')
+        parser.add_argument('--batch-size', type=int,
+                            default=getattr(settings, 'MESSAGE_ARCHIVE_BATCH_SIZE', 1000),
+                            help='Rows moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be positive')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        # Unread messages stay hot so mark_read only ever touches the Message table, and so does
+        # the latest message of each conversation, which the inbox reads through Conversation.last_message
+        direct = (
+            Message.objects.filter(created_at__lt=cutoff, read=True)
+            .exclude(id__in=Conversation.objects.filter(last_message__isnull=False).values('last_message_id'))
+        )
+        community = CommunityMessage.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f'🔍 {direct.count()} direct and {community.count()} community messages '
+                              f'older than {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        moved = self._move(direct, ArchivedMessage, options['batch_size'], lambda m: ArchivedMessage(
+            id=m.id, sender_id=m.sender_id, recipient_id=m.recipient_id,
+            body=m.body, created_at=m.created_at, read=m.read,
+        ))
+        self.stdout.write(self.style.SUCCESS(f'✅ {moved} direct messages archived'))
+
+        moved = self._move(community, ArchivedCommunityMessage, options['batch_size'], lambda m: ArchivedCommunityMessage(
+            id=m.id, community_id=m.community_id, user_id=m.user_id,
+            body=m.body, pdf=m.pdf.name or None, created_at=m.created_at,
+        ))
+        self.stdout.write(self.style.SUCCESS(f'✅ {moved} community messages archived'))
+
+    def _move(self, queryset, archive_model, batch_size, to_archive):
+        """Copy and delete batch_size rows per transaction until nothing matches"""
+        moved = 0
+        while True:
+            with transaction.atomic():
+                batch = list(queryset.order_by('id')[:batch_size])
+                if not batch:
+                    return moved
+                archive_model.objects.bulk_create([to_archive(m) for m in batch])
+                queryset.model.objects.filter(id__in=[m.id for m in batch]).delete()
+            moved += len(batch)
+            self.stdout.write(f'   {archive_model.__name__}: {moved}')
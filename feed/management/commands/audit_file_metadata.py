@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.file_metadata import record_stored_file, referenced_file_names, refresh_stored_file
+from feed.file_models import StoredFile
+
+
+class Command(BaseCommand):
+    help = (
+        'Check the recorded metadata of every uploaded file against the storage: record files without a row, '
+        'refresh existence and size, and optionally re-read checksums and drop rows no file field points at'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Files looked up per query')
+        parser.add_argument('--checksums', action='store_true', help='Re-read every file and recompute its checksum')
+        parser.add_argument('--prune', action='store_true', help='Delete rows of files no model refers to any more')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        self.counts = {'checked': 0, 'recorded': 0, 'changed': 0, 'missing': 0}
+        seen = set()
+        batch = []
+        for model, field, name in referenced_file_names():
+            if name in seen:
+                continue
+            seen.add(name)
+            batch.append((field.storage, name))
+            if len(batch) >= batch_size:
+                self.audit(batch, options['checksums'])
+                batch = []
+        if batch:
+            self.audit(batch, options['checksums'])
+
+        pruned = 0
+        if options['prune']:
+            orphans = [pk for pk, name in StoredFile.objects.values_list('pk', 'name').iterator() if name not in seen]
+            for start in range(0, len(orphans), batch_size):
+                pruned += StoredFile.objects.filter(pk__in=orphans[start:start + batch_size]).delete()[0]
+
+        c = self.counts
+        self.stdout.write(f"🗂️  files checked:  {c['checked']}")
+        self.stdout.write(f"🆕 recorded:       {c['recorded']}")
+        self.stdout.write(f"🔄 changed:        {c['changed']}")
+        if options['prune']:
+            self.stdout.write(f"🧹 pruned:         {pruned}")
+        if c['missing']:
+            self.stdout.write(self.style.WARNING(f"⚠️  missing from storage: {c['missing']}"))
+        self.stdout.write(self.style.SUCCESS('✅ file metadata audited'))
+
+    def audit(self, batch, checksums):
+        rows = StoredFile.objects.in_bulk([name for _, name in batch], field_name='name')
+        for storage, name in batch:
+            self.counts['checked'] += 1
+            meta = rows.get(name)
+            if meta is None:
+                meta = record_stored_file(storage, name)
+                self.counts['recorded'] += 1
+            elif checksums:
+                before = (meta.exists, meta.size, meta.checksum)
+                meta = record_stored_file(storage, name)
+                self.counts['changed'] += before != (meta.exists, meta.size, meta.checksum)
+            elif refresh_stored_file(storage, meta):
+                self.counts['changed'] += 1
+            if not meta.exists:
+                self.counts['missing'] += 1
+                self.stdout.write(f'   missing: {name}')
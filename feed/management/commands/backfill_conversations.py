@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Max
+
+from feed.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the Conversation inbox table from the existing Message history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of Conversation rows written per INSERT')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Latest message id per directed (sender, recipient) pair, in a single grouped query
+        last_ids = {}
+        pairs = Message.objects.values('sender_id', 'recipient_id').annotate(last_id=Max('id')).order_by()
+        for row in pairs.iterator():
+            key = frozenset((row['sender_id'], row['recipient_id']))
+            last_ids[key] = max(last_ids.get(key, 0), row['last_id'])
+
+        self.stdout.write(f'🔍 {len(last_ids)} conversations found')
+
+        # Unread messages per (recipient, sender)
+        unread = {
+            (row['recipient_id'], row['sender_id']): row['n']
+            for row in Message.objects.filter(read=False).values('sender_id', 'recipient_id')
+            .annotate(n=Count('id')).order_by().iterator()
+        }
+
+        rows = []
+        message_ids = list(last_ids.values())
+        for start in range(0, len(message_ids), batch_size):
+            chunk = Message.objects.filter(id__in=message_ids[start:start + batch_size]).only(
+                'id', 'sender_id', 'recipient_id', 'created_at'
+            )
+            for msg in chunk:
+                for owner_id, other_id in ((msg.sender_id, msg.recipient_id),
+                                           (msg.recipient_id, msg.sender_id)):
+                    rows.append(Conversation(
+                        user_id=owner_id,
+                        other_user_id=other_id,
+                        last_message_id=msg.id,
+                        last_message_at=msg.created_at,
+                        last_sender_id=msg.sender_id,
+                        unread_count=unread.get((owner_id, other_id), 0) if owner_id != other_id else 0,
+                    ))
+                    if owner_id == other_id:
+                        break
+
+        # MySQL/MariaDB upsert on any unique key and rejects an explicit conflict target
+        unique_fields = None
+        if connection.features.supports_update_conflicts_with_target:
+            unique_fields = ['user', 'other_user']
+
+        with transaction.atomic():
+            Conversation.objects.bulk_create(
+                rows,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=['last_message', 'last_message_at', 'last_sender', 'unread_count'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(rows)} inbox entries written'))
@@ -0,0 +1,80 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from feed.models import Conversation, Message
+from feed.utils import get_inbox_conversations
+from user.models import Follow
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_inbox(user):
+    """The previous mensagens loop: one last-message query per followed user"""
+    rows = []
+    for f in Follow.objects.filter(follower=user).select_related('following'):
+        last_msg = Message.objects.filter(
+            Q(sender=user, recipient=f.following) | Q(sender=f.following, recipient=user)
+        ).order_by('-created_at').first()
+        rows.append((f.following, last_msg.created_at if last_msg else None))
+    return rows
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and latency of the messages inbox (legacy loop vs single query)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                            help='Numbers of followed users to benchmark')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'followed':>9} {'legacy q':>9} {'legacy ms':>10} {'inbox q':>8} {'inbox ms':>9}")
+        for size in options['sizes']:
+            try:
+                # Synthetic data is created inside a transaction that is always rolled back
+                with transaction.atomic():
+                    owner = self._seed(size)
+                    legacy = self._measure(lambda: legacy_inbox(owner), options['repeat'])
+                    inbox = self._measure(lambda: list(get_inbox_conversations(owner)), options['repeat'])
+                    self.stdout.write(
+                        f'{size:>9} {legacy[0]:>9} {legacy[1]:>10.1f} {inbox[0]:>8} {inbox[1]:>9.1f}'
+                    )
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _seed(self, size):
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        owner = User.objects.create(email=f'bench-{tag}@example.com', fullname='Benchmark')
+        User.objects.bulk_create(
+            User(email=f'bench-{tag}-{i}@example.com', fullname=f'Benchmark {i}') for i in range(size)
+        )
+        # Re-read the rows: MySQL does not return primary keys from bulk_create
+        others = list(User.objects.filter(email__startswith=f'bench-{tag}-'))
+        Follow.objects.bulk_create(Follow(follower=owner, following=u) for u in others)
+        # Half of the followed users have a conversation of a few messages
+        for i, other in enumerate(others[::2]):
+            for j in range(3):
+                sender, recipient = (owner, other) if (i + j) % 2 else (other, owner)
+                msg = Message.objects.create(sender=sender, recipient=recipient, body=f'bench {j}')
+            Conversation.record_message(msg)
+        return owner
+
+    def _measure(self, fn, repeat):
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            fn()
+        queries = len(ctx.captured_queries)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return queries, (time.perf_counter() - start) * 1000 / repeat
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q, Sum
+
+from feed.archive_models import ArchivedCommunityMessage
+from feed.community_message_models import CommunityMessage
+from feed.models import Conversation, MediaAccess, MediaComment, MediaLike, MediaPost, Message
+from feed.utils import get_conversation_messages, get_inbox_conversations, get_top_message_users
+from user.models import Follow
+
+
+def hot_queries():
+    """
+    (view, description, queryset) for the queries every page view runs.
+    Unsaved instances are enough: EXPLAIN only needs the SQL shape.
+    """
+    User = get_user_model()
+    user, other = User(pk=1), User(pk=2)
+    post = MediaPost(pk=1)
+
+    return [
+        ('sidebar', 'top conversations', Conversation.objects.filter(
+            user=user, other_user__followers__follower=user).order_by('-last_message_at')[:5]),
+        ('sidebar', 'followed users', Follow.objects.filter(follower=user).select_related('following')),
+        ('topbar', 'unread total', Conversation.objects.filter(
+            user=user, unread_count__gt=0).values('user').annotate(total=Sum('unread_count'))),
+        ('mensagens', 'inbox', get_inbox_conversations(user)),
+        ('get_messages_api', 'newest page', get_conversation_messages(user, other).order_by('-created_at', '-id')[:50]),
+        ('mark_read', 'unread messages', Message.objects.filter(sender=other, recipient=user, read=False)),
+        ('message_stream', 'new messages', Message.objects.filter(
+            Q(sender=user) | Q(recipient=user), id__gt=1).order_by('id')[:50]),
+        ('media_post', 'liked by me', MediaLike.objects.filter(media_post=post, user=user)),
+        ('MediaAccessResolver', 'granted posts', MediaAccess.objects.filter(user=user, has_access=True).order_by().values('media_post_id')),
+        ('get_media_comments', 'comments', MediaComment.objects.filter(
+            media_post=post, parent__isnull=True).order_by('-created_at', '-id')[:21]),
+        ('get_media_comments', 'replies', MediaComment.objects.filter(
+            media_post=post, parent_id=1).order_by('created_at', 'id')[:21]),
+        ('community_detail', 'messages', CommunityMessage.objects.filter(community_id=1).order_by('created_at')),
+        ('community_detail', 'archived page', ArchivedCommunityMessage.objects.filter(
+            community_id=1).order_by('-created_at', '-id')[:51]),
+    ]
+
+
+def full_scans(sql, params):
+    """Return the tables the database plans to read in full for this query"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+            # "SCAN t" reads the table; "SCAN t USING [COVERING] INDEX i" walks an index instead
+            scans = [line.split()[1] for line in plan if line.startswith('SCAN ') and ' INDEX ' not in line]
+        elif connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            plan = [f"{row['table']}: {row['type']} {row.get('key') or ''}" for row in rows]
+            # Derived/materialized tables (<subquery2>, <derived3>) are not base-table scans
+            scans = [row['table'] for row in rows if row['type'] == 'ALL' and not str(row['table']).startswith('<')]
+        else:
+            raise CommandError(f'EXPLAIN checks are only implemented for SQLite and MySQL, not {connection.vendor}')
+    return plan, scans
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot queries of each view and fail if any of them scans a whole table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plan', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        failures = []
+        for view, description, queryset in hot_queries():
+            sql, params = queryset.query.sql_with_params()
+            plan, scans = full_scans(sql, params)
+            if scans:
+                failures.append(f'{view} / {description}: {", ".join(scans)}')
+                self.stdout.write(self.style.ERROR(f'❌ {view} / {description}: full scan of {", ".join(scans)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'✅ {view} / {description}'))
+            if options['verbose_plan'] or scans:
+                for line in plan:
+                    self.stdout.write(f'      {line}')
+
+        if failures:
+            raise CommandError(f'{len(failures)} quer{"y" if len(failures) == 1 else "ies"} do full table scans')
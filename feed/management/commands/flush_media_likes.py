@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from feed.models import MediaLike, MediaPost, PendingMediaLike
+
+
+def flush_batch(batch_size):
+    """Apply the oldest batch_size buffered toggles to MediaLike; returns (toggles, posts) flushed"""
+    with transaction.atomic():
+        pending = list(
+            PendingMediaLike.objects.order_by('id')
+            .values_list('id', 'user_id', 'media_post_id', 'liked')[:batch_size]
+        )
+        if not pending:
+            return 0, 0
+
+        # Only the last toggle of each (user, post) matters
+        final = {}
+        for _, user_id, post_id, liked in pending:
+            final[user_id, post_id] = liked
+
+        MediaLike.objects.bulk_create(
+            [MediaLike(user_id=user_id, media_post_id=post_id) for (user_id, post_id), liked in final.items() if liked],
+            ignore_conflicts=True,
+        )
+        unliked = Q()
+        for (user_id, post_id), liked in final.items():
+            if not liked:
+                unliked |= Q(user_id=user_id, media_post_id=post_id)
+        if unliked:
+            MediaLike.objects.filter(unliked).delete()
+
+        post_ids = {post_id for _, post_id in final}
+        MediaPost.recount_counters(post_ids)
+        # By id rather than by range, so a toggle committed late with a lower id is not lost
+        PendingMediaLike.objects.filter(id__in=[row[0] for row in pending]).delete()
+    return len(pending), len(post_ids)
+
+
+class Command(BaseCommand):
+    help = 'Write the like toggles buffered in PendingMediaLike (MEDIA_LIKE_BUFFER) to MediaLike and the post counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Toggles applied per transaction')
+        parser.add_argument('--every', type=float, default=0,
+                            help='Keep running and flush every N seconds instead of draining the buffer once')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['every'] < 0:
+            raise CommandError('--every cannot be negative')
+
+        while True:
+            toggles = posts = 0
+            while True:
+                flushed, touched = flush_batch(batch_size)
+                if not flushed:
+                    break
+                toggles += flushed
+                posts += touched
+            self.stdout.write(self.style.SUCCESS(f'✅ {toggles} like toggles flushed, {posts} post counters recounted'))
+
+            if not options['every']:
+                break
+            time.sleep(options['every'])
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import resource
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from feed.message_events import notify_users, subscriber_count
+from feed.models import Conversation, Message
+
+
+def _rss_mb():
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = (
+        'Open N idle Server-Sent Events connections against the ASGI application in this process '
+        'and report memory, threads and wake-up latency when a message is delivered to all of them'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--hold', type=float, default=5.0, help='Seconds to keep the connections idle')
+        parser.add_argument('--batch', type=int, default=50,
+                            help='Connections opened at once; SQLite cannot take many concurrent session writes')
+        parser.add_argument('--connect-timeout', type=float, default=60.0)
+
+    def handle(self, *args, **options):
+        # The inactivity middleware logs every request at DEBUG level in development
+        logging.getLogger('setup.middleware').setLevel(logging.WARNING)
+
+        User = get_user_model()
+        tag = uuid.uuid4().hex[:8]
+        listener = User.objects.create_user(f'loadtest-{tag}@example.com', 'Load Test', uuid.uuid4().hex,
+                                            is_active=True, email_verified=True)
+        sender = User.objects.create_user(f'loadtest-{tag}-sender@example.com', 'Load Test Sender',
+                                          uuid.uuid4().hex, is_active=True, email_verified=True)
+        try:
+            client = Client()
+            client.force_login(listener)
+            cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+            asyncio.run(self._run(listener, sender, cookie, options))
+        finally:
+            listener.delete()
+            sender.delete()
+
+    async def _run(self, listener, sender, cookie, options):
+        app = ASGIHandler()
+        total = options['connections']
+        connected = asyncio.Semaphore(0)
+        delivered = {}
+        disconnect = asyncio.Event()
+        rss_before = _rss_mb()
+        threads_before = threading.active_count()
+
+        async def connection(index):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': '/feed/mensagens/api/stream/',
+                'root_path': '', 'query_string': b'',
+                'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+                'client': ('127.0.0.1', 10000 + index), 'server': ('localhost', 80),
+            }
+            sent_request = False
+
+            async def receive():
+                nonlocal sent_request
+                if not sent_request:
+                    sent_request = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    if message['status'] != 200:
+                        raise RuntimeError(f"stream returned HTTP {message['status']}")
+                    connected.release()
+                elif b'event: message' in message.get('body', b''):
+                    delivered.setdefault(index, time.perf_counter())
+
+            await app(scope, receive, send)
+
+        started = time.perf_counter()
+        tasks = []
+        try:
+            for first in range(0, total, options['batch']):
+                batch = range(first, min(first + options['batch'], total))
+                tasks.extend(asyncio.create_task(connection(i)) for i in batch)
+                for _ in batch:
+                    await asyncio.wait_for(connected.acquire(), options['connect_timeout'])
+        except asyncio.TimeoutError:
+            pass
+        open_connections = total - sum(t.done() for t in tasks)
+        connect_seconds = time.perf_counter() - started
+
+        # Give every stream time to reach its idle wait
+        await asyncio.sleep(options['hold'])
+        idle_subscribers = subscriber_count()
+        rss_idle = _rss_mb()
+        threads_idle = threading.active_count()
+
+        @sync_to_async
+        def send_message():
+            with transaction.atomic():
+                msg = Message.objects.create(sender=sender, recipient=listener, body='load test')
+                Conversation.record_message(msg)
+                transaction.on_commit(lambda: notify_users(msg.sender_id, msg.recipient_id))
+
+        sent_at = time.perf_counter()
+        await send_message()
+        deadline = time.monotonic() + getattr(settings, 'MESSAGE_PUSH_RECHECK_SECONDS', 5) + 5
+        while len(delivered) < idle_subscribers and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        latencies = sorted(t - sent_at for t in delivered.values())
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.stdout.write(f'🔌 connections opened:      {open_connections}/{total} in {connect_seconds:.1f}s')
+        self.stdout.write(f'💤 idle subscribers:        {idle_subscribers}')
+        self.stdout.write(f'🧠 peak RSS:                {rss_before:.0f} MB -> {rss_idle:.0f} MB '
+                          f'(~{(rss_idle - rss_before) * 1024 / max(idle_subscribers, 1):.0f} KB per connection)')
+        self.stdout.write(f'🧵 threads:                 {threads_before} -> {threads_idle}')
+        if latencies:
+            self.stdout.write(f'📨 delivered to:            {len(latencies)} streams; '
+                              f'p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, '
+                              f'max {latencies[-1] * 1000:.0f} ms')
+        else:
+            self.stdout.write(self.style.ERROR('❌ message was not delivered to any stream'))
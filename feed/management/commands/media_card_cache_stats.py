@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from feed.utils import get_media_card_cache_stats, reset_media_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the hit/miss counters of the rendered media card cache, counted per card. '
+        'Counters live in the default cache, so this needs a shared backend to see what the web workers counted'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = get_media_card_cache_stats()
+        ratio = f"{stats['hit_ratio']:.1%}" if stats['hit_ratio'] is not None else 'n/a'
+        self.stdout.write(f"🎯 hits:      {stats['hits']}")
+        self.stdout.write(f"💨 misses:    {stats['misses']}")
+        self.stdout.write(f"📊 hit ratio: {ratio}")
+        if options['reset']:
+            reset_media_card_cache_stats()
+            self.stdout.write(self.style.SUCCESS('✅ counters reset'))
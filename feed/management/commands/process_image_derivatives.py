@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.file_metadata import file_metadata, prefetch_file_metadata
+from feed.images import IMAGE_FIELDS, bump_cards, process_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Write the resized WebP/JPEG derivatives of images uploaded before they were made at upload. '
+        'Images already processed (including ones Pillow could not read) are skipped, so it is safe to re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows loaded per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        processed = skipped = failed = 0
+        for label, field, kind in IMAGE_FIELDS:
+            model = apps.get_model(label)
+            queryset = model._default_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True}).order_by('pk')
+            if label == 'feed.MediaFile':
+                queryset = queryset.filter(media_type='image')
+
+            last_pk = 0
+            while True:
+                batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                prefetch_file_metadata(batch, field)
+
+                changed = []
+                for instance in batch:
+                    field_file = getattr(instance, field)
+                    meta = file_metadata(field_file)
+                    if meta is not None and meta.variants is not None:
+                        skipped += 1
+                        continue
+                    meta = process_image(field_file, kind)
+                    if meta.variants:
+                        processed += 1
+                        changed.append(instance)
+                    else:
+                        failed += 1
+                        self.stdout.write(f'   not an image: {field_file.name}')
+                bump_cards(label, changed)
+
+        self.stdout.write(f"🖼️  processed: {processed}")
+        self.stdout.write(f"⏭️  skipped:   {skipped}")
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️  unreadable: {failed}"))
+        self.stdout.write(self.style.SUCCESS('✅ image derivatives written'))
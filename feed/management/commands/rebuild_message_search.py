@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from feed.message_search import SQLITE_FTS_TABLES, install_sqlite_fts
+
+
+class Command(BaseCommand):
+    help = 'Recreate the SQLite FTS5 message search index and its triggers, then reindex every message'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('ℹ️  MySQL/MariaDB maintain the FULLTEXT index themselves; nothing to do')
+            return
+        with connection.cursor() as cursor:
+            for table, fts_table in SQLITE_FTS_TABLES:
+                install_sqlite_fts(cursor, table, fts_table)
+                self.stdout.write(self.style.SUCCESS(f'✅ {fts_table} rebuilt'))
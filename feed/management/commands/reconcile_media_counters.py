@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+
+from feed.models import MediaComment, MediaLike, MediaPost
+
+
+class Command(BaseCommand):
+    help = 'Recount MediaPost.like_count / comment_count in batches and fix the posts that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts checked per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the posts that drifted')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        checked = fixed = 0
+        last_id = 0
+        while True:
+            batch = list(MediaPost.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+
+            drifted = list(
+                MediaPost.objects.filter(pk__in=batch)
+                .annotate(actual_likes=MediaPost.actual_count(MediaLike), actual_comments=MediaPost.actual_count(MediaComment))
+                .filter(~Q(like_count=F('actual_likes')) | ~Q(comment_count=F('actual_comments')))
+                .values_list('pk', 'like_count', 'actual_likes', 'comment_count', 'actual_comments')
+            )
+            for pk, likes, actual_likes, comments, actual_comments in drifted:
+                self.stdout.write(f'   post {pk}: likes {likes} -> {actual_likes}, comments {comments} -> {actual_comments}')
+            if drifted and not options['dry_run']:
+                # Recounted inside the UPDATE itself, so writes landing meanwhile are not lost
+                MediaPost.recount_counters([row[0] for row in drifted])
+            fixed += len(drifted)
+
+        verb = 'drifted' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'✅ {checked} posts checked, {fixed} {verb}'))
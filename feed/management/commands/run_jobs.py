@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from feed.jobs import claim, prune_jobs, run_claimed, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (e-mail, upload processing, file cleanup; see feed/jobs.py). '
+        'Keeps polling by default; run one per server next to gunicorn, or several: each job runs once'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per poll')
+        parser.add_argument('--sleep', type=float, default=2, help='Seconds to wait when no job is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of polling')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Exit after running this many jobs (0 = no limit), so a supervisor restarts a fresh process')
+        parser.add_argument('--prune', action='store_true',
+                            help='First delete jobs that succeeded more than JOB_RETENTION_DAYS ago')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['sleep'] < 0 or options['max_jobs'] < 0:
+            raise CommandError('--sleep and --max-jobs cannot be negative')
+
+        if options['prune']:
+            self.stdout.write(f'🧹 old jobs deleted: {prune_jobs()}')
+
+        worker = worker_name()
+        succeeded = failed = 0
+        try:
+            while not options['max_jobs'] or succeeded + failed < options['max_jobs']:
+                limit = batch_size
+                if options['max_jobs']:
+                    limit = min(limit, options['max_jobs'] - succeeded - failed)
+                jobs = claim(worker, limit)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                done, errors = run_claimed(jobs)
+                succeeded += done
+                failed += errors
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f'✅ jobs run:    {succeeded}')
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️  jobs failed: {failed} (retried later unless out of attempts)'))
+        self.stdout.write(self.style.SUCCESS(f'🛑 worker {worker} stopped'))
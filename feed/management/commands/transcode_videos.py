@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from feed.job_models import Job
+from feed.jobs import enqueue
+from feed.models import MediaFile
+
+
+class Command(BaseCommand):
+    help = (
+        'Queue the transcode_video job (web MP4 rendition and poster, feed/videos.py) for videos uploaded '
+        'before renditions were made, or whose job gave up (e.g. ffmpeg was missing). '
+        'Videos already converted are skipped, so it is safe to re-run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true', help='Also queue videos ffmpeg could not convert')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows loaded per query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        statuses = Q(video_status='') | Q(video_status=MediaFile.VIDEO_PENDING)
+        if options['retry_failed']:
+            statuses |= Q(video_status=MediaFile.VIDEO_FAILED)
+        queryset = MediaFile.objects.filter(statuses, media_type='video').exclude(media_file='').order_by('pk')
+
+        queued = requeued = 0
+        last_pk = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk).only('pk', 'media_file')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            MediaFile.objects.filter(pk__in=[f.pk for f in batch]).update(video_status=MediaFile.VIDEO_PENDING)
+
+            for media_file in batch:
+                job = enqueue('transcode_video', key=f'transcode:{media_file.pk}:{media_file.media_file.name}', pk=media_file.pk)
+                if job.status in (Job.DONE, Job.FAILED):
+                    # The key is taken by the job that already ran: run that one again
+                    Job.objects.filter(pk=job.pk).update(
+                        status=Job.PENDING, attempts=0, run_at=timezone.now(), finished_at=None, last_error='',
+                    )
+                    requeued += 1
+                else:
+                    queued += 1
+
+        self.stdout.write(f"🎬 queued:   {queued}")
+        self.stdout.write(f"🔁 requeued: {requeued}")
+        self.stdout.write(self.style.SUCCESS('✅ videos queued for transcoding; run_jobs converts them'))
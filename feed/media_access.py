@@ -0,0 +1,103 @@
+"""
+Access checks for paid media posts.
+
+MediaAccessResolver loads the ids of the posts a user has been granted once
+per request and answers every check of the request from that set. With a
+shared cache backend (feed.utils.cache_is_shared) the set comes from a per-user
+cache entry whose key carries a version token; feed/signals.py replaces the
+token whenever one of the user's MediaAccess rows changes, so a stale set is
+never read again and just expires. With a per-process cache a revocation made
+by another worker would go unseen, so the set is read from the database (one
+index-only query) and is its own version.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    return f'media_access:version:{user_id}'
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # A fresh token (not a counter) so an evicted version can never match an old entry
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _cache_is_shared():
+    from .utils import cache_is_shared
+
+    return cache_is_shared()
+
+
+def access_version(user):
+    """Token that changes whenever the user's granted set does (part of conditional GET validators)"""
+    if _cache_is_shared():
+        return _version(user.id)
+    granted = sorted(MediaAccessResolver.for_user(user).granted_post_ids)
+    return hashlib.md5(repr(granted).encode(), usedforsecurity=False).hexdigest()
+
+
+def invalidate_media_access(*user_ids):
+    """Make the cached granted set of these users unreachable (a no-op without a shared cache)"""
+    if not _cache_is_shared():
+        return
+    cache.set_many({_version_key(user_id): uuid.uuid4().hex for user_id in set(user_ids)}, timeout=None)
+
+
+class MediaAccessResolver:
+    """Answers "may this user open this paid post?" without a query per post"""
+
+    def __init__(self, user):
+        self.user = user
+        self._granted = None
+
+    @classmethod
+    def for_user(cls, user):
+        """The resolver of this user object; request.user lives for one request, and so does its resolver"""
+        resolver = getattr(user, '_media_access_resolver', None)
+        if resolver is None:
+            resolver = cls(user)
+            user._media_access_resolver = resolver
+        return resolver
+
+    @property
+    def granted_post_ids(self):
+        if self._granted is None:
+            self._granted = self._load()
+        return self._granted
+
+    def _load(self):
+        from .models import MediaAccess
+
+        if not self.user.is_authenticated:
+            return frozenset()
+        shared = _cache_is_shared()
+        if shared:
+            key = f'media_access:{self.user.id}:{_version(self.user.id)}'
+            granted = cache.get(key)
+            if granted is not None:
+                return granted
+        granted = frozenset(
+            MediaAccess.objects.filter(user=self.user, has_access=True)
+            .order_by().values_list('media_post_id', flat=True)
+        )
+        if shared:
+            cache.set(key, granted, getattr(settings, 'MEDIA_ACCESS_CACHE_SECONDS', 3600))
+        return granted
+
+    def has_access(self, media_post):
+        if media_post.is_free:
+            return True
+        if media_post.user_id == self.user.id:  # Owner always has access
+            return True
+        if not self.user.is_authenticated:  # Anonymous users don't have access to paid content
+            return False
+        return media_post.id in self.granted_post_ids
@@ -52,30 +52,16 @@ class LegacyMediaPost(models.Model):
         return dict(self.MEDIA_TYPE_CHOICES).get(self.media_type, 'Desconhecido')
 
     def get_file_size(self):
-        """Return formatted file size"""
+        """Return formatted file size, as recorded at upload"""
+        from .file_metadata import file_size, format_size
+
         if self.media_file:
-            try:
-                size = self.media_file.size
-                for unit in ['B', 'KB', 'MB', 'GB']:
-                    if size < 1024.0:
-                        return f"{size:.1f} {unit}"
-                    size /= 1024.0
-                return f"{size:.1f} TB"
-            except:
-                return "Tamanho desconhecido"
+            size = file_size(self.media_file)
+            return format_size(size) if size is not None else "Tamanho desconhecido"
         return "Sem arquivo"
 
     def get_file_url(self):
-        """Return the URL of the media file"""
-        if self.media_file:
-            # Check if the file actually exists on disk
-            try:
-                if self.media_file.storage.exists(self.media_file.name):
-                    return self.media_file.url
-                else:
-                    # File doesn't exist (maybe moved to iCloud), return None
-                    return None
-            except:
-                # Any error accessing the file, return None
-                return None
-        return None
\ No newline at end of file
+        """Return the URL of the media file, or None if it is known to be missing (see feed/file_metadata.py)"""
+        from .file_metadata import file_url
+
+        return file_url(self.media_file)
\ No newline at end of file
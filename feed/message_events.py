@@ -0,0 +1,68 @@
+"""
+In-process notification channel for direct messages.
+
+Streaming views subscribe per user and sleep until send_message_api calls
+notify_users() for that user. Notifications only reach subscribers in the
+same process, so waiting views also recheck the database periodically
+(MESSAGE_PUSH_RECHECK_SECONDS) to pick up messages stored by other workers.
+No external broker is needed.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+_subscriptions = defaultdict(set)
+_lock = threading.Lock()
+
+
+class Subscription:
+    """Wakes an async waiter whenever a message involving user_id is stored"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+
+    def __enter__(self):
+        with _lock:
+            _subscriptions[self.user_id].add(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with _lock:
+            subscribers = _subscriptions.get(self.user_id)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del _subscriptions[self.user_id]
+
+    def notify(self):
+        # Called from request threads; the event belongs to the subscriber's loop
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout):
+        """Return True if notified within timeout seconds, False otherwise"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+def notify_users(*user_ids):
+    """Wake every subscription waiting on any of the given users"""
+    with _lock:
+        subscribers = [s for user_id in set(user_ids) for s in _subscriptions.get(user_id, ())]
+    for subscription in subscribers:
+        try:
+            subscription.notify()
+        except RuntimeError:
+            # The subscriber's event loop has already been closed
+            pass
+
+
+def subscriber_count():
+    with _lock:
+        return sum(len(s) for s in _subscriptions.values())
@@ -0,0 +1,167 @@
+"""
+Full-text search over direct messages.
+
+SQLite keeps an FTS5 index (feed_message_fts / feed_archivedmessage_fts)
+in sync with the message tables through triggers. MySQL/MariaDB use a
+FULLTEXT index on body, which InnoDB maintains on every write. Both
+indexes are created by migration 0034; `manage.py rebuild_message_search`
+recreates the SQLite side, e.g. after a migration has rebuilt a message
+table (SQLite's ALTER TABLE emulation drops its triggers).
+"""
+import re
+import unicodedata
+
+from django.db import connection
+from django.utils.html import escape
+
+# (model table, FTS5 table) pairs indexed on SQLite
+SQLITE_FTS_TABLES = [
+    ('feed_message', 'feed_message_fts'),
+    ('feed_archivedmessage', 'feed_archivedmessage_fts'),
+]
+MYSQL_FULLTEXT_INDEXES = [
+    ('feed_message', 'feed_msg_body_ft'),
+    ('feed_archivedmessage', 'feed_archmsg_body_ft'),
+]
+MAX_TERMS = 8
+
+
+def install_sqlite_fts(cursor, table, fts_table):
+    """Create the FTS5 table and sync triggers for table, and index its current rows"""
+    cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE {fts_table} USING fts5("
+        f"body, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+    )
+    cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_ai')
+    cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_ad')
+    cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_au')
+    cursor.execute(
+        f'CREATE TRIGGER {fts_table}_ai AFTER INSERT ON {table} BEGIN '
+        f'INSERT INTO {fts_table}(rowid, body) VALUES (new.id, new.body); END'
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {fts_table}_ad AFTER DELETE ON {table} BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, body) VALUES ('delete', old.id, old.body); END"
+    )
+    cursor.execute(
+        f'CREATE TRIGGER {fts_table}_au AFTER UPDATE OF body ON {table} BEGIN '
+        f"INSERT INTO {fts_table}({fts_table}, rowid, body) VALUES ('delete', old.id, old.body); "
+        f'INSERT INTO {fts_table}(rowid, body) VALUES (new.id, new.body); END'
+    )
+    cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def drop_sqlite_fts(cursor, table, fts_table):
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{suffix}')
+    cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+def search_terms(query):
+    """Words of the query, at most MAX_TERMS; punctuation and operators are dropped"""
+    return re.findall(r'\w+', query)[:MAX_TERMS]
+
+
+def _match_expression(terms):
+    if connection.vendor == 'sqlite':
+        # Every term, as a prefix: "acao"* "dados"*
+        return ' '.join(f'"{term}"*' for term in terms)
+    # MySQL boolean mode: +acao* +dados*
+    return ' '.join(f'+{term}*' for term in terms)
+
+
+def _matching_ids(table, terms, user_id, before_id, limit):
+    """Ids of the messages of user_id in table matching every term, newest first"""
+    params = [_match_expression(terms), user_id, user_id]
+    keyset = ''
+    if before_id:
+        keyset = 'AND m.id < %s'
+        params.append(before_id)
+    params.append(limit)
+
+    if connection.vendor == 'sqlite':
+        fts_table = dict(SQLITE_FTS_TABLES)[table]
+        sql = (
+            f'SELECT m.id FROM {fts_table} JOIN {table} m ON m.id = {fts_table}.rowid '
+            f'WHERE {fts_table} MATCH %s AND (m.sender_id = %s OR m.recipient_id = %s) {keyset} '
+            f'ORDER BY m.id DESC LIMIT %s'
+        )
+    else:
+        sql = (
+            f'SELECT m.id FROM {table} m '
+            f'WHERE MATCH(m.body) AGAINST (%s IN BOOLEAN MODE) AND (m.sender_id = %s OR m.recipient_id = %s) {keyset} '
+            f'ORDER BY m.id DESC LIMIT %s'
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_messages(user, query, limit, before_id=None):
+    """
+    Returns (messages, has_more): messages of the user's own conversations matching every
+    word of query, newest first, hot and archived alike. Page further with before_id.
+    """
+    from django.db.models import Q
+    from .archive_models import ArchivedMessage
+    from .models import Message
+
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    results = []
+    for model in (Message, ArchivedMessage):
+        if connection.vendor in ('sqlite', 'mysql'):
+            ids = _matching_ids(model._meta.db_table, terms, user.id, before_id, limit + 1)
+            queryset = model.objects.filter(id__in=ids)
+        else:
+            # No full-text index on other databases
+            queryset = model.objects.filter(Q(sender=user) | Q(recipient=user))
+            for term in terms:
+                queryset = queryset.filter(body__icontains=term)
+            if before_id:
+                queryset = queryset.filter(id__lt=before_id)
+            queryset = queryset.order_by('-id')[:limit + 1]
+        results.extend(queryset.select_related('sender', 'recipient'))
+
+    results.sort(key=lambda m: m.id, reverse=True)
+    return results[:limit], len(results) > limit
+
+
+def _fold(text):
+    """Lowercase text with accents removed, one character per input character"""
+    folded = []
+    for char in text:
+        base = unicodedata.normalize('NFKD', char)[:1].lower()[:1]
+        folded.append(base or char)
+    return ''.join(folded)
+
+
+def highlight(body, query, width=80):
+    """
+    HTML snippet of body around the first matching word, with every match in <mark>.
+    Matching ignores case and accents, like the index does.
+    """
+    terms = [_fold(term) for term in search_terms(query)]
+    folded = _fold(body)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(t) for t in terms) + r')\w*') if terms else None
+    matches = list(pattern.finditer(folded)) if pattern else []
+
+    start = 0
+    if matches and len(body) > width:
+        start = max(0, min(matches[0].start() - width // 4, len(body) - width))
+    end = min(len(body), start + width)
+
+    parts = ['…' if start else '']
+    position = start
+    for match in matches:
+        if match.start() < start or match.end() > end:
+            continue
+        parts.append(escape(body[position:match.start()]))
+        parts.append(f'<mark>{escape(body[match.start():match.end()])}</mark>')
+        position = match.end()
+    parts.append(escape(body[position:end]))
+    parts.append('…' if end < len(body) else '')
+    return ''.join(parts)
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 20:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0031_conversation_unread_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='communitymessage',
+            index=models.Index(fields=['community', 'created_at'], name='feed_commmsg_community_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediaaccess',
+            index=models.Index(fields=['user', 'has_access', 'media_post'], name='feed_mediaaccess_granted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mediacomment',
+            index=models.Index(fields=['media_post', '-created_at'], name='feed_mediacomment_post_idx'),
+        ),
+    ]
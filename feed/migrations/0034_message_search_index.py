@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from feed.message_search import MYSQL_FULLTEXT_INDEXES, SQLITE_FTS_TABLES, drop_sqlite_fts, install_sqlite_fts
+
+
+def create_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            for table, fts_table in SQLITE_FTS_TABLES:
+                install_sqlite_fts(cursor, table, fts_table)
+        elif vendor == 'mysql':
+            for table, index in MYSQL_FULLTEXT_INDEXES:
+                cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {index} (body)')
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            for table, fts_table in SQLITE_FTS_TABLES:
+                drop_sqlite_fts(cursor, table, fts_table)
+        elif vendor == 'mysql':
+            for table, index in MYSQL_FULLTEXT_INDEXES:
+                cursor.execute(f'ALTER TABLE {table} DROP INDEX {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0033_message_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+# Same bits as MediaPost.MEDIA_TYPE_BITS
+MEDIA_TYPE_BITS = {'image': 1, 'video': 2, 'document': 4}
+
+
+def fill_file_summary(apps, schema_editor):
+    MediaPost = apps.get_model('feed', 'MediaPost')
+    MediaFile = apps.get_model('feed', 'MediaFile')
+    summary = {}
+    rows = MediaFile.objects.values('media_post_id', 'media_type').annotate(n=models.Count('id')).order_by()
+    for row in rows.iterator():
+        flags, total = summary.get(row['media_post_id'], (0, 0))
+        summary[row['media_post_id']] = (flags | MEDIA_TYPE_BITS.get(row['media_type'], 0), total + row['n'])
+    for post_id, (flags, total) in summary.items():
+        MediaPost.objects.filter(pk=post_id).update(media_type_flags=flags, file_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0034_message_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediapost',
+            name='file_total',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mediapost',
+            name='media_type_flags',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_file_summary, migrations.RunPython.noop),
+    ]
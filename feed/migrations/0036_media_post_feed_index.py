@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 20:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0035_media_post_file_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mediapost',
+            index=models.Index(fields=['-created_at', '-id'], name='feed_mediapost_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-18 20:32
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    MediaPost = apps.get_model('feed', 'MediaPost')
+    MediaLike = apps.get_model('feed', 'MediaLike')
+    MediaComment = apps.get_model('feed', 'MediaComment')
+
+    def count_of(model):
+        per_post = model.objects.filter(media_post=OuterRef('pk')).order_by().values('media_post').annotate(n=Count('id')).values('n')
+        return Coalesce(Subquery(per_post, output_field=IntegerField()), Value(0))
+
+    MediaPost.objects.update(like_count=count_of(MediaLike), comment_count=count_of(MediaComment))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0036_media_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediapost',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='mediapost',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 20:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0038_media_like_buffer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediacomment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='feed.mediacomment'),
+        ),
+        migrations.AddField(
+            model_name='mediacomment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='mediacomment',
+            index=models.Index(fields=['parent', 'created_at'], name='feed_mediacomment_reply_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0039_media_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediapost',
+            name='render_version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0040_media_post_render_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='article',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='community',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
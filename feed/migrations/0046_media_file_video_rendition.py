@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0045_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediafile',
+            name='video_poster',
+            field=models.FileField(blank=True, upload_to='media_posts/posters/', verbose_name='Capa do Vídeo'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='video_rendition',
+            field=models.FileField(blank=True, upload_to='media_posts/web/', verbose_name='Vídeo para Web'),
+        ),
+        migrations.AddField(
+            model_name='mediafile',
+            name='video_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Na fila'), ('ready', 'Pronto'), ('failed', 'Falhou')], max_length=10, verbose_name='Conversão do Vídeo'),
+        ),
+    ]
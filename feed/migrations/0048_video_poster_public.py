@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-18 22:05
+
+import os
+
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+OLD_PREFIX = 'media_posts/posters/'
+NEW_PREFIX = 'derivatives/posters/'
+
+
+def move_posters(apps, schema_editor):
+    """Posters made before are under media_posts/, which nginx does not serve: move them"""
+    MediaFile = apps.get_model('feed', 'MediaFile')
+    StoredFile = apps.get_model('feed', 'StoredFile')
+    rows = MediaFile.objects.filter(video_poster__startswith=OLD_PREFIX).only('pk', 'video_poster')
+    for media_file in rows.iterator():
+        old = media_file.video_poster.name
+        if not default_storage.exists(old):
+            continue
+        with default_storage.open(old, 'rb') as f:
+            new = default_storage.save(NEW_PREFIX + os.path.basename(old), f)
+        MediaFile.objects.filter(pk=media_file.pk).update(video_poster=new)
+        StoredFile.objects.filter(name=old).update(name=new)
+        default_storage.delete(old)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('feed', '0047_alter_research_area_choices'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mediafile',
+            name='video_poster',
+            field=models.FileField(blank=True, upload_to='derivatives/posters/', verbose_name='Capa do Vídeo'),
+        ),
+        migrations.RunPython(move_posters, migrations.RunPython.noop),
+    ]
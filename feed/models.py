@@ -1,6 +1,7 @@
 
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
+from django.db.models.functions import Coalesce, Greatest
 from django.utils import timezone
 from .constants import RESEARCH_AREA_CHOICES
 
@@ -15,9 +16,117 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Backs the keyset pagination of a conversation on (created_at, id)
+            models.Index(fields=['sender', 'recipient', 'created_at', 'id'], name='feed_msg_pair_created_idx'),
+            # Partial index: only unread rows, so it stays small however large the table grows
+            models.Index(fields=['recipient', 'sender'], condition=models.Q(read=False), name='feed_msg_unread_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender} -> {self.recipient}: {self.body[:30]}"
+
+
+class Conversation(models.Model):
+    """Denormalized inbox entry: one row per (user, other_user) pair with the latest message between them"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='conversations', on_delete=models.CASCADE)
+    other_user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    last_message = models.ForeignKey(Message, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_sender = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', null=True, blank=True, on_delete=models.SET_NULL)
+    # Messages from other_user that user has not read yet
+    unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'other_user')
+        ordering = ['-last_message_at']
+        indexes = [
+            models.Index(fields=['user', '-last_message_at'], name='feed_conv_user_last_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} <-> {self.other_user}"
+
+    @classmethod
+    def record_message(cls, message):
+        """Point both participants' inbox entries at this message and bump the recipient's unread count"""
+        for owner_id, other_id in ((message.sender_id, message.recipient_id),
+                                   (message.recipient_id, message.sender_id)):
+            unread = 1 if owner_id != message.sender_id else 0
+            values = {
+                'last_message': message,
+                'last_message_at': message.created_at,
+                'last_sender_id': message.sender_id,
+            }
+            entry = cls.objects.filter(user_id=owner_id, other_user_id=other_id)
+            if entry.update(unread_count=models.F('unread_count') + unread, **values):
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(user_id=owner_id, other_user_id=other_id, unread_count=unread, **values)
+            except IntegrityError:
+                # Created concurrently by another request
+                entry.update(unread_count=models.F('unread_count') + unread, **values)
+
+    @classmethod
+    def record_messages(cls, messages):
+        """
+        record_message for messages from one sender to different recipients, e.g. a bulk send.
+        Uses a constant number of queries however many recipients there are.
+        """
+        sender_id = messages[0].sender_id
+        by_recipient = {m.recipient_id: m for m in messages}
+        recipients = list(by_recipient)
+        # The sender's own "note to self" entry is covered by the sender-side update and never unread
+        others = [r for r in recipients if r != sender_id]
+
+        pairs = [(sender_id, r) for r in recipients] + [(r, sender_id) for r in others]
+        existing = set(cls.objects.filter(
+            models.Q(user_id=sender_id, other_user_id__in=recipients) |
+            models.Q(user_id__in=others, other_user_id=sender_id)
+        ).values_list('user_id', 'other_user_id'))
+        missing = [cls(user_id=u, other_user_id=o) for u, o in pairs if (u, o) not in existing]
+        if missing:
+            # Rows created concurrently by another request are skipped and updated below
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+
+        def per_recipient(column, attr, output_field):
+            return models.Case(
+                *[models.When(**{column: r}, then=models.Value(getattr(m, attr))) for r, m in by_recipient.items()],
+                output_field=output_field,
+            )
+
+        cls.objects.filter(user_id=sender_id, other_user_id__in=recipients).update(
+            last_message=per_recipient('other_user_id', 'id', models.BigIntegerField()),
+            last_message_at=per_recipient('other_user_id', 'created_at', models.DateTimeField()),
+            last_sender_id=sender_id,
+        )
+        if others:
+            cls.objects.filter(user_id__in=others, other_user_id=sender_id).update(
+                last_message=per_recipient('user_id', 'id', models.BigIntegerField()),
+                last_message_at=per_recipient('user_id', 'created_at', models.DateTimeField()),
+                last_sender_id=sender_id,
+                unread_count=models.F('unread_count') + 1,
+            )
+
+    @classmethod
+    def mark_read(cls, user, other_user):
+        """
+        Mark every message from other_user to user as read, and take exactly those off the unread
+        count; none per message. The inbox row stays locked meanwhile, so a message sent
+        concurrently is either marked and subtracted, or left unread and counted.
+        """
+        with transaction.atomic():
+            entry = (
+                cls.objects.select_for_update()
+                .filter(user=user, other_user=other_user, unread_count__gt=0)
+                .values_list('pk', 'unread_count').first()
+            )
+            if entry is None:
+                return
+            marked = Message.objects.filter(sender=other_user, recipient=user, read=False).update(read=True)
+            cls.objects.filter(pk=entry[0]).update(unread_count=max(entry[1] - marked, 0))
+
 from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
@@ -77,30 +186,100 @@ class MediaPost(models.Model):
     media_file = models.FileField(upload_to='media_posts/', null=True, blank=True, verbose_name="Arquivo de Mídia (temp)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Summary of the post's MediaFile rows, kept up to date by feed/signals.py so
+    # list pages never need to query MediaFile (see refresh_file_summary)
+    media_type_flags = models.PositiveSmallIntegerField(default=0, editable=False)
+    file_total = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by feed/signals.py with F() updates; reconcile_media_counters repairs drift
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Part of the cache key of the rendered card (feed.utils.render_media_cards); bumped whenever
+    # the post, its files or its author's profile change
+    render_version = models.PositiveIntegerField(default=1, editable=False)
+
+    # Bits of media_type_flags
+    MEDIA_TYPE_BITS = {'image': 1, 'video': 2, 'document': 4}
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Post de Mídia"
         verbose_name_plural = "Posts de Mídia"
+        indexes = [
+            # Keyset pagination of the Tradução feed
+            models.Index(fields=['-created_at', '-id'], name='feed_mediapost_feed_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.user.fullname}"
 
+    def save(self, *args, **kwargs):
+        bump = self.pk is not None and not self._state.adding
+        if bump:
+            # Bumped in SQL like the other bump sites: this instance's value may predate one of theirs
+            self.render_version = models.F('render_version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'render_version'}
+        super().save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['render_version'])
+
+    def _prefetched_files(self):
+        return getattr(self, '_prefetched_objects_cache', {}).get('files')
+
+    def _has_media_type(self, media_type):
+        files = self._prefetched_files()
+        if files is not None:
+            return any(f.media_type == media_type for f in files)
+        return bool(self.media_type_flags & self.MEDIA_TYPE_BITS[media_type])
+
     @property
     def has_images(self):
-        return self.files.filter(media_type='image').exists()
+        return self._has_media_type('image')
 
     @property
     def has_videos(self):
-        return self.files.filter(media_type='video').exists()
+        return self._has_media_type('video')
 
     @property
     def has_documents(self):
-        return self.files.filter(media_type='document').exists()
+        return self._has_media_type('document')
 
     @property
     def file_count(self):
-        return self.files.count()
+        files = self._prefetched_files()
+        if files is not None:
+            return len(files)
+        return self.file_total
+
+    @classmethod
+    def adjust_counter(cls, post_id, field, delta):
+        """Add delta to like_count or comment_count in a single UPDATE, never going below zero"""
+        value = models.F(field) + delta if delta > 0 else Greatest(models.F(field) + delta, 0)
+        cls.objects.filter(pk=post_id).update(**{field: value})
+
+    @staticmethod
+    def actual_count(model):
+        """Per-post COUNT(*) of model rows, as an expression on MediaPost"""
+        per_post = model.objects.filter(media_post=models.OuterRef('pk')).order_by().values('media_post').annotate(n=models.Count('id')).values('n')
+        return Coalesce(models.Subquery(per_post, output_field=models.IntegerField()), models.Value(0))
+
+    @classmethod
+    def recount_counters(cls, post_ids):
+        """Set like_count / comment_count of these posts from COUNT(*); recounted inside the UPDATE itself"""
+        cls.objects.filter(pk__in=post_ids).update(
+            like_count=cls.actual_count(MediaLike), comment_count=cls.actual_count(MediaComment),
+        )
+
+    @classmethod
+    def refresh_file_summary(cls, post_id):
+        """Recompute media_type_flags and file_total of a post from its MediaFile rows"""
+        flags, total = 0, 0
+        for row in MediaFile.objects.filter(media_post_id=post_id).values('media_type').annotate(n=models.Count('id')).order_by():
+            flags |= cls.MEDIA_TYPE_BITS.get(row['media_type'], 0)
+            total += row['n']
+        cls.objects.filter(pk=post_id).update(
+            media_type_flags=flags, file_total=total, render_version=models.F('render_version') + 1,
+        )
 
     def get_media_types_display(self):
         """Return a string of all media types in this post"""
@@ -131,28 +310,17 @@ class MediaPost(models.Model):
 
     def user_has_access(self, user):
         """Check if user has access to this media post"""
-        if self.is_free:
-            return True
-        if self.user == user:  # Owner always has access
-            return True
-        if not user.is_authenticated:  # Anonymous users don't have access to paid content
-            return False
-        # Check if user has purchased access through MediaAccess system
-        return MediaAccess.objects.filter(user=user, media_post=self, has_access=True).exists()
-
-    @property
-    def like_count(self):
-        """Return the number of likes for this media post"""
-        return self.likes.count()
-
-    @property
-    def comment_count(self):
-        """Return the number of comments for this media post"""
-        return self.comments.count()
+        from .media_access import MediaAccessResolver
+        return MediaAccessResolver.for_user(user).has_access(self)
 
     def is_liked_by(self, user):
         """Check if user has liked this media post"""
         if user.is_authenticated:
+            if getattr(settings, 'MEDIA_LIKE_BUFFER', False):
+                # A toggle still waiting in the like buffer wins over the stored like
+                pending = self.pending_likes.filter(user=user).order_by('-id').values_list('liked', flat=True).first()
+                if pending is not None:
+                    return pending
             return self.likes.filter(user=user).exists()
         return False
 
@@ -172,6 +340,20 @@ class MediaFile(models.Model):
     media_type = models.CharField(max_length=10, choices=MEDIA_TYPE_CHOICES, verbose_name="Tipo de Mídia")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Videos: web rendition and poster frame written by the transcode_video job (feed/videos.py)
+    VIDEO_PENDING = 'pending'
+    VIDEO_READY = 'ready'
+    VIDEO_FAILED = 'failed'
+    VIDEO_STATUS_CHOICES = [
+        (VIDEO_PENDING, 'Na fila'),
+        (VIDEO_READY, 'Pronto'),
+        (VIDEO_FAILED, 'Falhou'),
+    ]
+    video_status = models.CharField(max_length=10, choices=VIDEO_STATUS_CHOICES, blank=True, verbose_name="Conversão do Vídeo")
+    video_rendition = models.FileField(upload_to='media_posts/web/', blank=True, verbose_name="Vídeo para Web")
+    # Public like image derivatives: nginx only serves media_posts/ originals through the access check
+    video_poster = models.FileField(upload_to='derivatives/posters/', blank=True, verbose_name="Capa do Vídeo")
+
     class Meta:
         ordering = ['created_at']
         verbose_name = "Arquivo de Mídia"
@@ -192,6 +374,8 @@ class MediaFile(models.Model):
                 self.media_type = 'image'
             elif file_extension in video_extensions:
                 self.media_type = 'video'
+                if not self.video_status:
+                    self.video_status = self.VIDEO_PENDING
             elif file_extension in document_extensions:
                 self.media_type = 'document'
         
@@ -210,40 +394,56 @@ class MediaFile(models.Model):
         return self.media_type == 'document'
 
     def get_file_size(self):
-        """Return formatted file size"""
+        """Return formatted file size, as recorded at upload"""
+        from .file_metadata import file_size, format_size
+
         if self.media_file:
-            try:
-                size = self.media_file.size
-                for unit in ['B', 'KB', 'MB', 'GB']:
-                    if size < 1024.0:
-                        return f"{size:.1f} {unit}"
-                    size /= 1024.0
-                return f"{size:.1f} TB"
-            except:
-                return "Tamanho desconhecido"
+            size = file_size(self.media_file)
+            return format_size(size) if size is not None else "Tamanho desconhecido"
         return "Sem arquivo"
 
-    def get_file_url(self):
-        """Return the URL of the media file if it exists"""
-        if self.media_file:
-            # Check if the file actually exists on disk
-            try:
-                if self.media_file.storage.exists(self.media_file.name):
-                    return self.media_file.url
-                else:
-                    # File doesn't exist (maybe moved to iCloud), return None
-                    return None
-            except:
-                # Any error accessing the file, return None
-                return None
-        return None
+    def get_file_url(self, size=None, fmt='webp'):
+        """
+        Return the URL of the media file, or None if it is known to be missing (see feed/file_metadata.py).
+        The original goes through media_file_view, which checks access (feed/protected_media.py);
+        for images, size picks a public resized derivative at least that wide, in fmt (feed/images.py).
+        """
+        from django.urls import reverse
+        from .file_metadata import file_url
+        from .images import derivative_url
+
+        if file_url(self.media_file) is None:
+            return None
+        if size is not None and self.is_image:
+            url = derivative_url(self.media_file, size, fmt)
+            if url:
+                return url
+        return reverse('feed:media_file', args=[self.pk])
+
+    @property
+    def has_video_rendition(self):
+        return self.is_video and self.video_status == self.VIDEO_READY and bool(self.video_rendition)
+
+    def get_video_url(self):
+        """URL of the faststart MP4 rendition once it is ready, else of the original (both access-checked)"""
+        from django.urls import reverse
+
+        if self.has_video_rendition:
+            return reverse('feed:media_file_rendition', args=[self.pk])
+        return self.get_file_url()
+
+    def get_poster_url(self):
+        """URL of the video's poster frame, or None until it is made"""
+        from .file_metadata import file_url
+
+        return file_url(self.video_poster) if self.is_video else None
 
     def should_block_content(self, user):
         """Check if this specific file should be blocked for user"""
         # Only block PDF/PPTX files for paid posts
         if self.media_post.is_free:
             return False
-        if self.media_post.user == user:  # Owner always has access
+        if self.media_post.user_id == user.id:  # Owner always has access
             return False
         if not self.is_document:  # Only block documents
             return False
@@ -266,10 +466,51 @@ class MediaLike(models.Model):
         return f"{self.user.fullname} liked {self.media_post.title}"
 
 
+class PendingMediaLike(models.Model):
+    """
+    A like toggle waiting in the like buffer (MEDIA_LIKE_BUFFER = True).
+    Appending here takes no lock on MediaLike or the post's counter; flush_media_likes
+    applies the latest state of each (user, post) to MediaLike in batches.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    media_post = models.ForeignKey(MediaPost, on_delete=models.CASCADE, related_name="pending_likes")
+    liked = models.BooleanField()
+    # +1 or -1: how this toggle moved the post's like count as users see it
+    delta = models.SmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['media_post', 'user', 'id'], name='feed_pendinglike_post_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {'+' if self.liked else '-'} {self.media_post_id}"
+
+    @classmethod
+    def record_toggle(cls, user, media_post):
+        """Flip the user's like on media_post in the buffer; returns (liked, like_count) as the user now sees them"""
+        with transaction.atomic():
+            # Two toggles of one user (a double click) read and append in turn, never both +1. The
+            # user row is locked rather than the post, so other users' likes of a viral post don't wait
+            get_user_model().objects.select_for_update().filter(pk=user.pk).values_list('pk').first()
+            liked = not media_post.is_liked_by(user)
+            cls.objects.create(user=user, media_post=media_post, liked=liked, delta=1 if liked else -1)
+        return liked, media_post.like_count + cls.pending_delta(media_post.pk)
+
+    @classmethod
+    def pending_delta(cls, post_id):
+        return cls.objects.filter(media_post_id=post_id).aggregate(total=models.Sum('delta'))['total'] or 0
+
+
 class MediaComment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="media_comments")
     media_post = models.ForeignKey(MediaPost, on_delete=models.CASCADE, related_name="comments")
+    # Replies are one level deep: parent is always a top-level comment
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name="replies")
     body = models.TextField(verbose_name="Comentário")
+    # Kept in step with the replies by feed/signals.py
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -277,10 +518,19 @@ class MediaComment(models.Model):
         ordering = ['-created_at']
         verbose_name = "Comentário de Mídia"
         verbose_name_plural = "Comentários de Mídia"
+        indexes = [
+            models.Index(fields=['media_post', '-created_at'], name='feed_mediacomment_post_idx'),
+            models.Index(fields=['parent', 'created_at'], name='feed_mediacomment_reply_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.fullname} commented on {self.media_post.title}: {self.body[:50]}..."
 
+    @classmethod
+    def adjust_reply_count(cls, comment_id, delta):
+        value = models.F('reply_count') + delta if delta > 0 else Greatest(models.F('reply_count') + delta, 0)
+        cls.objects.filter(pk=comment_id).update(reply_count=value)
+
 
 class MediaAccess(models.Model):
     """Model to track user access to paid media posts"""
@@ -294,6 +544,10 @@ class MediaAccess(models.Model):
         verbose_name = 'Acesso a Mídia Paga'
         verbose_name_plural = 'Acessos a Mídias Pagas'
         ordering = ['-created_at']
+        indexes = [
+            # Covers "which posts has this user been granted" without touching the table
+            models.Index(fields=['user', 'has_access', 'media_post'], name='feed_mediaaccess_granted_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.fullname} - {self.media_post.title} ({'Acesso' if self.has_access else 'Sem acesso'})"
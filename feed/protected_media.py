@@ -0,0 +1,147 @@
+"""
+Delivery of access-checked files (the originals of media post files).
+
+Views run the access check and then call serve_protected(), which hands the
+transfer to the front server according to PROTECTED_MEDIA_BACKEND:
+
+- 'django' (default, for local use): streamed by Django with FileResponse,
+  honouring single-range Range requests so videos can seek.
+- 'x-accel': nginx serves the file from an internal location
+  (X-Accel-Redirect to PROTECTED_MEDIA_INTERNAL_PREFIX + name).
+- 'x-sendfile': Apache mod_xsendfile / lighttpd serve the path in X-Sendfile.
+- 'signed': a redirect to PROTECTED_MEDIA_SIGNED_PREFIX + name with an
+  expiring token that nginx's secure_link module checks by itself:
+
+      location /signed-media/ {
+          secure_link $arg_md5,$arg_expires;
+          secure_link_md5 "$secure_link_expires$uri <PROTECTED_MEDIA_SIGNING_KEY>";
+          if ($secure_link = "") { return 403; }
+          if ($secure_link = "0") { return 410; }
+          alias /var/www/innovasus/media/;
+      }
+
+In the other modes the front server handles Range itself. In all of them the
+files must not also be reachable under MEDIA_URL (see
+HOSTINGER_DEPLOYMENT_GUIDE.md).
+"""
+import base64
+import hashlib
+import mimetypes
+import re
+import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _backend():
+    return getattr(settings, 'PROTECTED_MEDIA_BACKEND', 'django')
+
+
+def signing_token(uri, expires):
+    """nginx secure_link_md5 "$secure_link_expires$uri <key>": base64url md5, without padding"""
+    key = getattr(settings, 'PROTECTED_MEDIA_SIGNING_KEY', '')
+    if not key:
+        raise ImproperlyConfigured('PROTECTED_MEDIA_SIGNING_KEY must be set (and match nginx) to sign URLs')
+    digest = hashlib.md5(f'{expires}{uri} {key}'.encode(), usedforsecurity=False).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+def signed_url(name, ttl=None):
+    """URL of a stored file that nginx serves until it expires in ttl (PROTECTED_MEDIA_URL_TTL) seconds"""
+    ttl = getattr(settings, 'PROTECTED_MEDIA_URL_TTL', 300) if ttl is None else ttl
+    uri = getattr(settings, 'PROTECTED_MEDIA_SIGNED_PREFIX', '/signed-media/') + quote(name)
+    expires = int(time.time()) + ttl
+    return f'{uri}?md5={signing_token(uri, expires)}&expires={expires}'
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range Range header; None to send the whole file (no header,
+    or one we do not handle, such as several ranges); ValueError if it cannot be satisfied.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+class _RangeReader:
+    """length bytes of an open file, from its current position, for FileResponse"""
+
+    def __init__(self, file, length):
+        self.file, self.remaining = file, length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _django_response(request, field_file, content_type, size):
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = field_file.storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(_RangeReader(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def serve_protected(request, field_file):
+    """Response delivering field_file to a viewer who passed the access check"""
+    from .file_metadata import file_metadata
+
+    meta = file_metadata(field_file)
+    content_type = (meta.content_type if meta is not None else '') or mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    backend = _backend()
+
+    if backend == 'signed':
+        response = HttpResponseRedirect(signed_url(field_file.name))
+    elif backend == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = getattr(settings, 'PROTECTED_MEDIA_INTERNAL_PREFIX', '/protected-media/') + quote(field_file.name)
+    elif backend == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = field_file.path
+    elif backend == 'django':
+        size = meta.size if meta is not None and meta.size is not None else field_file.size
+        response = _django_response(request, field_file, content_type, size)
+    else:
+        raise ImproperlyConfigured(f'Unknown PROTECTED_MEDIA_BACKEND: {backend}')
+
+    # Access is per viewer: shared caches must not keep the file, nor anyone the short-lived redirect
+    response['Cache-Control'] = 'private, no-cache' if backend == 'signed' else 'private, max-age=300'
+    return response
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FileField
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from user.models import Follow
+from .article_models import Article
+from .community_message_models import CommunityMessage
+from .community_models import Community
+from .jobs import enqueue
+from .media_access import invalidate_media_access
+from .models import MediaAccess, MediaComment, MediaFile, MediaLike, MediaPost, Message
+from .utils import invalidate_sidebar
+
+
+def _invalidate_on_commit(*user_ids):
+    # After commit, so a concurrent request cannot cache the pre-change state again
+    transaction.on_commit(lambda: invalidate_sidebar(*user_ids))
+
+
+# A new or deleted message reorders the conversations of both users
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalidate_sidebar_on_message(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.sender_id, instance.recipient_id)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_sidebar_on_follow(sender, instance, **kwargs):
+    _invalidate_on_commit(instance.follower_id)
+
+
+@receiver(m2m_changed, sender=Community.members.through)
+def invalidate_sidebar_on_membership(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.joined_communities.add(...)
+        _invalidate_on_commit(instance.pk)
+    elif action == 'pre_clear':
+        _invalidate_on_commit(*instance.members.values_list('id', flat=True))
+    else:
+        _invalidate_on_commit(*pk_set)
+
+
+# Renaming a community or changing its picture changes the sidebar of every member
+@receiver(post_save, sender=Community)
+@receiver(pre_delete, sender=Community)
+def invalidate_sidebar_on_community(sender, instance, created=False, **kwargs):
+    if not created:
+        _invalidate_on_commit(*instance.members.values_list('id', flat=True))
+
+
+# Keep MediaPost.media_type_flags / file_total in step with the post's files
+@receiver(post_save, sender=MediaFile)
+@receiver(post_delete, sender=MediaFile)
+def refresh_media_post_file_summary(sender, instance, **kwargs):
+    MediaPost.refresh_file_summary(instance.media_post_id)
+
+
+# Grants come from MediaAccessRequest.save (approval) and the admin; both save MediaAccess rows
+@receiver(post_save, sender=MediaAccess)
+@receiver(post_delete, sender=MediaAccess)
+def invalidate_media_access_on_grant(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_media_access(instance.user_id))
+
+
+# Counter columns move in the same transaction as the like/comment row itself
+@receiver(post_save, sender=MediaLike)
+def count_media_like(sender, instance, created, **kwargs):
+    if created:
+        MediaPost.adjust_counter(instance.media_post_id, 'like_count', 1)
+
+
+@receiver(post_delete, sender=MediaLike)
+def uncount_media_like(sender, instance, **kwargs):
+    MediaPost.adjust_counter(instance.media_post_id, 'like_count', -1)
+
+
+@receiver(post_save, sender=MediaComment)
+def count_media_comment(sender, instance, created, **kwargs):
+    if created:
+        MediaPost.adjust_counter(instance.media_post_id, 'comment_count', 1)
+        if instance.parent_id:
+            MediaComment.adjust_reply_count(instance.parent_id, 1)
+
+
+@receiver(post_delete, sender=MediaComment)
+def uncount_media_comment(sender, instance, **kwargs):
+    MediaPost.adjust_counter(instance.media_post_id, 'comment_count', -1)
+    if instance.parent_id:
+        MediaComment.adjust_reply_count(instance.parent_id, -1)
+
+
+# The author's name, picture and affiliation are part of every cached card of theirs
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def bump_author_cards(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    MediaPost.objects.filter(user_id=instance.pk).update(render_version=F('render_version') + 1)
+
+
+# Size, type and checksum of new uploads (feed/file_metadata.py) and image derivatives (feed/images.py)
+# are computed by the run_jobs worker, not in the request; keyed by row, field and file name, so once per
+# file, and again when a name is reused after its file was deleted
+@receiver(post_save, sender=MediaFile)
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=CommunityMessage)
+@receiver(post_save, sender=Community)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def queue_upload_processing(sender, instance, update_fields=None, **kwargs):
+    for field in sender._meta.concrete_fields:
+        if isinstance(field, FileField) and (update_fields is None or field.name in update_fields):
+            name = getattr(instance, field.name).name
+            if name:
+                enqueue(
+                    'process_upload', key=f'upload:{sender._meta.label}:{instance.pk}:{field.name}:{name}', requeue=True,
+                    model=sender._meta.label, pk=instance.pk, field=field.name,
+                )
+
+
+# Files of deleted rows are removed by the worker, after checking nothing else points at them
+@receiver(post_delete, sender=MediaFile)
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=CommunityMessage)
+@receiver(post_delete, sender=Community)
+def queue_upload_deletion(sender, instance, **kwargs):
+    for field in sender._meta.concrete_fields:
+        if isinstance(field, FileField):
+            name = getattr(instance, field.name).name
+            if name:
+                enqueue('delete_upload', key=f'delete:{name}', requeue=True, name=name)
@@ -0,0 +1,75 @@
+"""
+Job functions run by the run_jobs worker (see feed/jobs.py).
+
+Each may run more than once (a retry after a failure, or after a worker
+died mid-job), so each checks what is already done before doing it.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.mail import send_mail
+
+from .file_metadata import ensure_recorded, file_metadata, forget_stored_file, is_referenced, lookup
+from .images import bump_cards, derivative_name, image_fields, process_image
+from .jobs import enqueue, job
+
+
+@job('send_email')
+def send_email(subject, message, recipient_list, from_email=None):
+    send_mail(subject, message, from_email or settings.EMAIL_HOST_USER, recipient_list, fail_silently=False)
+
+
+@job('process_upload')
+def process_upload(model, pk, field):
+    """Record the metadata of a new upload (feed/file_metadata.py) and write its image derivatives"""
+    instance = apps.get_model(model)._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field)
+    if not field_file:
+        return
+    ensure_recorded(field_file)
+    if model == 'feed.MediaFile' and field == 'media_file' and instance.video_status == instance.VIDEO_PENDING:
+        enqueue('transcode_video', key=f'transcode:{pk}:{field_file.name}', requeue=True, pk=pk)
+    for image, kind in image_fields(instance):
+        if image.field.name == field and file_metadata(image).variants is None:
+            if process_image(image, kind).variants:
+                bump_cards(model, [instance])
+
+
+# ffmpeg may run for minutes: not inside a transaction, which would hold the MediaFile's locks meanwhile,
+# and never in a request (JOB_QUEUE_EAGER); without a worker, videos play their original
+@job('transcode_video', atomic=False, eager=False)
+def transcode_video(pk):
+    """Write the web MP4 rendition and poster frame of a video MediaFile (feed/videos.py)"""
+    from .models import MediaFile
+    from .videos import transcode_video as transcode
+
+    media_file = MediaFile.objects.filter(pk=pk).first()
+    if media_file is not None and transcode(media_file):
+        bump_cards('feed.MediaFile', [media_file])
+
+
+@job('delete_upload')
+def delete_upload(name):
+    """Delete a file, its derivatives and its metadata once no row refers to it any more"""
+    if is_referenced(name):
+        # Replaced by a row pointing at the same file (e.g. archived messages keep their files)
+        return
+    meta = lookup([name]).get(name)
+    for variant in (meta.variants or []) if meta is not None else []:
+        size, fmt = variant.split('.')
+        default_storage.delete(derivative_name(name, size, fmt))
+    default_storage.delete(name)
+    forget_stored_file(name)
+
+
+@job('expire_upload')
+def expire_upload(upload_id):
+    """Remove a chunked upload that was never attached to a post (feed/uploads.py)"""
+    from .upload_models import UploadSession
+    from .uploads import discard_upload
+
+    session = UploadSession.objects.filter(pk=upload_id).first()
+    if session is not None:
+        discard_upload(session)
@@ -9,3 +9,21 @@ def get_item(dictionary, key):
 @register.filter(name='add_class')
 def add_class(field, css):
     return field.as_widget(attrs={**field.field.widget.attrs, 'class': css})
+
+# Resized image URLs (feed/images.py): {{ user|profile_picture_url:80 }}, sized for how large the
+# picture is shown; 2x the CSS size, so it stays sharp on high-density screens
+@register.filter
+def profile_picture_url(user, size=None):
+    return user.get_profile_picture_url(size)
+
+@register.filter
+def community_picture_url(community, size=None):
+    return community.get_community_picture_url(size)
+
+@register.filter
+def media_image_url(media_file, size=None):
+    return media_file.get_file_url(size)
+
+@register.filter
+def media_image_jpg_url(media_file, size=None):
+    return media_file.get_file_url(size, fmt='jpg')
@@ -1,3 +1,1226 @@
-from django.test import TestCase
+import base64
+import hashlib
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .community_models import Community
+from .file_models import StoredFile
+from .job_models import Job
+from .media_access import MediaAccessResolver, access_version
+from .models import (
+    Conversation, MediaAccess, MediaAccessRequest, MediaComment, MediaFile, MediaLike, MediaPost, Message,
+    PendingMediaLike,
+)
+from .utils import get_media_card_cache_stats, get_media_feed, get_media_feed_page, reset_media_card_cache_stats
+
+User = get_user_model()
+
+
+def run_jobs():
+    """Run the background jobs queued so far, as the run_jobs worker would"""
+    call_command('run_jobs', '--once', stdout=StringIO())
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ana, self.bia, self.caio, self.davi, self.eva = [
+            User.objects.create_user(f'{name}@example.com', name.title(), 'pw', is_active=True, email_verified=True)
+            for name in ('ana', 'bia', 'caio', 'davi', 'eva')
+        ]
+        self.start = timezone.now() - timedelta(hours=1)
+
+    def send(self, sender, recipient, minutes, record=True):
+        message = Message.objects.create(
+            sender=sender, recipient=recipient, body='oi', created_at=self.start + timedelta(minutes=minutes),
+        )
+        if record:
+            Conversation.record_message(message)
+        return message
+
+    def entries(self):
+        return {
+            (c.user_id, c.other_user_id): (c.last_message_id, c.last_sender_id, c.unread_count)
+            for c in Conversation.objects.all()
+        }
+
+    def test_record_message_updates_both_sides(self):
+        first = self.send(self.ana, self.bia, 1)
+        self.assertEqual(self.entries(), {
+            (self.ana.pk, self.bia.pk): (first.pk, self.ana.pk, 0),
+            (self.bia.pk, self.ana.pk): (first.pk, self.ana.pk, 1),
+        })
+        reply = self.send(self.bia, self.ana, 2)
+        # Replying does not read what was received
+        self.assertEqual(self.entries(), {
+            (self.ana.pk, self.bia.pk): (reply.pk, self.bia.pk, 1),
+            (self.bia.pk, self.ana.pk): (reply.pk, self.bia.pk, 1),
+        })
+
+    def test_sidebar_ordered_by_last_message(self):
+        from user.models import Follow
+        from .utils import get_top_message_users
+
+        for followed in (self.bia, self.caio, self.davi):
+            Follow.objects.create(follower=self.ana, following=followed)
+        self.send(self.caio, self.ana, 1)
+        self.send(self.ana, self.bia, 2)
+        self.send(self.eva, self.ana, 3)  # Not followed: not in the sidebar
+        # Followed users not messaged yet fill the remaining slots
+        self.assertEqual(get_top_message_users(self.ana, limit=3), [self.bia, self.caio, self.davi])
+        self.assertEqual(get_top_message_users(self.ana, limit=1), [self.bia])
+
+    def test_backfill_rebuilds_idempotently(self):
+        self.send(self.ana, self.bia, 1, record=False)
+        last = self.send(self.bia, self.ana, 2, record=False)
+        self.send(self.caio, self.ana, 3, record=False)
+        Message.objects.filter(sender=self.caio).update(read=True)
+        call_command('backfill_conversations', batch_size=1, stdout=StringIO())
+        expected = self.entries()
+        # Each side counts what it received and has not read
+        self.assertEqual(expected[(self.ana.pk, self.bia.pk)], (last.pk, self.bia.pk, 1))
+        self.assertEqual(expected[(self.bia.pk, self.ana.pk)], (last.pk, self.bia.pk, 1))
+        self.assertEqual(expected[(self.ana.pk, self.caio.pk)][2], 0)
+        self.assertEqual(len(expected), 4)
+
+        # Drifted rows are rebuilt, and no row is added twice
+        Conversation.objects.update(last_message=None, unread_count=9)
+        call_command('backfill_conversations', stdout=StringIO())
+        self.assertEqual(self.entries(), expected)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.user)
+
+    def make_users(self, count, prefix):
+        return [
+            User.objects.create_user(f'{prefix}{i}@example.com', f'{prefix.title()} {i}', 'pw', is_active=True, email_verified=True)
+            for i in range(count)
+        ]
+
+    def test_partners_not_followed_are_listed(self):
+        from user.models import Follow
+
+        followed, stranger = self.make_users(2, 'user')
+        Follow.objects.create(follower=self.user, following=followed)
+        Conversation.record_message(Message.objects.create(sender=stranger, recipient=self.user, body='olá'))
+
+        inbox = self.client.get(reverse('feed:mensagens')).context['conversations']
+        # Conversations first, then followed users not messaged yet
+        self.assertEqual(
+            [(c['id'], c['last_message'], c['unread_count']) for c in inbox],
+            [(stranger.pk, 'olá', 1), (followed.pk, '', 0)],
+        )
+
+    def test_one_query_however_many_follows(self):
+        from user.models import Follow
+        from .utils import get_inbox_conversations
+
+        listed = 0
+        for size in (2, 20):
+            listed += size
+            users = self.make_users(size, f'size{size}-')
+            Follow.objects.bulk_create(Follow(follower=self.user, following=u) for u in users)
+            for other in users[::2]:
+                Conversation.record_message(Message.objects.create(sender=other, recipient=self.user, body='oi'))
+            with self.assertNumQueries(1):
+                inbox = list(get_inbox_conversations(self.user))
+            self.assertEqual(len(inbox), listed)
+
+
+class MessagePagingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+        third = User.objects.create_user('caio@example.com', 'Caio', 'pw', is_active=True, email_verified=True)
+        # One timestamp for all: the order comes from the id tie-break of the keyset
+        self.now = timezone.now()
+        self.ids = [
+            Message.objects.create(
+                sender=self.user if i % 2 else self.other, recipient=self.other if i % 2 else self.user,
+                body=f'm{i}', created_at=self.now,
+            ).id
+            for i in range(7)
+        ]
+        self.elsewhere = Message.objects.create(sender=third, recipient=self.user, body='x', created_at=self.now)
+        self.client.force_login(self.user)
+
+    def page(self, **params):
+        response = self.client.get(reverse('feed:get_messages_api'), {'user_id': self.other.pk, 'limit': 3, **params})
+        return response.status_code, response.json()
+
+    def ids_of(self, data):
+        return [m['id'] for m in data['messages']]
+
+    def test_pages_back_with_before_id(self):
+        _, data = self.page()
+        self.assertEqual((self.ids_of(data), data['has_more']), (self.ids[4:], True))
+        _, data = self.page(before_id=data['oldest_id'])
+        self.assertEqual((self.ids_of(data), data['has_more']), (self.ids[1:4], True))
+        _, data = self.page(before_id=data['oldest_id'])
+        self.assertEqual((self.ids_of(data), data['has_more']), (self.ids[:1], False))
+
+    def test_polls_forward_with_since_id(self):
+        _, data = self.page(since_id=self.ids[0])
+        self.assertEqual((self.ids_of(data), data['has_more']), (self.ids[1:4], True))
+        _, data = self.page(since_id=self.ids[-1])
+        self.assertEqual((self.ids_of(data), data['newest_id']), ([], None))
+
+        new = Message.objects.create(sender=self.other, recipient=self.user, body='new', created_at=self.now)
+        _, data = self.page(since_id=self.ids[-1])
+        self.assertEqual(self.ids_of(data), [new.id])
+
+        # A cursor from another conversation is refused
+        self.assertEqual(self.page(since_id=self.elsewhere.id)[0], 400)
+
+
+class UnreadMessageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.other)
+        for body in ('um', 'dois', 'três'):
+            self.client.post(reverse('feed:send_message_api'), {'user_id': self.user.pk, 'body': body})
+        self.client.force_login(self.user)
+
+    def unread(self, user, other):
+        return Conversation.objects.get(user=user, other_user=other).unread_count
+
+    def test_counts_and_mark_read(self):
+        self.assertEqual((self.unread(self.user, self.other), self.unread(self.other, self.user)), (3, 0))
+        inbox = self.client.get(reverse('feed:mensagens')).context['conversations']
+        self.assertEqual([(c['id'], c['unread_count']) for c in inbox], [(self.other.pk, 3)])
+
+        Conversation.mark_read(self.user, self.other)
+        self.assertEqual(self.unread(self.user, self.other), 0)
+        self.assertFalse(Message.objects.filter(recipient=self.user, read=False).exists())
+        with CaptureQueriesContext(connection) as queries:
+            Conversation.mark_read(self.user, self.other)
+        # Nothing unread: nothing written
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE')])
+
+    def test_mark_read_api_and_opening_the_conversation(self):
+        self.assertEqual(self.client.post(reverse('feed:mark_read_api'), {'user_id': self.other.pk}).json(), {'success': True})
+        self.assertEqual(self.unread(self.user, self.other), 0)
+
+        self.client.force_login(self.other)
+        self.client.post(reverse('feed:send_message_api'), {'user_id': self.user.pk, 'body': 'quatro'})
+        self.client.force_login(self.user)
+        self.assertEqual(self.unread(self.user, self.other), 1)
+        self.client.get(reverse('feed:get_messages_api'), {'user_id': self.other.pk})
+        self.assertEqual(self.unread(self.user, self.other), 0)
+        # Loading older messages is not reading new ones
+        self.client.force_login(self.other)
+        newest = self.client.post(reverse('feed:send_message_api'), {'user_id': self.user.pk, 'body': 'cinco'}).json()
+        self.client.force_login(self.user)
+        self.client.get(reverse('feed:get_messages_api'), {'user_id': self.other.pk, 'before_id': newest['message']['id']})
+        self.assertEqual(self.unread(self.user, self.other), 1)
+
+
+class HotQueryPlanTests(TestCase):
+    def test_no_hot_query_scans_a_table(self):
+        # Fails (CommandError) if a migration drops an index one of them relies on
+        out = StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        self.assertNotIn('❌', out.getvalue())
+
+        # A query no index serves is reported and fails the command
+        from .management.commands import explain_hot_queries
+
+        unindexed = ('get_media_comments', 'by body', MediaComment.objects.filter(body='x'))
+        queries = explain_hot_queries.hot_queries() + [unindexed]
+        with mock.patch.object(explain_hot_queries, 'hot_queries', return_value=queries):
+            with self.assertRaises(CommandError):
+                call_command('explain_hot_queries', stdout=StringIO())
+
+
+class MessageArchiveTests(TestCase):
+    def setUp(self):
+        from datetime import timedelta
+
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+        now = timezone.now()
+        self.ids = []
+        for i in range(6):
+            # Four old messages, two recent ones
+            created = now - timedelta(days=300 - i) if i < 4 else now - timedelta(minutes=10 - i)
+            message = Message.objects.create(
+                sender=self.other if i % 2 else self.user, recipient=self.user if i % 2 else self.other,
+                body=f'm{i}', created_at=created, read=True,
+            )
+            Conversation.record_message(message)
+            self.ids.append(message.id)
+        call_command('archive_messages', '--days', '180', stdout=StringIO())
+
+    def test_pages_cross_into_the_archive(self):
+        from .archive_models import ArchivedMessage
+        from .utils import find_conversation_cursor, get_conversation_page
+
+        self.assertEqual(list(ArchivedMessage.objects.order_by('id').values_list('id', flat=True)), self.ids[:4])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('id', flat=True)), self.ids[4:])
+
+        page, has_more = get_conversation_page(self.user, self.other, 3)
+        self.assertEqual(([m.id for m in page], has_more), (self.ids[3:], True))
+        cursor = find_conversation_cursor(self.user, self.other, page[0].id)
+        self.assertEqual(cursor[1], self.ids[3])  # found in the archive
+        page, has_more = get_conversation_page(self.user, self.other, 3, before=cursor)
+        self.assertEqual(([m.id for m in page], has_more), (self.ids[:3], False))
+
+        # And forward again, from an archived cursor into the hot table
+        cursor = find_conversation_cursor(self.user, self.other, self.ids[1])
+        page, has_more = get_conversation_page(self.user, self.other, 3, after=cursor)
+        self.assertEqual(([m.id for m in page], has_more), (self.ids[2:5], True))
+
+        # Another pair's messages are no cursor here
+        third = User.objects.create_user('caio@example.com', 'Caio', 'pw', is_active=True, email_verified=True)
+        self.assertIsNone(find_conversation_cursor(self.user, third, self.ids[0]))
+
+    @override_settings(COMMUNITY_ARCHIVE_PAGE_SIZE=2)
+    def test_community_history_is_paged(self):
+        from .community_message_models import CommunityMessage
+
+        community = Community.objects.create(name='Grupo', created_by=self.user)
+        community.members.add(self.user)
+        now = timezone.now()
+        ids = [CommunityMessage.objects.create(community=community, user=self.user, body=f'c{i}').id for i in range(6)]
+        # created_at is auto_now_add: five old messages, one recent
+        for i, pk in enumerate(ids[:5]):
+            CommunityMessage.objects.filter(pk=pk).update(created_at=now - timedelta(days=300 - i))
+        call_command('archive_messages', '--days', '180', stdout=StringIO())
+        self.client.force_login(self.user)
+        url = reverse('feed:community_detail', args=[community.pk])
+
+        def shown(**params):
+            context = self.client.get(url, params).context
+            return [m.id for m in context['community_messages']], context['older_archived_id']
+
+        self.assertEqual(shown(), ([ids[5]], None))
+        self.assertTrue(self.client.get(url).context['has_archived_messages'])
+        self.assertEqual(shown(historico='1'), ([ids[3], ids[4], ids[5]], ids[3]))
+        self.assertEqual(shown(historico='1', before_id=ids[3]), ([ids[1], ids[2], ids[5]], ids[1]))
+        self.assertEqual(shown(historico='1', before_id=ids[1]), ([ids[0], ids[5]], None))
+
+
+class MessageSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+        stranger = User.objects.create_user('caio@example.com', 'Caio', 'pw', is_active=True, email_verified=True)
+        self.sent = Message.objects.create(sender=self.user, recipient=self.other, body='Segue o relatório de dados')
+        self.received = Message.objects.create(sender=self.other, recipient=self.user, body='<b>Relatório</b> revisado')
+        Message.objects.create(sender=stranger, recipient=self.other, body='relatório secreto')
+        self.client.force_login(self.user)
+
+    def search(self, **params):
+        return self.client.get(reverse('feed:search_messages_api'), params).json()
+
+    def test_only_own_conversations_newest_first(self):
+        data = self.search(q='relatorio')
+        self.assertEqual([r['id'] for r in data['results']], [self.received.id, self.sent.id])
+        self.assertEqual(data['results'][0]['other_user'], {'id': self.other.pk, 'fullname': 'Bia'})
+        self.assertEqual([r['id'] for r in self.search(q='relat dados')['results']], [self.sent.id])
+        self.assertEqual(self.search(q='secreto')['results'], [])
+
+        # Paging
+        data = self.search(q='relatorio', limit=1)
+        self.assertEqual((data['has_more'], data['next_before_id']), (True, self.received.id))
+        data = self.search(q='relatorio', before_id=data['next_before_id'])
+        self.assertEqual(([r['id'] for r in data['results']], data['has_more']), ([self.sent.id], False))
+
+    def test_highlight(self):
+        from .message_search import highlight
+
+        # Accents and case are ignored when matching, the body is escaped
+        snippet = self.search(q='relatorio')['results'][0]['snippet']
+        self.assertEqual(snippet, '&lt;b&gt;<mark>Relatório</mark>&lt;/b&gt; revisado')
+        snippet = highlight('x ' * 100 + 'dados finais', 'dados', width=20)
+        self.assertTrue(snippet.startswith('…') and '<mark>dados</mark>' in snippet)
+
+
+class BulkMessageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.bia = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+        self.caio = User.objects.create_user('caio@example.com', 'Caio', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.user)
+
+    def send(self, **data):
+        return self.client.post(reverse('feed:send_message_api'), data)
+
+    def entry(self, user, other):
+        return Conversation.objects.get(user=user, other_user=other)
+
+    def test_one_message_per_recipient(self):
+        data = self.send(user_ids=f'{self.bia.pk},{self.caio.pk},{self.bia.pk}', body='Reunião amanhã').json()
+        self.assertEqual(sorted(m['recipient_id'] for m in data['messages']), [self.bia.pk, self.caio.pk])
+        self.send(user_id=self.bia.pk, body='Às 10h')
+
+        bia, caio = self.entry(self.bia, self.user), self.entry(self.caio, self.user)
+        self.assertEqual((bia.unread_count, caio.unread_count), (2, 1))
+        self.assertEqual((bia.last_message.body, caio.last_message.body), ('Às 10h', 'Reunião amanhã'))
+        # The sender's own entries point at the message sent to each, and are never unread
+        for other, body in ((self.bia, 'Às 10h'), (self.caio, 'Reunião amanhã')):
+            entry = self.entry(self.user, other)
+            self.assertEqual((entry.last_message.body, entry.last_sender_id, entry.unread_count), (body, self.user.pk, 0))
+
+    def test_backends_without_returned_ids(self):
+        # An identical send stored in the same instant must not be mistaken for this one's rows
+        now = timezone.now()
+        earlier = Message.objects.create(sender=self.user, recipient=self.bia, body='oi', created_at=now)
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', new_callable=mock.PropertyMock, return_value=False), \
+                mock.patch('feed.views_message_api.timezone.now', return_value=now):
+            data = self.send(user_ids=f'{self.bia.pk},{self.caio.pk}', body='oi').json()
+        ids = [m['id'] for m in data['messages']]
+        self.assertEqual(len(ids), 2)
+        self.assertNotIn(earlier.pk, ids)
+        to_bia = next(m['id'] for m in data['messages'] if m['recipient_id'] == self.bia.pk)
+        self.assertEqual(self.entry(self.bia, self.user).last_message_id, to_bia)
+
+    def test_all_recipients_validated_first(self):
+        response = self.send(user_ids=[self.bia.pk, 999999], body='oi')
+        self.assertEqual((response.status_code, response.json()['user_ids']), (404, [999999]))
+        self.assertEqual(self.send(user_ids='abc', body='oi').status_code, 400)
+        with override_settings(MESSAGE_MAX_RECIPIENTS=1):
+            self.assertEqual(self.send(user_ids=f'{self.bia.pk},{self.caio.pk}', body='oi').status_code, 400)
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(Conversation.objects.exists())
+
+
+class SidebarCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('bia@example.com', 'Bia', 'pw', is_active=True, email_verified=True)
+
+    def top_users(self):
+        from .utils import get_sidebar_data
+
+        return [u.pk for u in get_sidebar_data(self.user)['top_message_users']]
+
+    def test_only_cached_in_a_shared_cache(self):
+        from user.models import Follow
+        from .utils import get_sidebar_cache_stats
+
+        # LocMemCache: another worker could not see the invalidation, so nothing is cached
+        cache.clear()
+        self.top_users()
+        self.assertEqual(get_sidebar_cache_stats()['misses'], 0)
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(self.top_users(), [])
+            with self.assertNumQueries(0):
+                self.top_users()
+            with self.captureOnCommitCallbacks(execute=True):
+                Follow.objects.create(follower=self.user, following=self.other)
+            self.assertEqual(self.top_users(), [self.other.pk])
+
+
+class MessagePushTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ana@example.com', 'Ana', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.user)
+
+    @override_settings(MESSAGE_POLL_TIMEOUT_SECONDS=30)
+    def test_wsgi_requests_never_wait(self):
+        started = time.monotonic()
+        data = self.client.get(reverse('feed:message_poll')).json()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(data, {'messages': [], 'last_id': 0})
+        # EventSource stops reconnecting on 204
+        self.assertEqual(self.client.get(reverse('feed:message_stream')).status_code, 204)
+
+        response = self.client.get(reverse('feed:mensagens'))
+        self.assertFalse(response.context['use_event_stream'])
+
+    def test_background_requests_are_not_activity(self):
+        session = self.client.session
+        session['last_activity'] = 1000
+        session.save()
+        with override_settings(INACTIVITY_TIMEOUT_SECONDS=10 ** 10):
+            self.client.get(reverse('feed:message_poll'), headers={'X-Background-Request': '1'})
+            self.assertEqual(self.client.session['last_activity'], 1000)
+            self.client.get(reverse('feed:mensagens'))
+            self.assertGreater(self.client.session['last_activity'], 1000)
+
+
+class MediaFeedQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = User.objects.create_user('viewer@example.com', 'Viewer', 'pw', is_active=True, email_verified=True)
+        cls.author = User.objects.create_user('author@example.com', 'Author', 'pw', is_active=True, email_verified=True)
+
+    def setUp(self):
+        # Cached sidebars and access sets would outlive the rolled-back rows of other tests
+        cache.clear()
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = MediaPost.objects.create(
+                user=self.author, title=f'Post {i}', description='...',
+                payment_type='paid' if i % 2 else 'free', price=10 if i % 2 else None,
+            )
+            MediaFile.objects.create(media_post=post, media_file=f'media_posts/{i}.jpg')
+            MediaFile.objects.create(media_post=post, media_file=f'media_posts/{i}.pdf')
+            MediaLike.objects.create(user=self.viewer, media_post=post)
+            MediaComment.objects.create(user=self.viewer, media_post=post, body='!')
+            if i % 4 == 1:
+                MediaAccess.objects.create(user=self.viewer, media_post=post)
+        run_jobs()
+
+    def render_feed(self):
+        self.client.force_login(self.viewer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('feed:media_post'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_annotations(self):
+        self.add_posts(4)
+        with self.assertNumQueries(2):
+            posts = list(get_media_feed(self.viewer))
+            for post in posts:
+                self.assertEqual(post.like_count, 1)
+                self.assertEqual(post.comment_count, 1)
+                self.assertTrue(post.is_liked_by_user)
+                self.assertEqual(len(post.files.all()), 2)
+        self.assertEqual([p.user_has_access(self.viewer) for p in posts], [False, True, True, True])
+
+    def test_render_cost_does_not_grow_with_posts(self):
+        self.add_posts(2)
+        self.render_feed()  # warms the sidebar cache
+        # Cold cards, like the ones about to be added
+        MediaPost.objects.update(render_version=F('render_version') + 1)
+        few = self.render_feed()
+        self.add_posts(10)
+        with self.assertNumQueries(few):
+            self.client.get(reverse('feed:media_post'))
+
+    def test_save_of_a_stale_instance_still_moves_the_version_on(self):
+        post = MediaPost.objects.create(user=self.viewer, title='Post', description='...')
+        stale = MediaPost.objects.get(pk=post.pk)
+        MediaPost.objects.filter(pk=post.pk).update(render_version=F('render_version') + 1)  # e.g. bump_cards
+        stale.title = 'Editado'
+        stale.save()
+        self.assertEqual(stale.render_version, 3)
+        self.assertEqual(MediaPost.objects.get(pk=post.pk).render_version, 3)
+
+    def test_cached_cards(self):
+        self.add_posts(4)
+        self.render_feed()  # warms the sidebar cache
+        MediaPost.objects.update(render_version=F('render_version') + 1)
+        reset_media_card_cache_stats()
+        cold = self.render_feed()
+        warm = self.render_feed()
+        self.assertEqual(warm, cold - 1)  # no files query
+        self.assertEqual(get_media_card_cache_stats()['hits'], 4)
+
+        # Viewer state is layered on the shared card
+        other = User.objects.create_user('other@example.com', 'Other', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(other)
+        response = self.client.get(reverse('feed:media_post'))
+        # Only the paid post the first viewer was granted needs its locked variant rendered
+        self.assertEqual(get_media_card_cache_stats()['hits'], 7)
+        self.assertEqual(response.content.decode().count('PDF Bloqueado'), 2)
+        self.assertFalse(any(post.is_liked_by_user for post in response.context['media_posts']))
+
+        post = MediaPost.objects.order_by('-created_at').first()
+        post.title = 'Renamed'
+        post.save()
+        self.assertContains(self.client.get(reverse('feed:media_post')), 'Renamed')
+
+    def fetch_pages(self, **params):
+        """Post ids of the first page and every media_feed_api page after it"""
+        self.client.force_login(self.viewer)
+        response = self.client.get(reverse('feed:media_post'), params)
+        ids = [post.id for post in response.context['media_posts']]
+        has_more = response.context['has_more']
+        while has_more:
+            data = self.client.get(reverse('feed:media_feed_api'), {**params, 'before_id': ids[-1]}).json()
+            ids += [int(i) for i in re.findall(r'id="comments-panel-(\d+)"', data['html'])]
+            has_more = data['has_more']
+        return ids
+
+    def test_infinite_scroll_pages(self):
+        self.add_posts(23)
+        self.assertEqual(self.fetch_pages(), list(MediaPost.objects.values_list('id', flat=True)))
+        self.assertEqual(
+            self.fetch_pages(q='Post 1'),
+            list(MediaPost.objects.filter(title__startswith='Post 1').values_list('id', flat=True)),
+        )
+
+
+class MediaPostFileSummaryTests(TestCase):
+    def test_summary_follows_files(self):
+        author = User.objects.create_user('author@example.com', 'Author', 'pw', is_active=True, email_verified=True)
+        post = MediaPost.objects.create(user=author, title='Post', description='...')
+        image = MediaFile.objects.create(media_post=post, media_file='media_posts/a.jpg')
+        MediaFile.objects.create(media_post=post, media_file='media_posts/b.pdf')
+        image.delete()
+
+        post = MediaPost.objects.get(pk=post.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(post.file_count, 1)
+            self.assertFalse(post.has_images)
+            self.assertTrue(post.has_documents)
+            self.assertEqual(post.get_media_types_display(), 'Documentos')
+
+
+class MediaAccessResolverTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_granted_set_is_cached_until_a_grant_changes(self):
+        viewer = User.objects.create_user('viewer@example.com', 'Viewer', 'pw', is_active=True, email_verified=True)
+        author = User.objects.create_user('author@example.com', 'Author', 'pw', is_active=True, email_verified=True)
+        post = MediaPost.objects.create(user=author, title='Paid', description='...', payment_type='paid', price=10)
+
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': cache_dir.name}}
+        with override_settings(CACHES=shared):
+            self.assertFalse(MediaAccessResolver(viewer).has_access(post))
+            with self.assertNumQueries(0):
+                self.assertFalse(MediaAccessResolver(viewer).has_access(post))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                MediaAccessRequest.objects.create(user=viewer, media_post=post, payment_slip='slip.pdf', approved=True)
+            self.assertTrue(MediaAccessResolver(viewer).has_access(post))
+
+            with self.captureOnCommitCallbacks(execute=True):
+                MediaAccess.objects.filter(user=viewer).delete()
+            self.assertFalse(MediaAccessResolver(viewer).has_access(post))
+            self.assertTrue(MediaAccessResolver(author).has_access(post))
+
+    def test_per_process_cache_reads_the_database(self):
+        viewer = User.objects.create_user('viewer@example.com', 'Viewer', 'pw', is_active=True, email_verified=True)
+        author = User.objects.create_user('author@example.com', 'Author', 'pw', is_active=True, email_verified=True)
+        post = MediaPost.objects.create(user=author, title='Paid', description='...', payment_type='paid', price=10)
+        MediaAccess.objects.create(user=viewer, media_post=post, has_access=True)
+        granted = access_version(User.objects.get(pk=viewer.pk))
+        self.assertTrue(MediaAccessResolver(viewer).has_access(post))
+
+        # A revocation made by another worker: no signal reaches this process's cache
+        MediaAccess.objects.filter(user=viewer).update(has_access=False)
+        self.assertFalse(MediaAccessResolver(viewer).has_access(post))
+        self.assertNotEqual(access_version(User.objects.get(pk=viewer.pk)), granted)
+
+
+class MediaPostCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('viewer@example.com', 'Viewer', 'pw', is_active=True, email_verified=True)
+        self.post = MediaPost.objects.create(user=self.user, title='Post', description='...')
+        self.client.force_login(self.user)
+
+    def test_writes_move_the_columns(self):
+        like_url = reverse('feed:toggle_media_like', args=[self.post.id])
+        self.assertEqual(self.client.post(like_url).json()['like_count'], 1)
+        self.assertEqual(self.client.post(like_url).json()['like_count'], 0)
+        response = self.client.post(
+            reverse('feed:add_media_comment', args=[self.post.id]), {'body': 'Olá'}, content_type='application/json',
+        )
+        self.assertEqual(response.json()['comment_count'], 1)
+        MediaComment.objects.get().delete()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (0, 0))
+
+    def test_reconcile_fixes_drift(self):
+        MediaLike.objects.create(user=self.user, media_post=self.post)
+        MediaPost.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=3)
+        out = StringIO()
+        call_command('reconcile_media_counters', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.comment_count), (1, 0))
+        self.assertIn('1 fixed', out.getvalue())
+
+
+class MediaLikeBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('liker@example.com', 'Liker', 'pw', is_active=True, email_verified=True)
+        self.post = MediaPost.objects.create(user=self.user, title='Post', description='...')
+        self.client.force_login(self.user)
+
+    @override_settings(MEDIA_LIKE_BUFFER=True)
+    def test_toggles_are_buffered_then_flushed(self):
+        like_url = reverse('feed:toggle_media_like', args=[self.post.id])
+        responses = [self.client.post(like_url).json() for _ in range(3)]
+        self.assertEqual([(r['liked'], r['like_count']) for r in responses], [(True, 1), (False, 0), (True, 1)])
+        self.assertFalse(MediaLike.objects.exists())
+
+        [media], _ = get_media_feed_page(self.user, 10)
+        self.assertEqual((media.is_liked_by_user, media.like_count), (True, 1))
+
+        call_command('flush_media_likes', batch_size=2, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertTrue(MediaLike.objects.filter(user=self.user, media_post=self.post).exists())
+        self.assertFalse(PendingMediaLike.objects.exists())
+
+        self.assertEqual(self.client.post(like_url).json(), {'success': True, 'liked': False, 'like_count': 0})
+        call_command('flush_media_likes', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(MediaLike.objects.exists())
+
+    def test_buffer_not_read_when_off(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(self.post.is_liked_by(self.user))
+
+
+@override_settings(MEDIA_COMMENTS_PAGE_SIZE=3)
+class MediaCommentPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('reader@example.com', 'Reader', 'pw', is_active=True, email_verified=True)
+        self.post = MediaPost.objects.create(user=self.user, title='Post', description='...')
+        self.client.force_login(self.user)
+        self.url = reverse('feed:get_media_comments', args=[self.post.id])
+
+    def comment(self, body, parent_id=None):
+        response = self.client.post(
+            reverse('feed:add_media_comment', args=[self.post.id]),
+            {'body': body, 'parent_id': parent_id}, content_type='application/json',
+        )
+        return response.json()['comment']
+
+    def test_pages_and_threads(self):
+        for i in range(5):
+            commenter = User.objects.create_user(f'c{i}@example.com', f'C{i}', 'pw', is_active=True, email_verified=True)
+            MediaComment.objects.create(user=commenter, media_post=self.post, body=f'top {i}')
+        first = MediaComment.objects.order_by('id').first()
+        reply = self.comment('reply', first.id)
+        nested = self.comment('reply to reply', reply['id'])
+        self.assertEqual(nested['parent_id'], first.id)
+
+        # Warm the file metadata cache; after that a page costs the same whoever commented
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            page = self.client.get(self.url).json()
+        self.assertEqual(len([q for q in queries if 'feed_' in q['sql']]), 3)  # ETag state, post, comments with users
+        self.assertEqual([c['body'] for c in page['comments']], ['top 4', 'top 3', 'top 2'])
+        self.assertEqual(page['comment_count'], 7)
+        self.assertTrue(page['has_more'])
+
+        page = self.client.get(self.url, {'before_id': page['next_cursor']}).json()
+        self.assertEqual([(c['body'], c['reply_count']) for c in page['comments']], [('top 1', 0), ('top 0', 2)])
+        self.assertFalse(page['has_more'])
+
+        replies = self.client.get(self.url, {'parent_id': first.id}).json()
+        self.assertEqual([c['body'] for c in replies['comments']], ['reply', 'reply to reply'])
+
+        MediaComment.objects.get(pk=reply['id']).delete()
+        first.refresh_from_db()
+        self.assertEqual(first.reply_count, 1)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('etag@example.com', 'Etag', 'pw', is_active=True, email_verified=True)
+        self.other = User.objects.create_user('other@example.com', 'Other', 'pw', is_active=True, email_verified=True)
+        self.post = MediaPost.objects.create(user=self.other, title='Post', description='...', payment_type='paid', price=10)
+        self.client.force_login(self.user)
+
+    def grant_access(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            MediaAccess.objects.create(user=self.user, media_post=self.post)
+
+    def receive_message(self):
+        Conversation.record_message(Message.objects.create(sender=self.other, recipient=self.user, body='oi'))
+
+    def assertChangedBy(self, url, change, params=None):
+        etag = self.client.get(url, params)['ETag']
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_pages(self):
+        feed = reverse('feed:media_post')
+        self.assertChangedBy(feed, lambda: MediaLike.objects.create(user=self.other, media_post=self.post))
+        self.assertChangedBy(feed, self.grant_access)
+        self.assertChangedBy(feed, self.receive_message)  # topbar badge
+        self.assertChangedBy(reverse('feed:community'), lambda: Community.objects.create(name='Nova', created_by=self.other))
+        # Different search, different page
+        self.assertNotEqual(self.client.get(feed)['ETag'], self.client.get(feed, {'q': 'x'})['ETag'])
+
+    def test_login_renders_the_page_again(self):
+        # The page's csrfmiddlewaretoken belongs to the old login
+        feed = reverse('feed:media_post')
+        self.assertChangedBy(feed, lambda: (self.client.logout(), self.client.force_login(self.user)))
+
+    def test_json_endpoints(self):
+        comments = reverse('feed:get_media_comments', args=[self.post.id])
+        self.assertChangedBy(comments, lambda: MediaComment.objects.create(user=self.other, media_post=self.post, body='!'))
+
+        messages = reverse('feed:get_messages_api')
+        params = {'user_id': self.other.id}
+        self.assertChangedBy(messages, self.receive_message, params)
+        self.assertFalse(self.client.get(messages, {'user_id': 'x'}).has_header('ETag'))
+
+    def test_json_endpoints_follow_profile_edits(self):
+        MediaComment.objects.create(user=self.other, media_post=self.post, body='!')
+        self.receive_message()
+
+        def rename():
+            self.other.fullname = 'Outro Nome'
+            self.other.save()
+
+        comments = reverse('feed:get_media_comments', args=[self.post.id])
+        messages = reverse('feed:get_messages_api')
+        params = {'user_id': self.other.id}
+        comments_etag = self.client.get(comments)['ETag']
+        self.assertChangedBy(messages, rename, params)
+        self.assertEqual(self.client.get(comments, HTTP_IF_NONE_MATCH=comments_etag).status_code, 200)
+
+
+class FileMetadataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.user = User.objects.create_user('files@example.com', 'Files', 'pw', is_active=True, email_verified=True)
+        self.post = MediaPost.objects.create(user=self.user, title='Post', description='...')
+
+    def test_recorded_at_upload_and_read_without_storage(self):
+        content = b'%PDF-1.4 hello'
+        media_file = MediaFile.objects.create(media_post=self.post, media_file=SimpleUploadedFile('a.pdf', content))
+        run_jobs()
+        meta = StoredFile.objects.get(name=media_file.media_file.name)
+        self.assertEqual((meta.size, meta.content_type, meta.checksum), (len(content), 'application/pdf', hashlib.sha256(content).hexdigest()))
+
+        media_file = MediaFile.objects.get(pk=media_file.pk)
+        with mock.patch.object(FileSystemStorage, 'exists', side_effect=AssertionError), \
+                mock.patch.object(FileSystemStorage, 'size', side_effect=AssertionError):
+            self.assertEqual(media_file.get_file_url(), reverse('feed:media_file', args=[media_file.pk]))
+            self.assertEqual(media_file.get_file_size(), '14.0 B')
+            self.assertTrue(self.user.get_profile_picture_url().endswith('no_pic.jpg'))
+
+        # A file that disappears is noticed by the audit, not by page views
+        os.remove(media_file.media_file.path)
+        self.assertIsNotNone(MediaFile.objects.get(pk=media_file.pk).get_file_url())
+        out = StringIO()
+        call_command('audit_file_metadata', stdout=out)
+        self.assertIn('missing: ' + media_file.media_file.name, out.getvalue())
+        self.assertIsNone(MediaFile.objects.get(pk=media_file.pk).get_file_url())
+
+    def test_missing_rows_are_cached_briefly(self):
+        from .file_metadata import lookup
+
+        self.assertEqual(lookup(['late.pdf']), {'late.pdf': None})
+        with self.assertNumQueries(0):
+            lookup(['late.pdf'])
+
+        # Recorded by another worker, which cannot update this process's cache
+        with override_settings(FILE_METADATA_MISS_CACHE_SECONDS=0):
+            cache.clear()
+            self.assertIsNone(lookup(['late.pdf'])['late.pdf'])
+            StoredFile.objects.create(name='late.pdf', size=1)
+            self.assertEqual(lookup(['late.pdf'])['late.pdf'].size, 1)
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.user = User.objects.create_user('images@example.com', 'Images', 'pw', is_active=True, email_verified=True)
+
+    def jpeg(self, name, size, orientation=None):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0110] = 'Camera'
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def test_derivatives_written_at_upload_and_picked_by_size(self):
+        from PIL import Image
+
+        # Orientation 6: stored landscape, shown portrait
+        self.user.profile_picture = self.jpeg('me.jpg', (600, 400), orientation=6)
+        self.user.save()
+        run_jobs()
+        meta = StoredFile.objects.get(name=self.user.profile_picture.name)
+        self.assertEqual((meta.width, meta.height), (400, 600))
+        self.assertEqual(len(meta.variants), 8)
+
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.get_profile_picture_url(), user.profile_picture.url)
+        self.assertTrue(user.get_profile_picture_url(50).endswith('/80.webp'))
+        self.assertTrue(user.get_profile_picture_url(1000).endswith('/240.webp'))
+        with user.profile_picture.storage.open(user.get_profile_picture_url(50).removeprefix('/media/')) as f:
+            with Image.open(f) as derivative:
+                self.assertEqual(derivative.size, (80, 80))
+                self.assertNotIn(0x0110, derivative.getexif())
+
+        # Media images keep their ratio and are never enlarged
+        post = MediaPost.objects.create(user=self.user, title='Post', description='...')
+        media_file = MediaFile.objects.create(media_post=post, media_file=self.jpeg('a.jpg', (1000, 500)))
+        run_jobs()
+        self.assertEqual(StoredFile.objects.get(name=media_file.media_file.name).variants, ['640.webp', '640.jpg'])
+        self.assertTrue(media_file.get_file_url(1280, fmt='jpg').endswith('/640.jpg'))
+
+    def test_processed_at_most_once(self):
+        community = Community.objects.create(name='C', created_by=self.user, community_pic=self.jpeg('c.jpg', (100, 100)))
+        broken = MediaPost.objects.create(user=self.user, title='Post', description='...')
+        MediaFile.objects.create(media_post=broken, media_file=SimpleUploadedFile('b.png', b'not a png'))
+        run_jobs()
+        # An image from before derivatives existed
+        StoredFile.objects.filter(name=community.community_pic.name).update(variants=None)
+        cache.clear()
+
+        out = StringIO()
+        call_command('process_image_derivatives', stdout=out)
+        self.assertIn('processed: 1', out.getvalue())
+        self.assertIn('skipped:   1', out.getvalue())
+        self.assertTrue(Community.objects.get(pk=community.pk).get_community_picture_url(40).endswith('/40.webp'))
+
+        with mock.patch('PIL.Image.open', side_effect=AssertionError):
+            out = StringIO()
+            call_command('process_image_derivatives', stdout=out)
+        self.assertIn('processed: 0', out.getvalue())
+        self.assertIn('skipped:   2', out.getvalue())
+
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_email_sent_by_worker_once_per_key(self):
+        from django.core import mail
+        from .jobs import enqueue
+
+        first = enqueue('send_email', key='welcome:1', subject='Oi', message='...', recipient_list=['a@example.com'])
+        again = enqueue('send_email', key='welcome:1', subject='Oi', message='...', recipient_list=['a@example.com'])
+        self.assertEqual(first.pk, again.pk)
+        self.assertEqual(len(mail.outbox), 0)
+        run_jobs()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Job.objects.get(pk=first.pk).status, Job.DONE)
+
+    def test_eager_without_a_worker(self):
+        from django.core import mail
+        from .jobs import enqueue
+
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue('send_email', subject='Oi', message='...', recipient_list=['a@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.DONE)
+
+        with override_settings(JOB_QUEUE_EAGER=False), self.captureOnCommitCallbacks(execute=True):
+            enqueue('send_email', subject='Oi', message='...', recipient_list=['a@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+
+        # Never in a request: transcoding waits for run_jobs
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = enqueue('transcode_video', pk=0)
+        self.assertEqual(Job.objects.get(pk=queued.pk).status, Job.PENDING)
+
+    def test_failed_job_retried_with_backoff(self):
+        from .jobs import claim, enqueue, run_claimed
+
+        queued = enqueue('send_email', subject='Oi', message='...', recipient_list=['a@example.com'], max_attempts=2)
+        with mock.patch('feed.tasks.send_mail', side_effect=OSError('SMTP down')):
+            self.assertEqual(run_claimed(claim('test')), (0, 1))
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.attempts), (Job.PENDING, 1))
+            self.assertIn('SMTP down', queued.last_error)
+            # Not due again before the backoff
+            self.assertEqual(claim('test'), [])
+
+            Job.objects.filter(pk=queued.pk).update(run_at=F('created_at'))
+            self.assertEqual([j.pk for j in claim('a')], [queued.pk])
+            # Claimed rows are not handed to a second worker
+            self.assertEqual(claim('b'), [])
+            run_claimed(Job.objects.filter(pk=queued.pk))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+
+    def test_job_taken_over_is_not_run_twice(self):
+        from datetime import timedelta
+        from django.core import mail
+        from .jobs import claim, enqueue, run_claimed
+
+        for key in ('a', 'b'):
+            enqueue('send_email', key=key, subject='Oi', message='...', recipient_list=['a@example.com'])
+        first, second = claim('slow')
+        # While "slow" ran the first job, the second one's lock went stale and another worker took it
+        Job.objects.filter(pk=second.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual([j.pk for j in claim('fast')], [second.pk])
+
+        self.assertEqual(run_claimed([first, second]), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Job.objects.get(pk=second.pk).locked_by, 'fast')
+
+    def test_files_deleted_by_worker(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        user = User.objects.create_user('jobs@example.com', 'Jobs', 'pw', is_active=True, email_verified=True)
+        post = MediaPost.objects.create(user=user, title='Post', description='...')
+        media_file = MediaFile.objects.create(media_post=post, media_file=SimpleUploadedFile('a.pdf', b'%PDF'))
+        path = media_file.media_file.path
+        run_jobs()
+
+        media_file.delete()
+        self.assertTrue(os.path.exists(path))
+        run_jobs()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(StoredFile.objects.filter(name='media_posts/a.pdf').exists())
+
+        # The freed name is given to the next upload, which is processed (and deleted) like a new file
+        media_file = MediaFile.objects.create(media_post=post, media_file=SimpleUploadedFile('a.pdf', b'%PDF-2'))
+        self.assertEqual(media_file.media_file.name, 'media_posts/a.pdf')
+        run_jobs()
+        self.assertEqual(StoredFile.objects.get(name='media_posts/a.pdf').size, 6)
+        media_file.delete()
+        run_jobs()
+        self.assertFalse(os.path.exists(path))
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ('MEDIA_ROOT', 'UPLOAD_STAGING_DIR'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            self.enterContext(override_settings(**{name: directory.name}))
+        self.enterContext(override_settings(UPLOAD_CHUNK_SIZE=4))
+        self.user = User.objects.create_user('uploads@example.com', 'Uploads', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.user)
+
+    def start(self, content, checksum=None):
+        response = self.client.post(reverse('feed:start_upload'), {
+            'filename': 'doc.pdf', 'size': len(content), 'content_type': 'application/pdf',
+            'checksum': hashlib.sha256(content).hexdigest() if checksum is None else checksum,
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+
+    def chunk(self, upload_id, offset, data):
+        return self.client.post(
+            reverse('feed:upload_chunk', args=[upload_id]), data, content_type='application/octet-stream',
+            headers={'X-Upload-Offset': str(offset)},
+        )
+
+    def test_resumable_upload_attached_to_post(self):
+        from .upload_models import UploadSession
+        from .uploads import staging_path
+
+        content = b'%PDF-1.4 hi'
+        upload_id = self.start(content)
+        self.assertEqual(self.chunk(upload_id, 0, content[:4]).json()['offset'], 4)
+        # A retried chunk the server already has: told where to resume
+        response = self.chunk(upload_id, 0, content[:4])
+        self.assertEqual((response.status_code, response.json()['offset']), (409, 4))
+        self.assertEqual(self.chunk(upload_id, 4, content[4:12]).status_code, 400)  # larger than a chunk
+        self.assertEqual(self.client.get(reverse('feed:upload_status', args=[upload_id])).json()['offset'], 4)
+        self.chunk(upload_id, 4, content[4:8])
+        self.assertEqual(self.chunk(upload_id, 8, content[8:]).json()['status'], 'complete')
+
+        path = staging_path(UploadSession.objects.get(pk=upload_id))
+        post_data = {
+            'title': 'Post', 'description': '...', 'research_area_select': 'cardiologia',
+            'research_area': 'cardiologia', 'payment_type': 'free',
+        }
+        # The same upload twice (even spelled differently) is a form error, not two files
+        response = self.client.post(reverse('feed:media_post'), {**post_data, 'upload_ids': [upload_id, upload_id.upper()]})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(MediaPost.objects.filter(title='Post').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('feed:media_post'), {**post_data, 'upload_ids': [upload_id]})
+        self.assertEqual(response.status_code, 302)
+        media_file = MediaFile.objects.get(media_post__title='Post')
+        with media_file.media_file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_checksum_mismatch_restarts_upload(self):
+        content = b'12345678'
+        upload_id = self.start(content, checksum='0' * 64)
+        self.chunk(upload_id, 0, content[:4])
+        response = self.chunk(upload_id, 4, content[4:])
+        self.assertEqual((response.status_code, response.json()['offset']), (422, 0))
+
+        # Another user's upload cannot be used or probed
+        other = User.objects.create_user('other@example.com', 'Other', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('feed:upload_status', args=[upload_id])).status_code, 404)
+
+
+class ProtectedMediaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.owner = User.objects.create_user('seller@example.com', 'Seller', 'pw', is_active=True, email_verified=True)
+        self.buyer = User.objects.create_user('buyer@example.com', 'Buyer', 'pw', is_active=True, email_verified=True)
+        post = MediaPost.objects.create(user=self.owner, title='Paid', description='...', payment_type='paid', price=10)
+        self.document = MediaFile.objects.create(media_post=post, media_file=SimpleUploadedFile('paid.pdf', b'%PDF-0123456789'))
+        run_jobs()
+        self.url = reverse('feed:media_file', args=[self.document.pk])
+
+    def test_access_checked_and_ranges_served(self):
+        self.client.force_login(self.buyer)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'application/pdf'))
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-0123456789')
+
+        response = self.client.get(self.url, headers={'Range': 'bytes=5-8'})
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 5-8/15'))
+        self.assertEqual(b''.join(response.streaming_content), b'0123')
+        response = self.client.get(self.url, headers={'Range': 'bytes=-3'})
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(self.client.get(self.url, headers={'Range': 'bytes=15-'}).status_code, 416)
+
+    def test_transfer_offloaded_to_front_server(self):
+        from urllib.parse import parse_qs, urlsplit
+
+        self.client.force_login(self.owner)
+        with override_settings(PROTECTED_MEDIA_BACKEND='x-accel'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/media_posts/paid.pdf')
+        self.assertEqual(response.content, b'')
+
+        with override_settings(PROTECTED_MEDIA_BACKEND='signed', PROTECTED_MEDIA_SIGNING_KEY='k'):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+        location = urlsplit(response['Location'])
+        query = {k: v[0] for k, v in parse_qs(location.query).items()}
+        self.assertEqual(location.path, '/signed-media/media_posts/paid.pdf')
+        # What nginx computes for secure_link_md5 "$secure_link_expires$uri k"
+        digest = hashlib.md5(f"{query['expires']}{location.path} k".encode()).digest()
+        self.assertEqual(query['md5'], base64.urlsafe_b64encode(digest).decode().rstrip('='))
+
+
+
+class VideoRenditionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, FFMPEG_BINARY=sys.executable))
+        self.owner = User.objects.create_user('filmmaker@example.com', 'Filmmaker', 'pw', is_active=True, email_verified=True)
+        self.client.force_login(self.owner)
+        self.post = MediaPost.objects.create(user=self.owner, title='Aula', description='...', payment_type='free')
+
+    def upload(self):
+        video = MediaFile.objects.create(media_post=self.post, media_file=SimpleUploadedFile('aula.avi', b'RIFF....AVI '))
+        self.assertEqual(video.video_status, MediaFile.VIDEO_PENDING)
+        return video
+
+    @staticmethod
+    def fake_ffmpeg(command, **kwargs):
+        # The output file is the last argument
+        with open(command[-1], 'wb') as f:
+            f.write(b'poster' if command[-1].endswith('.jpg') else b'faststart mp4')
+
+    def test_rendition_and_poster_used_by_card(self):
+        video = self.upload()
+        self.client.get(reverse('feed:media_post'))  # caches the card
+        with mock.patch('feed.videos.subprocess.run', side_effect=self.fake_ffmpeg) as ffmpeg:
+            run_jobs()  # records the upload, which queues the transcoding
+            run_jobs()
+        command = ffmpeg.call_args_list[0].args[0]
+        self.assertEqual(command[command.index('-movflags') + 1], '+faststart')
+
+        video.refresh_from_db()
+        self.assertEqual(video.video_status, MediaFile.VIDEO_READY)
+        self.assertEqual(video.video_rendition.name, 'media_posts/web/aula.mp4')
+        rendition_url = reverse('feed:media_file_rendition', args=[video.pk])
+        response = self.client.get(rendition_url)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'video/mp4'))
+        self.assertEqual(b''.join(response.streaming_content), b'faststart mp4')
+
+        # The cached card was re-rendered: poster, nothing loaded before play, the rendition only
+        html = self.client.get(reverse('feed:media_post')).content.decode()
+        self.assertIn(f'poster="{video.video_poster.url}"', html)
+        # Under a public prefix: nginx answers 404 for anything under /media/media_posts/
+        self.assertTrue(video.get_poster_url().startswith(settings.MEDIA_URL + 'derivatives/'))
+        self.assertIn('preload="none"', html)
+        self.assertIn(f'<source src="{rendition_url}" type="video/mp4">', html)
+        self.assertNotIn('video/quicktime', html)
+
+        # Deleting the file removes its rendition and poster too
+        video.delete()
+        run_jobs()
+        self.assertFalse(os.path.exists(video.video_rendition.path))
+        self.assertFalse(os.path.exists(video.video_poster.path))
+
+    def test_original_played_until_converted(self):
+        video = self.upload()
+        with override_settings(FFMPEG_BINARY='/nonexistent/ffmpeg'):
+            run_jobs()
+            run_jobs()
+        job = Job.objects.get(key=f'transcode:{video.pk}:media_posts/aula.avi')
+        # Retried, so it runs once ffmpeg is installed
+        self.assertEqual((job.status, job.attempts), (Job.PENDING, 1))
+        self.assertEqual(video.get_video_url(), video.get_file_url())
+        html = self.client.get(reverse('feed:media_post')).content.decode()
+        self.assertIn(f'<source src="{video.get_file_url()}" type="video/quicktime">', html)
+
+        # Too slow this time: retried later, the file is not given up on
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        with mock.patch('feed.videos.subprocess.run', side_effect=subprocess.TimeoutExpired('ffmpeg', 480)) as ffmpeg:
+            run_jobs()
+        self.assertLess(ffmpeg.call_args.kwargs['timeout'], 600)  # JOB_LOCK_TIMEOUT_SECONDS
+        job.refresh_from_db()
+        video.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, video.video_status), (Job.PENDING, 2, MediaFile.VIDEO_PENDING))
+
+        # A file ffmpeg cannot read is not tried again unless asked
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        failure = subprocess.CalledProcessError(1, 'ffmpeg')
+        with mock.patch('feed.videos.subprocess.run', side_effect=failure):
+            run_jobs()
+        video.refresh_from_db()
+        self.assertEqual(video.video_status, MediaFile.VIDEO_FAILED)
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE)
+
+        call_command('transcode_videos', '--retry-failed', stdout=StringIO())
+        with mock.patch('feed.videos.subprocess.run', side_effect=self.fake_ffmpeg):
+            run_jobs()
+        video.refresh_from_db()
+        self.assertEqual(video.video_status, MediaFile.VIDEO_READY)
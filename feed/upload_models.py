@@ -0,0 +1,44 @@
+"""
+Chunked, resumable uploads of media post files.
+
+The Tradução form uploads each file in parallel, in chunks, before the post
+is submitted (feed/views_upload_api.py); the post form then refers to the
+finished sessions by id. Chunks are appended to a staging file on local disk
+(feed/uploads.py), so no worker holds a whole file in memory and a dropped
+connection resumes from the last stored byte instead of from zero.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import models
+
+
+class UploadSession(models.Model):
+    UPLOADING = 'uploading'
+    COMPLETE = 'complete'
+    STATUS_CHOICES = [
+        (UPLOADING, 'Enviando'),
+        (COMPLETE, 'Concluído'),
+    ]
+
+    # Random, so an upload id cannot be guessed; sessions are also checked against the user
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    # Declared by the client when the session starts
+    size = models.BigIntegerField()
+    # sha256 of the whole file, hex; verified when the last chunk arrives (empty: not verified)
+    checksum = models.CharField(max_length=64, blank=True)
+    # Bytes stored so far; the next chunk must start here
+    offset = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=UPLOADING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Envio em Partes"
+        verbose_name_plural = "Envios em Partes"
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
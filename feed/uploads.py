@@ -0,0 +1,133 @@
+"""
+Staging of chunked uploads (see feed/upload_models.py).
+
+Each UploadSession owns one staging file, <UPLOAD_STAGING_DIR>/<id>.part,
+written at the session's offset as chunks arrive. The storage API has no
+append, so chunks go to local disk and the finished file is copied into the
+storage once, when the post that uses it is saved (consume_upload). Sessions
+never used are removed by the expire_upload job after
+UPLOAD_SESSION_TTL_SECONDS.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+
+# Bytes copied per read from the request body and from the staging file
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+def staging_dir():
+    path = getattr(settings, 'UPLOAD_STAGING_DIR', None) or os.path.join(
+        settings.FILE_UPLOAD_TEMP_DIR or tempfile.gettempdir(), 'chunked_uploads'
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def staging_path(session):
+    return os.path.join(staging_dir(), f'{session.pk}.part')
+
+
+def chunk_size():
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+
+
+def start_upload(user, filename, size, content_type='', checksum=''):
+    """Create a session and its empty staging file; it expires unless used within UPLOAD_SESSION_TTL_SECONDS"""
+    from .jobs import enqueue
+    from .upload_models import UploadSession
+
+    session = UploadSession.objects.create(
+        user=user, filename=os.path.basename(filename)[:255], size=size,
+        content_type=content_type[:100], checksum=checksum.lower(),
+    )
+    open(staging_path(session), 'wb').close()
+    enqueue(
+        'expire_upload', key=f'expire-upload:{session.pk}', upload_id=str(session.pk),
+        delay=getattr(settings, 'UPLOAD_SESSION_TTL_SECONDS', 24 * 3600),
+    )
+    return session
+
+
+def append_chunk(session, offset, stream, length):
+    """
+    Copy up to length bytes of stream into the staging file at offset, which must be the session's
+    offset. Bytes that arrived before the client disconnected are kept, so the next attempt resumes
+    after them. Returns the session's new offset (unchanged if another request stored this chunk first).
+    """
+    from .upload_models import UploadSession
+
+    written = 0
+    with open(staging_path(session), 'r+b') as f:
+        f.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            f.write(data)
+            written += len(data)
+        # Drop what a failed earlier attempt left past this chunk
+        f.truncate(offset + written)
+
+    if UploadSession.objects.filter(pk=session.pk, offset=offset).update(offset=offset + written):
+        session.offset = offset + written
+    else:
+        session.refresh_from_db(fields=['offset', 'status'])
+    return session.offset
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def finish_upload(session):
+    """
+    Verify a fully received upload against its declared checksum. On a match, or when none was
+    declared, mark it complete and return True; otherwise start it over from offset 0 and return False.
+    """
+    from .upload_models import UploadSession
+
+    checksum = file_checksum(staging_path(session))
+    if session.checksum and checksum != session.checksum:
+        open(staging_path(session), 'wb').close()
+        UploadSession.objects.filter(pk=session.pk).update(offset=0)
+        session.offset = 0
+        return False
+    session.checksum, session.status = checksum, UploadSession.COMPLETE
+    session.save(update_fields=['checksum', 'status', 'updated_at'])
+    return True
+
+
+def consume_upload(session, create):
+    """
+    Hand a completed upload to create(file), which saves it to a FileField (copying it into the
+    storage), then delete the session; its staging file goes once the transaction commits.
+    Returns what create returned.
+    """
+    path = staging_path(session)
+    with open(path, 'rb') as f:
+        result = create(File(f, name=session.filename))
+    session.delete()
+    transaction.on_commit(lambda: _remove(path))
+    return result
+
+
+def discard_upload(session):
+    path = staging_path(session)
+    session.delete()
+    transaction.on_commit(lambda: _remove(path))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,7 +1,8 @@
-from . import views_message_api
 from django.urls import path
 from . import views
 from . import views_message_api
+from . import views_upload_api
+from . import views_message_stream
 from .delete_article_view import delete_article
 from .delete_media_view import delete_media_post
 from .delete_product_view import delete_product
@@ -25,7 +26,18 @@ urlpatterns = [
     path("mensagens/", views.mensagens, name="mensagens"),
     path("mensagens/api/get_messages/", views_message_api.get_messages_api, name="get_messages_api"),
     path("mensagens/api/send_message/", views_message_api.send_message_api, name="send_message_api"),
+    path("mensagens/api/search/", views_message_api.search_messages_api, name="search_messages_api"),
+    path("mensagens/api/mark_read/", views_message_api.mark_read_api, name="mark_read_api"),
+    path("mensagens/api/stream/", views_message_stream.message_stream, name="message_stream"),
+    path("mensagens/api/poll/", views_message_stream.message_poll, name="message_poll"),
     path("traducao/", views.media_post, name="media_post"),
+    path("traducao/api/feed/", views.media_feed_api, name="media_feed_api"),
+    path("uploads/", views_upload_api.start_upload_api, name="start_upload"),
+    path("uploads/<uuid:upload_id>/", views_upload_api.upload_status_api, name="upload_status"),
+    path("uploads/<uuid:upload_id>/chunk/", views_upload_api.upload_chunk_api, name="upload_chunk"),
+    path("uploads/<uuid:upload_id>/cancel/", views_upload_api.cancel_upload_api, name="cancel_upload"),
+    path("media/files/<int:file_id>/", views.media_file_view, name="media_file"),
+    path("media/files/<int:file_id>/web.mp4", views.media_file_view, {"rendition": True}, name="media_file_rendition"),
     path("media/<int:media_id>/request-access/", views.request_media_access, name="request_media_access"),
     path("media/<int:media_id>/like/", views.toggle_media_like, name="toggle_media_like"),
     path("media/<int:media_id>/comment/", views.add_media_comment, name="add_media_comment"),
@@ -22,4 +22,423 @@ def get_regular_users_except(exclude_user):
     Returns a queryset of regular users excluding a specific user.
     Commonly used for listing users other than the current user.
     """
-    return get_regular_users().exclude(id=exclude_user.id)
\ No newline at end of file
+    return get_regular_users().exclude(id=exclude_user.id)
+
+def get_top_message_users(user, limit=5):
+    """
+    Returns the followed users with the most recent conversations, newest first.
+    Followed users without any message fill the remaining slots, as before.
+    """
+    from user.models import Follow
+    from .models import Conversation
+
+    conversations = (
+        Conversation.objects
+        .filter(user=user, other_user__followers__follower=user)
+        .select_related('other_user')
+        .order_by('-last_message_at')[:limit]
+    )
+    top_users = [c.other_user for c in conversations]
+    if len(top_users) < limit:
+        followed = (
+            Follow.objects
+            .filter(follower=user)
+            .exclude(following_id__in=[u.id for u in top_users])
+            .select_related('following')[:limit - len(top_users)]
+        )
+        top_users.extend(f.following for f in followed)
+    return top_users
+
+
+def get_inbox_conversations(user):
+    """
+    Returns the users shown in the messages inbox in a single query, newest conversation first.
+    Includes everyone the user has exchanged messages with plus followed users not yet messaged.
+    Each user is annotated with last_message_body, last_message_at, last_sender_id and unread_count.
+    """
+    from django.db.models import F, OuterRef, Q, Subquery
+    from user.models import Follow
+    from .models import Conversation
+
+    conversation = Conversation.objects.filter(user=user, other_user=OuterRef('pk'))
+    return (
+        User.objects
+        .filter(
+            Q(id__in=Follow.objects.filter(follower=user).values('following_id')) |
+            Q(id__in=Conversation.objects.filter(user=user).values('other_user_id'))
+        )
+        .annotate(
+            last_message_body=Subquery(conversation.values('last_message__body')[:1]),
+            last_message_at=Subquery(conversation.values('last_message_at')[:1]),
+            last_sender_id=Subquery(conversation.values('last_sender_id')[:1]),
+            unread_count=Subquery(conversation.values('unread_count')[:1]),
+        )
+        .order_by(F('last_message_at').desc(nulls_last=True), 'fullname')
+    )
+
+
+def get_conversation_messages(user, other_user):
+    """
+    Returns the messages exchanged between two users, oldest first.
+    """
+    from django.db.models import Q
+    from .models import Message
+
+    return Message.objects.filter(
+        Q(sender=user, recipient=other_user) | Q(sender=other_user, recipient=user)
+    ).order_by('created_at', 'id')
+
+
+def get_archived_conversation_messages(user, other_user):
+    """
+    Returns the archived messages exchanged between two users, oldest first.
+    """
+    from django.db.models import Q
+    from .archive_models import ArchivedMessage
+
+    return ArchivedMessage.objects.filter(
+        Q(sender=user, recipient=other_user) | Q(sender=other_user, recipient=user)
+    ).order_by('created_at', 'id')
+
+
+def get_archive_cutoff():
+    """
+    Messages newer than this are always in the hot tables; older ones may have been archived.
+    """
+    from datetime import timedelta
+    from django.conf import settings
+    from django.utils import timezone
+
+    return timezone.now() - timedelta(days=getattr(settings, 'MESSAGE_ARCHIVE_AFTER_DAYS', 180))
+
+
+def find_conversation_cursor(user, other_user, message_id):
+    """
+    Returns the (created_at, id) keyset of a message in the conversation, hot or archived, or None.
+    """
+    for messages in (get_conversation_messages(user, other_user),
+                     get_archived_conversation_messages(user, other_user)):
+        cursor = messages.filter(pk=message_id).values_list('created_at', 'id').first()
+        if cursor:
+            return cursor
+    return None
+
+
+def get_conversation_page(user, other_user, limit, before=None, after=None):
+    """
+    Returns (messages, has_more) for one page of a conversation, oldest first.
+    before/after are (created_at, id) keysets: without either the newest page is returned.
+    ArchivedMessage is only read, and merged with the hot rows, when the page reaches
+    back past the hot window.
+    """
+    from django.db.models import Q
+
+    if after:
+        keyset = Q(created_at__gt=after[0]) | Q(created_at=after[0], id__gt=after[1])
+        order = ('created_at', 'id')
+    elif before:
+        keyset = Q(created_at__lt=before[0]) | Q(created_at=before[0], id__lt=before[1])
+        order = ('-created_at', '-id')
+    else:
+        keyset = Q()
+        order = ('-created_at', '-id')
+
+    page = list(get_conversation_messages(user, other_user).filter(keyset).order_by(*order)[:limit + 1])
+
+    cutoff = get_archive_cutoff()
+    if after:
+        reaches_archive = after[0] < cutoff
+    else:
+        reaches_archive = len(page) <= limit or page[-1].created_at < cutoff
+    if reaches_archive:
+        archived = get_archived_conversation_messages(user, other_user).filter(keyset).order_by(*order)
+        page.extend(archived[:limit + 1])
+        page.sort(key=lambda m: (m.created_at, m.id), reverse=not after)
+        page = page[:limit + 1]
+
+    has_more = len(page) > limit
+    page = page[:limit]
+    return (page if after else page[::-1]), has_more
+
+
+def get_archived_community_page(community, limit, before_id=None):
+    """
+    Returns (messages, has_more) for one page of a community's archived messages, oldest first:
+    the newest ones, or those older than the archived message before_id. A before_id that is not
+    one of the community's archived messages is ignored.
+    """
+    from django.db.models import Q
+
+    archived = community.archived_messages.all()
+    keyset = Q()
+    if before_id:
+        try:
+            cursor = archived.filter(pk=before_id).values_list('created_at', 'id').first()
+        except ValueError:
+            cursor = None
+        if cursor:
+            keyset = Q(created_at__lt=cursor[0]) | Q(created_at=cursor[0], id__lt=cursor[1])
+    page = list(archived.select_related('user').filter(keyset).order_by('-created_at', '-id')[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+
+SIDEBAR_HITS_KEY = 'sidebar:hits'
+SIDEBAR_MISSES_KEY = 'sidebar:misses'
+
+
+def sidebar_cache_key(user_id):
+    return f'sidebar:{user_id}'
+
+
+def _count_cache_lookup(key, n=1):
+    from django.core.cache import cache
+
+    try:
+        cache.incr(key, n)
+    except ValueError:
+        # First lookup since the cache was (re)started
+        cache.add(key, n, timeout=None)
+
+
+def _cache_stats(hits_key, misses_key):
+    from django.core.cache import cache
+
+    counts = cache.get_many([hits_key, misses_key])
+    hits, misses = counts.get(hits_key, 0), counts.get(misses_key, 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+    }
+
+
+def cache_is_shared():
+    """
+    True if the default cache is one store for every worker process. Per-process backends
+    (LocMemCache, the default when CACHES is not set, and DummyCache) are not: an entry deleted
+    in one worker stays in the others.
+    """
+    from django.core.cache import caches
+    from django.core.cache.backends.dummy import DummyCache
+    from django.core.cache.backends.locmem import LocMemCache
+
+    return not isinstance(caches['default'], (DummyCache, LocMemCache))
+
+
+def get_sidebar_data(user):
+    """
+    Returns the right sidebar data of a user ({'top_message_users', 'sidebar_communities'}).
+    Cached per user for SIDEBAR_CACHE_SECONDS, but only in a shared cache (cache_is_shared):
+    feed/signals.py drops the entry when it changes, which must reach every worker.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    from .community_models import Community
+
+    shared = cache_is_shared()
+    key = sidebar_cache_key(user.id)
+    data = cache.get(key) if shared else None
+    if data is not None:
+        _count_cache_lookup(SIDEBAR_HITS_KEY)
+        return data
+
+    data = {
+        'top_message_users': get_top_message_users(user),
+        'sidebar_communities': list(Community.objects.filter(members=user).order_by('-created_at')[:5]),
+    }
+    if shared:
+        _count_cache_lookup(SIDEBAR_MISSES_KEY)
+        cache.set(key, data, getattr(settings, 'SIDEBAR_CACHE_SECONDS', 300))
+    return data
+
+
+def invalidate_sidebar(*user_ids):
+    """
+    Drops the cached sidebar of the given users.
+    """
+    from django.core.cache import cache
+
+    cache.delete_many([sidebar_cache_key(user_id) for user_id in set(user_ids) if user_id])
+
+
+def get_sidebar_cache_stats():
+    """
+    Returns {'hits', 'misses', 'hit_ratio'} since the counters were last reset.
+    """
+    return _cache_stats(SIDEBAR_HITS_KEY, SIDEBAR_MISSES_KEY)
+
+
+def reset_sidebar_cache_stats():
+    from django.core.cache import cache
+
+    cache.delete_many([SIDEBAR_HITS_KEY, SIDEBAR_MISSES_KEY])
+
+
+def get_media_feed(user):
+    """
+    Returns the Tradução de Conhecimento feed, newest first, in two queries however many posts:
+    each post is annotated with is_liked_by_user and its files are prefetched. Like and comment
+    counts are columns of MediaPost; with MEDIA_LIKE_BUFFER posts also get pending_like_delta.
+    """
+    from django.conf import settings
+    from django.db.models import Exists, IntegerField, OuterRef, Subquery, Sum, Value
+    from django.db.models.functions import Coalesce
+    from .models import MediaLike, MediaPost, PendingMediaLike
+
+    posts = (
+        MediaPost.objects
+        .select_related('user')
+        .prefetch_related('files')
+        .order_by('-created_at')
+    )
+    liked = Exists(MediaLike.objects.filter(media_post=OuterRef('pk'), user=user)) if user.is_authenticated else Value(False)
+
+    if getattr(settings, 'MEDIA_LIKE_BUFFER', False):
+        # Toggles not flushed yet: the user's latest one wins, and their deltas go on top of like_count
+        pending = PendingMediaLike.objects.filter(media_post=OuterRef('pk')).order_by()
+        if user.is_authenticated:
+            latest = pending.filter(user=user).order_by('-id').values('liked')[:1]
+            liked = Coalesce(Subquery(latest), liked)
+        delta = pending.values('media_post').annotate(total=Sum('delta')).values('total')
+        posts = posts.annotate(pending_like_delta=Coalesce(Subquery(delta, output_field=IntegerField()), Value(0)))
+    return posts.annotate(is_liked_by_user=liked)
+
+
+def search_media_feed(posts, search_query):
+    """Filter a get_media_feed queryset by the Tradução search box"""
+    from django.db.models import Q
+
+    if not search_query:
+        return posts
+    return posts.filter(
+        Q(title__icontains=search_query) |
+        Q(description__icontains=search_query) |
+        Q(user__fullname__icontains=search_query) |
+        Q(user__research_area__icontains=search_query)
+    )
+
+
+def get_media_feed_page(user, limit, search_query='', before=None):
+    """
+    Returns (posts, has_more) for one page of get_media_feed, keyset-paginated on (created_at, id).
+    before is the (created_at, id) of the last post already shown; each post gets user_has_access.
+    """
+    from django.db.models import Q
+    from .media_access import MediaAccessResolver
+
+    posts = search_media_feed(get_media_feed(user), search_query)
+    if before:
+        posts = posts.filter(Q(created_at__lt=before[0]) | Q(created_at=before[0], id__lt=before[1]))
+
+    # Files are only fetched for the cards render_media_cards has to render
+    page = list(posts.prefetch_related(None).order_by('-created_at', '-id')[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    # One cached set of granted posts answers every card
+    resolver = MediaAccessResolver.for_user(user)
+    for media in page:
+        media.user_has_access = resolver.has_access(media)
+        media.like_count += getattr(media, 'pending_like_delta', 0)
+    render_media_cards(page)
+    return page, has_more
+
+
+MEDIA_CARD_HITS_KEY = 'media_card:hits'
+MEDIA_CARD_MISSES_KEY = 'media_card:misses'
+
+
+def media_card_cache_key(media):
+    return f'media_card:{media.pk}:{media.render_version}:{int(media.user_has_access)}'
+
+
+def render_media_cards(posts):
+    """
+    Sets media.card_html on each post: components/media_card_body.html, shared by every viewer with
+    the same access and cached under the post's render_version for MEDIA_CARD_CACHE_SECONDS.
+    Posts need user_has_access; files are prefetched for the cards not found in the cache.
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db.models import prefetch_related_objects
+    from django.template.loader import render_to_string
+    from .file_metadata import prefetch_file_metadata
+
+    keys = {media.pk: media_card_cache_key(media) for media in posts}
+    cached = cache.get_many(keys.values())
+    missed = [media for media in posts if keys[media.pk] not in cached]
+    if len(posts) > len(missed):
+        _count_cache_lookup(MEDIA_CARD_HITS_KEY, len(posts) - len(missed))
+    if missed:
+        _count_cache_lookup(MEDIA_CARD_MISSES_KEY, len(missed))
+        prefetch_related_objects(missed, 'files')
+        prefetch_file_metadata([media_file for media in missed for media_file in media.files.all()], 'media_file', 'video_rendition', 'video_poster')
+        prefetch_file_metadata([media.user for media in missed], 'profile_picture')
+        rendered = {keys[media.pk]: render_to_string('components/media_card_body.html', {'media': media}) for media in missed}
+        cache.set_many(rendered, getattr(settings, 'MEDIA_CARD_CACHE_SECONDS', 3600))
+        cached.update(rendered)
+
+    for media in posts:
+        media.card_html = cached[keys[media.pk]]
+
+
+def get_media_card_cache_stats():
+    """
+    Returns {'hits', 'misses', 'hit_ratio'} of the card cache, counted per card.
+    """
+    return _cache_stats(MEDIA_CARD_HITS_KEY, MEDIA_CARD_MISSES_KEY)
+
+
+def reset_media_card_cache_stats():
+    from django.core.cache import cache
+
+    cache.delete_many([MEDIA_CARD_HITS_KEY, MEDIA_CARD_MISSES_KEY])
+
+
+def get_profile_picture_urls(users, size=None):
+    """
+    Returns {user_id: url} like User.get_profile_picture_url, reading the upload metadata of
+    all the pictures at once instead of once per user.
+    """
+    from .file_metadata import prefetch_file_metadata
+
+    users = list(users)
+    prefetch_file_metadata(users, 'profile_picture')
+    return {user.pk: user.get_profile_picture_url(size) for user in users}
+
+
+def get_media_comment_page(media_post, limit, cursor=None, parent=None):
+    """
+    Returns (comments, has_more) for one page of a post's comments, keyset-paginated on (created_at, id).
+    Top-level comments come newest first and cursor is the last one shown; with parent, its
+    replies come oldest first and cursor is the last reply shown.
+    """
+    from django.db.models import Q
+    from .models import MediaComment
+
+    comments = MediaComment.objects.filter(media_post=media_post).select_related('user')
+    if parent is None:
+        comments = comments.filter(parent__isnull=True).order_by('-created_at', '-id')
+        if cursor:
+            comments = comments.filter(Q(created_at__lt=cursor[0]) | Q(created_at=cursor[0], id__lt=cursor[1]))
+    else:
+        comments = comments.filter(parent=parent).order_by('created_at', 'id')
+        if cursor:
+            comments = comments.filter(Q(created_at__gt=cursor[0]) | Q(created_at=cursor[0], id__gt=cursor[1]))
+
+    page = list(comments[:limit + 1])
+    return page[:limit], len(page) > limit
+
+
+def serialize_media_comments(comments, user):
+    """JSON for comment rows; profile pictures come from get_profile_picture_urls"""
+    pictures = get_profile_picture_urls({comment.user for comment in comments}, size=80)
+    return [{
+        'id': comment.id,
+        'parent_id': comment.parent_id,
+        'body': comment.body,
+        'user_name': comment.user.fullname,
+        'user_profile_picture': pictures[comment.user_id],
+        'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
+        'is_owner': comment.user_id == user.id,
+        'reply_count': comment.reply_count,
+    } for comment in comments]
@@ -0,0 +1,98 @@
+"""
+Web renditions and poster frames of uploaded videos.
+
+Videos are uploaded as they are (.avi, .wmv, .mkv, .mov...), which browsers
+either cannot play or must download in full before the first frame. Once a
+video MediaFile is recorded (process_upload), the transcode_video job runs
+transcode_video() below: a local ffmpeg (FFMPEG_BINARY) writes an H.264/AAC
+MP4 with its index at the start (+faststart, so playback starts after the
+first bytes) and a JPEG poster frame, saved to MediaFile.video_rendition and
+video_poster. MediaFile.video_status tracks it; until it is 'ready' the card
+plays the original. The card only loads the video once it is played
+(preload="none", showing the poster).
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+
+
+def ffmpeg_binary():
+    """Path of the ffmpeg executable; ImproperlyConfigured if it is not installed"""
+    binary = shutil.which(getattr(settings, 'FFMPEG_BINARY', 'ffmpeg'))
+    if binary is None:
+        raise ImproperlyConfigured('ffmpeg not found: install it or set FFMPEG_BINARY')
+    return binary
+
+
+def rendition_command(binary, source, target):
+    max_width = getattr(settings, 'VIDEO_RENDITION_MAX_WIDTH', 1280)
+    return [
+        binary, '-nostdin', '-y', '-loglevel', 'error', '-i', source,
+        '-map', '0:v:0', '-map', '0:a:0?', '-map_metadata', '-1',
+        # Even dimensions (H.264 needs them), never enlarged
+        '-vf', f"scale='min({max_width},iw)':-2",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(getattr(settings, 'VIDEO_RENDITION_CRF', 23)),
+        '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-b:a', '128k',
+        '-movflags', '+faststart', target,
+    ]
+
+
+def poster_command(binary, source, target):
+    max_width = getattr(settings, 'VIDEO_RENDITION_MAX_WIDTH', 1280)
+    return [
+        binary, '-nostdin', '-y', '-loglevel', 'error', '-i', source,
+        # thumbnail picks a representative frame among the first ones (not a black fade-in)
+        '-vf', f"thumbnail,scale='min({max_width},iw)':-2", '-frames:v', '1', '-q:v', '3', target,
+    ]
+
+
+def _local_copy(field_file, directory):
+    """A local path of field_file for ffmpeg: its own on disk storage, else a copy in directory"""
+    try:
+        return field_file.path
+    except NotImplementedError:
+        path = os.path.join(directory, 'source' + os.path.splitext(field_file.name)[1])
+        with field_file.storage.open(field_file.name, 'rb') as src, open(path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        return path
+
+
+def transcode_video(media_file):
+    """
+    Write the rendition and poster of a video MediaFile unless that was already done; returns True
+    if they were written. A file ffmpeg cannot convert is marked failed and not tried again; a
+    missing ffmpeg, or one that runs past VIDEO_TRANSCODE_TIMEOUT_SECONDS (both runs together),
+    raises, so the job is retried (and transcode_videos queues it again later).
+    """
+    if not media_file.is_video or media_file.video_status == media_file.VIDEO_READY or not media_file.media_file:
+        return False
+
+    binary = ffmpeg_binary()
+    deadline = time.monotonic() + getattr(settings, 'VIDEO_TRANSCODE_TIMEOUT_SECONDS', 480)
+    base = os.path.splitext(os.path.basename(media_file.media_file.name))[0]
+    with tempfile.TemporaryDirectory() as directory:
+        source = _local_copy(media_file.media_file, directory)
+        rendition = os.path.join(directory, 'rendition.mp4')
+        poster = os.path.join(directory, 'poster.jpg')
+        try:
+            for command in (rendition_command(binary, source, rendition), poster_command(binary, rendition, poster)):
+                timeout = max(deadline - time.monotonic(), 1)
+                subprocess.run(command, check=True, capture_output=True, timeout=timeout)
+        except subprocess.CalledProcessError:
+            media_file.video_status = media_file.VIDEO_FAILED
+            media_file.save(update_fields=['video_status'])
+            return False
+
+        for field, path, ext in (('video_rendition', rendition, '.mp4'), ('video_poster', poster, '.jpg')):
+            with open(path, 'rb') as f:
+                getattr(media_file, field).save(base + ext, File(f), save=False)
+
+    media_file.video_status = media_file.VIDEO_READY
+    media_file.save(update_fields=['video_status', 'video_rendition', 'video_poster'])
+    return True
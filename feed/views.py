@@ -1,7 +1,7 @@
 # Página de mensagens
 from django.shortcuts import render, redirect
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.decorators import login_required
 
 # Simple test view for video functionality
@@ -14,43 +14,38 @@ def video_debug(request):
 
 @login_required
 def mensagens(request):
-    from .models import Message
-    following_users = [f.following for f in Follow.objects.filter(follower=request.user).select_related('following')]
-    conversation_data = []
+    from .models import Conversation
+    from .views_message_stream import can_wait
+    from .utils import get_inbox_conversations, get_conversation_page
     selected_user_id = request.GET.get('user')
     selected_user = None
     chat_messages = []
-    for user in following_users:
-        last_msg = Message.objects.filter(
-            (models.Q(sender=request.user, recipient=user) | models.Q(sender=user, recipient=request.user))
-        ).order_by('-created_at').first()
-        conversation_data.append({
+    if selected_user_id and selected_user_id.isdigit():
+        selected_user = User.objects.filter(pk=selected_user_id).first()
+        if selected_user:
+            Conversation.mark_read(request.user, selected_user)
+            # Only the newest page is rendered; older messages load through get_messages_api
+            page_size = getattr(settings, 'MESSAGES_PAGE_SIZE', 50)
+            chat_messages, _ = get_conversation_page(request.user, selected_user, page_size)
+    conversation_data = [
+        {
             'id': user.id,
             'fullname': user.fullname,
-            'profile_picture_url': user.get_profile_picture_url(),
-            'last_message': last_msg.body if last_msg else '',
-            'last_sender_id': last_msg.sender_id if last_msg else None,
-            'last_message_time': last_msg.created_at if last_msg else None,
-        })
-        if selected_user_id and str(user.id) == str(selected_user_id):
-            selected_user = user
-            chat_messages = Message.objects.filter(
-                (models.Q(sender=request.user, recipient=user) | models.Q(sender=user, recipient=request.user))
-            ).order_by('created_at')
-    # Order by last_message_time desc, None last
-    import datetime
-    import pytz
-    def to_naive_utc(dt):
-        if dt is None:
-            return datetime.datetime(1970, 1, 1)
-        if dt.tzinfo is not None:
-            return dt.astimezone(pytz.UTC).replace(tzinfo=None)
-        return dt
-    conversation_data.sort(key=lambda c: to_naive_utc(c['last_message_time']), reverse=True)
+            'profile_picture_url': user.get_profile_picture_url(80),
+            'last_message': user.last_message_body or '',
+            'last_sender_id': user.last_sender_id,
+            'last_message_time': user.last_message_at,
+            'unread_count': user.unread_count or 0,
+        }
+        for user in get_inbox_conversations(request.user)
+    ]
     return render(request, 'feed/mensagens.html', {
         'conversations': conversation_data,
         'selected_user': selected_user,
         'chat_messages': chat_messages,
+        # Server-Sent Events need the ASGI server; under WSGI the open conversation is polled instead
+        'use_event_stream': can_wait(request),
+        'poll_interval_seconds': getattr(settings, 'MESSAGE_POLL_INTERVAL_SECONDS', 10),
     })
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
@@ -75,7 +70,13 @@ from .constants import RESEARCH_AREA_CHOICES
 from feed.article_models import Article
 from user.models import Follow
 from feed.community_models import Community
-from .utils import get_regular_users_except
+from .conditional import collection_state, conditional, viewer_state
+from .file_metadata import prefetch_file_metadata
+from .media_access import access_version
+from .utils import (
+    get_media_comment_page, get_media_feed, get_media_feed_page, get_regular_users_except, search_media_feed,
+    serialize_media_comments,
+)
 
 #from user.forms import InnovatorVerificationForm    
 
@@ -90,45 +91,10 @@ def conexao(request):
         request.user.following.values_list("following_id", flat=True)
     )
     
-    # Top 5 users with most recent messages (for sidebar - consistent with other pages)
-    from .models import Message
-    from user.models import Follow
-    
-    user = request.user if request.user.is_authenticated else None
-    top_message_users = []
-    
-    if user:
-        # Get users the current user follows
-        following_users = [f.following for f in Follow.objects.filter(follower=user).select_related('following')]
-        conversation_data = []
-        
-        for u in following_users:
-            last_msg = Message.objects.filter(
-                (Q(sender=user, recipient=u) | Q(sender=u, recipient=user))
-            ).order_by('-created_at').first()
-            conversation_data.append({
-                'user': u,
-                'last_message_time': last_msg.created_at if last_msg else None,
-            })
-        
-        import datetime
-        import pytz
-        
-        def to_naive_utc(dt):
-            if dt is None:
-                return datetime.datetime(1970, 1, 1)
-            if dt.tzinfo is not None:
-                return dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            return dt
-        
-        conversation_data.sort(key=lambda c: to_naive_utc(c['last_message_time']), reverse=True)
-        top_message_users = [c['user'] for c in conversation_data[:5]]
-    
     return render(request, "feed/conexao.html", {
         "users": users,
         "following_ids": following_ids,
         "search_query": query,
-        "top_message_users": top_message_users,
     })
     
 @login_required
@@ -156,7 +122,7 @@ def toggle_follow(request, user_id):
     user_data = {
         "id": target_user.id,
         "fullname": target_user.fullname,
-        "profile_picture_url": target_user.get_profile_picture_url(),
+        "profile_picture_url": target_user.get_profile_picture_url(80),
         # Adicione outros campos se necessário
     }
 
@@ -185,7 +151,28 @@ def settings_view(request):
         "area_form": form,
     })
 
+def _article_list(query):
+    articles = Article.objects.select_related('user').order_by('title')
+    if query:
+        articles = articles.filter(
+            Q(user__fullname__icontains=query) |
+            Q(title__icontains=query) |
+            Q(research_area__icontains=query)
+        )
+    return articles
+
+
+def _artigos_state(request):
+    viewer = viewer_state(request)
+    if viewer is None:
+        return None
+    query = request.GET.get('q', '').strip()
+    rows, last = collection_state(_article_list(query), 'updated_at')
+    return (viewer, query, rows, last), last
+
+
 @login_required
+@conditional(_artigos_state)
 def artigos(request):
     from .forms import ArticleForm
     form = ArticleForm()
@@ -201,46 +188,14 @@ def artigos(request):
     
     # Filtering
     query = request.GET.get('q', '').strip()
-    articles = Article.objects.select_related('user').order_by('title')
-    if query:
-        articles = articles.filter(
-            Q(user__fullname__icontains=query) |
-            Q(title__icontains=query) |
-            Q(research_area__icontains=query)
-        )
+    articles = _article_list(query)
+    prefetch_file_metadata(articles, 'pdf')
+    prefetch_file_metadata([article.user for article in articles], 'profile_picture')
     
-    user = request.user if request.user.is_authenticated else None
-    # Top 5 users with most recent messages (for sidebar)
-    from .models import Message
-    from user.models import Follow
-    top_message_users = []
-    if user:
-        # Get users the current user follows
-        following_users = [f.following for f in Follow.objects.filter(follower=user).select_related('following')]
-        conversation_data = []
-        for u in following_users:
-            last_msg = Message.objects.filter(
-                (Q(sender=user, recipient=u) | Q(sender=u, recipient=user))
-            ).order_by('-created_at').first()
-            conversation_data.append({
-                'user': u,
-                'last_message_time': last_msg.created_at if last_msg else None,
-            })
-        import datetime
-        import pytz
-        def to_naive_utc(dt):
-            if dt is None:
-                return datetime.datetime(1970, 1, 1)
-            if dt.tzinfo is not None:
-                return dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            return dt
-        conversation_data.sort(key=lambda c: to_naive_utc(c['last_message_time']), reverse=True)
-        top_message_users = [c['user'] for c in conversation_data[:5]]
     return render(request, 'feed/artigos.html', {
         'articles': articles,
         'search_query': query,
         'form': form,
-        'top_message_users': top_message_users,
     })
 
 @login_required
@@ -300,12 +255,30 @@ def perfil(request, user_id=None):
 
 # Community page: list communities, search, and create modal
 
-@login_required
-def community(request):
-    query = request.GET.get('q', '').strip()
+def _community_list(query):
     communities = Community.objects.all().order_by('-created_at')
     if query:
         communities = communities.filter(name__icontains=query)
+    return communities
+
+
+def _community_state(request):
+    viewer = viewer_state(request)
+    if viewer is None:
+        return None
+    query = request.GET.get('q', '').strip()
+    communities = _community_list(query)
+    rows, last = collection_state(communities, 'updated_at')
+    # The page splits the list into the viewer's communities and the rest
+    joined = list(communities.filter(members=request.user).order_by('pk').values_list('pk', flat=True))
+    return (viewer, query, rows, last, joined), last
+
+
+@login_required
+@conditional(_community_state)
+def community(request):
+    query = request.GET.get('q', '').strip()
+    communities = _community_list(query)
     form = CommunityForm()
 
     # Handle join/leave logic
@@ -398,59 +371,31 @@ def community(request):
 #     return render(request, 'artigo/list.html', context)
 
 
+def _media_post_state(request):
+    viewer = viewer_state(request)
+    if viewer is None:
+        return None
+    search_query = request.GET.get('q', '').strip()
+    page_size = getattr(settings, 'MEDIA_FEED_PAGE_SIZE', 10)
+    # The first page's rows as rendered: versions and counters, plus the viewer's like state
+    fields = ['id', 'render_version', 'like_count', 'comment_count', 'is_liked_by_user', 'updated_at']
+    if getattr(settings, 'MEDIA_LIKE_BUFFER', False):
+        fields.append('pending_like_delta')
+    posts = search_media_feed(get_media_feed(request.user), search_query).prefetch_related(None)
+    rows = list(posts.order_by('-created_at', '-id').values_list(*fields)[:page_size + 1])
+    last = max((row[5] for row in rows), default=None)
+    return (viewer, search_query, rows, access_version(request.user)), last
+
+
 @login_required
+@conditional(_media_post_state)
 def media_post(request):
     """View for media posts (photos and videos) - Tradução de Conhecimento"""
     search_query = request.GET.get('q', '').strip()
     
-    # Filter media posts based on search query
-    media_posts = MediaPost.objects.all().select_related('user').order_by('-created_at')
-    if search_query:
-        media_posts = media_posts.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(user__fullname__icontains=search_query) |
-            Q(user__research_area__icontains=search_query)
-        )
-    
-    # Add access information and like status for each media post
-    for media in media_posts:
-        media.user_has_access = media.user_has_access(request.user)
-        media.is_liked_by_user = media.is_liked_by(request.user)
-    
-    # Top 5 users with most recent messages (for sidebar - consistent with other pages)
-    from .models import Message
-    from user.models import Follow
-    
-    user = request.user if request.user.is_authenticated else None
-    top_message_users = []
-    
-    if user:
-        # Get users the current user follows
-        following_users = [f.following for f in Follow.objects.filter(follower=user).select_related('following')]
-        conversation_data = []
-        
-        for u in following_users:
-            last_msg = Message.objects.filter(
-                (Q(sender=user, recipient=u) | Q(sender=u, recipient=user))
-            ).order_by('-created_at').first()
-            conversation_data.append({
-                'user': u,
-                'last_message_time': last_msg.created_at if last_msg else None,
-            })
-        
-        import datetime
-        import pytz
-        
-        def to_naive_utc(dt):
-            if dt is None:
-                return datetime.datetime(1970, 1, 1)
-            if dt.tzinfo is not None:
-                return dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            return dt
-        
-        conversation_data.sort(key=lambda c: to_naive_utc(c['last_message_time']), reverse=True)
-        top_message_users = [c['user'] for c in conversation_data[:5]]
+    # Only the first page is rendered; media_feed_api serves the rest as the user scrolls
+    page_size = getattr(settings, 'MEDIA_FEED_PAGE_SIZE', 10)
+    media_posts, has_more = get_media_feed_page(request.user, page_size, search_query)
     
     form = MediaPostForm(user=request.user)
     
@@ -465,13 +410,59 @@ def media_post(request):
     
     context = {
         'media_posts': media_posts,
+        'has_more': has_more,
+        'next_before_id': media_posts[-1].id if media_posts else None,
         'form': form,
         'search_query': search_query,
-        'top_message_users': top_message_users,
     }
     return render(request, 'feed/traducao.html', context)
 
 
+@login_required
+def media_feed_api(request):
+    """Next page of Tradução cards after before_id, as an HTML fragment for infinite scroll"""
+    from django.template.loader import render_to_string
+
+    search_query = request.GET.get('q', '').strip()
+    before = None
+    before_id = request.GET.get('before_id')
+    if before_id:
+        if before_id.isdigit():
+            before = MediaPost.objects.filter(pk=before_id).values_list('created_at', 'id').first()
+        if before is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    page_size = getattr(settings, 'MEDIA_FEED_PAGE_SIZE', 10)
+    media_posts, has_more = get_media_feed_page(request.user, page_size, search_query, before)
+    html = render_to_string('components/media_cards.html', {'media_posts': media_posts}, request=request)
+    return JsonResponse({
+        'html': html,
+        'has_more': has_more,
+        'next_before_id': media_posts[-1].id if media_posts else None,
+    })
+
+
+@login_required
+def media_file_view(request, file_id, rendition=False):
+    """
+    The original of a media post file (or, with rendition, the web MP4 of a video, feed/videos.py), for
+    viewers allowed to see it: paid documents are checked here, then the transfer is left to
+    nginx/Apache or streamed with Range (feed/protected_media.py)
+    """
+    from django.http import Http404, HttpResponseForbidden
+    from .file_metadata import file_url
+    from .models import MediaFile
+    from .protected_media import serve_protected
+
+    media_file = get_object_or_404(MediaFile.objects.select_related('media_post'), pk=file_id)
+    if media_file.should_block_content(request.user):
+        return HttpResponseForbidden('Conteúdo pago: solicite acesso para ver este arquivo.')
+    field_file = media_file.video_rendition if rendition else media_file.media_file
+    if (rendition and not media_file.has_video_rendition) or file_url(field_file) is None:
+        raise Http404('Arquivo não encontrado')
+    return serve_protected(request, field_file)
+
+
 @login_required
 def request_media_access(request, media_id):
     """Handle access requests for paid media content with payment slip upload"""
@@ -538,24 +529,36 @@ def toggle_media_like(request, media_id):
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
     try:
-        from .models import MediaLike
+        from .models import MediaLike, PendingMediaLike
         media_post = get_object_or_404(MediaPost, id=media_id)
         
-        # Check if user already liked this post
-        like, created = MediaLike.objects.get_or_create(
-            user=request.user,
-            media_post=media_post
-        )
-        
-        if created:
-            # Like was created
-            liked = True
-        else:
-            # Like already existed, so remove it (unlike)
-            like.delete()
-            liked = False
+        if getattr(settings, 'MEDIA_LIKE_BUFFER', False):
+            # Appended to the like buffer; flush_media_likes writes it to MediaLike later
+            liked, like_count = PendingMediaLike.record_toggle(request.user, media_post)
+            return JsonResponse({
+                'success': True,
+                'liked': liked,
+                'like_count': like_count
+            })
+
+        # The like row and the like_count column change together (see feed/signals.py)
+        with transaction.atomic():
+            # Check if user already liked this post
+            like, created = MediaLike.objects.get_or_create(
+                user=request.user,
+                media_post=media_post
+            )
+            
+            if created:
+                # Like was created
+                liked = True
+            else:
+                # Like already existed, so remove it (unlike)
+                like.delete()
+                liked = False
         
         # Get updated like count
+        media_post.refresh_from_db(fields=['like_count'])
         like_count = media_post.like_count
         
         return JsonResponse({
@@ -570,7 +573,7 @@ def toggle_media_like(request, media_id):
 
 @login_required
 def add_media_comment(request, media_id):
-    """Add a comment to a media post"""
+    """Add a comment, or with parent_id a reply, to a media post"""
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
@@ -585,25 +588,32 @@ def add_media_comment(request, media_id):
             return JsonResponse({'success': False, 'error': 'Comentário não pode estar vazio'})
         
         media_post = get_object_or_404(MediaPost, id=media_id)
-        
-        # Create new comment
-        comment = MediaComment.objects.create(
-            user=request.user,
-            media_post=media_post,
-            body=comment_body
-        )
+
+        parent = None
+        if data.get('parent_id'):
+            parent = MediaComment.objects.filter(pk=data['parent_id'], media_post=media_post).only('id', 'parent_id').first()
+            if parent is None:
+                return JsonResponse({'success': False, 'error': 'Comentário não encontrado'}, status=400)
+            # Replying to a reply continues the same thread
+            if parent.parent_id:
+                parent = MediaComment(pk=parent.parent_id)
+        
+        # Create new comment; comment_count and reply_count are bumped in the same transaction (see feed/signals.py)
+        with transaction.atomic():
+            comment = MediaComment.objects.create(
+                user=request.user,
+                media_post=media_post,
+                parent=parent,
+                body=comment_body
+            )
         
         # Get updated comment count
+        media_post.refresh_from_db(fields=['comment_count'])
         comment_count = media_post.comment_count
         
         return JsonResponse({
             'success': True,
-            'comment': {
-                'id': comment.id,
-                'body': comment.body,
-                'user_name': comment.user.fullname,
-                'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
-            },
+            'comment': serialize_media_comments([comment], request.user)[0],
             'comment_count': comment_count
         })
         
@@ -611,43 +621,93 @@ def add_media_comment(request, media_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _media_comments_state(request, media_id):
+    state = (
+        MediaPost.objects.filter(pk=media_id)
+        .annotate(last_comment_at=models.Max('comments__updated_at'), last_profile_at=models.Max('comments__user__updated_at'))
+        .values_list('comment_count', 'last_comment_at', 'last_profile_at').first()
+    )
+    if state is None:
+        return None
+    # is_owner depends on the viewer, the page on the cursor parameters; commenters' names and
+    # pictures are in the body, so a profile edit changes it too
+    return (request.user.pk, sorted(request.GET.items()), state), state[1]
+
+
 @login_required
+@conditional(_media_comments_state)
 def get_media_comments(request, media_id):
-    """Get comments for a media post"""
+    """
+    One page of comments for a media post, newest first; after the last comment shown with before_id.
+    With parent_id, one page of that comment's replies, oldest first, continuing after after_id.
+    """
     if request.method != 'GET':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
     try:
         from .models import MediaComment
-        media_post = get_object_or_404(MediaPost, id=media_id)
-        
-        # Get comments for this media post
-        comments = MediaComment.objects.filter(media_post=media_post).select_related('user').order_by('-created_at')
-        
-        comments_data = []
-        for comment in comments:
-            comments_data.append({
-                'id': comment.id,
-                'body': comment.body,
-                'user_name': comment.user.fullname,
-                'user_profile_picture': comment.user.get_profile_picture_url(),
-                'created_at': comment.created_at.strftime('%d/%m/%Y %H:%M'),
-                'is_owner': comment.user == request.user,
-            })
+        media_post = get_object_or_404(MediaPost.objects.only('id', 'comment_count'), id=media_id)
+
+        parent = None
+        parent_id = request.GET.get('parent_id')
+        if parent_id:
+            parent = MediaComment.objects.filter(pk=parent_id if parent_id.isdigit() else None, media_post=media_post).only('id').first()
+            if parent is None:
+                return JsonResponse({'success': False, 'error': 'Comentário não encontrado'}, status=400)
+
+        cursor = None
+        cursor_id = request.GET.get('after_id' if parent else 'before_id')
+        if cursor_id:
+            if cursor_id.isdigit():
+                cursor = MediaComment.objects.filter(pk=cursor_id, media_post=media_post).values_list('created_at', 'id').first()
+            if cursor is None:
+                return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+        page_size = getattr(settings, 'MEDIA_COMMENTS_PAGE_SIZE', 20)
+        comments, has_more = get_media_comment_page(media_post, page_size, cursor, parent)
         
         return JsonResponse({
             'success': True,
-            'comments': comments_data,
-            'comment_count': len(comments_data)
+            'comments': serialize_media_comments(comments, request.user),
+            'has_more': has_more,
+            'next_cursor': comments[-1].id if comments else None,
+            'comment_count': media_post.comment_count
         })
         
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+def _product_list(query, area_filter):
+    from .models import Product
+
+    products = Product.objects.select_related('user').order_by('-created_at')
+    if query:
+        products = products.filter(
+            Q(user__fullname__icontains=query) |
+            Q(titulo__icontains=query) |
+            Q(descricao__icontains=query)
+        )
+    if area_filter:
+        products = products.filter(area_pesquisa=area_filter)
+    return products
+
+
+def _produtos_state(request):
+    if not request.user.is_authenticated:
+        return None
+    viewer = viewer_state(request)
+    if viewer is None:
+        return None
+    query = request.GET.get('q', '').strip()
+    area_filter = request.GET.get('area', '').strip()
+    rows, last = collection_state(_product_list(query, area_filter), 'updated_at')
+    return (viewer, query, area_filter, rows, last), last
+
+
+@conditional(_produtos_state)
 def produtos(request):
     from .forms import ProductForm
-    from .models import Product
     
     form = ProductForm()
     
@@ -663,61 +723,17 @@ def produtos(request):
     query = request.GET.get('q', '').strip()
     area_filter = request.GET.get('area', '').strip()
     
-    products = Product.objects.select_related('user').order_by('-created_at')
-    
-    if query:
-        products = products.filter(
-            Q(user__fullname__icontains=query) |
-            Q(titulo__icontains=query) |
-            Q(descricao__icontains=query)
-        )
-    
-    if area_filter:
-        products = products.filter(area_pesquisa=area_filter)
+    products = _product_list(query, area_filter)
+    prefetch_file_metadata([product.user for product in products], 'profile_picture')
     
     # Get research areas for filter dropdown
     research_areas = RESEARCH_AREA_CHOICES
     
-    # Top 5 users with most recent messages (for sidebar - consistent with other pages)
-    from .models import Message
-    from user.models import Follow
-    
-    user = request.user if request.user.is_authenticated else None
-    top_message_users = []
-    
-    if user:
-        # Get users the current user follows
-        following_users = [f.following for f in Follow.objects.filter(follower=user).select_related('following')]
-        conversation_data = []
-        
-        for u in following_users:
-            last_msg = Message.objects.filter(
-                (Q(sender=user, recipient=u) | Q(sender=u, recipient=user))
-            ).order_by('-created_at').first()
-            conversation_data.append({
-                'user': u,
-                'last_message_time': last_msg.created_at if last_msg else None,
-            })
-        
-        import datetime
-        import pytz
-        
-        def to_naive_utc(dt):
-            if dt is None:
-                return datetime.datetime(1970, 1, 1)
-            if dt.tzinfo is not None:
-                return dt.astimezone(pytz.UTC).replace(tzinfo=None)
-            return dt
-        
-        conversation_data.sort(key=lambda c: to_naive_utc(c['last_message_time']), reverse=True)
-        top_message_users = [c['user'] for c in conversation_data[:5]]
-    
     return render(request, 'feed/produtos.html', {
         'products': products,
         'search_query': query,
         'area_filter': area_filter,
         'research_areas': research_areas,
         'form': form,
-        'top_message_users': top_message_users,
     })
 
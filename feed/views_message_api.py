@@ -1,57 +1,185 @@
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
-from .models import Message
+from .models import Message, Conversation
 from user.models import User
-from django.db import models
+from django.db import connection, transaction
 from django.http import HttpResponseBadRequest
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .conditional import collection_state, conditional
+from .utils import find_conversation_cursor, get_conversation_page, invalidate_sidebar
+from .message_events import notify_users
+from .message_search import highlight, search_messages
+
+
+def _serialize_message(m):
+    return {
+        'id': m.id,
+        'body': m.body,
+        'sender_id': m.sender_id,
+        'recipient_id': m.recipient_id,
+        'created_at': m.created_at.strftime('%Y-%m-%d %H:%M'),
+    }
 
 
 @login_required
 def send_message_api(request):
+    """
+    Send body to user_id, or to every id in user_ids (repeated or comma-separated) at once.
+    All recipients are validated in one query and the messages are inserted in one statement
+    (one per recipient on backends that cannot return the inserted ids, such as MySQL).
+    """
     if request.method != 'POST':
         return HttpResponseBadRequest('POST only')
-    user_id = request.POST.get('user_id')
     body = request.POST.get('body', '').strip()
-    if not user_id or not body:
+    raw_ids = request.POST.getlist('user_ids') or request.POST.getlist('user_id')
+    user_ids = [i.strip() for raw in raw_ids for i in raw.split(',') if i.strip()]
+    if not user_ids or not body:
         return JsonResponse({'error': 'user_id and body required'}, status=400)
-    try:
-        other_user = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
-        return JsonResponse({'error': 'User not found'}, status=404)
-    msg = Message.objects.create(sender=request.user, recipient=other_user, body=body)
-    return JsonResponse({'success': True, 'message': {
-        'id': msg.id,
-        'body': msg.body,
-        'sender_id': msg.sender_id,
-        'recipient_id': msg.recipient_id,
-        'created_at': msg.created_at.strftime('%Y-%m-%d %H:%M'),
-    }})
+    if not all(i.isdigit() for i in user_ids):
+        return JsonResponse({'error': 'Invalid user id'}, status=400)
+    user_ids = list(dict.fromkeys(int(i) for i in user_ids))
+    max_recipients = getattr(settings, 'MESSAGE_MAX_RECIPIENTS', 50)
+    if len(user_ids) > max_recipients:
+        return JsonResponse({'error': f'At most {max_recipients} recipients per message'}, status=400)
+
+    found = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+    missing = [i for i in user_ids if i not in found]
+    if missing:
+        return JsonResponse({'error': 'User not found', 'user_ids': missing}, status=404)
+
+    now = timezone.now()
+    messages = [Message(sender=request.user, recipient_id=i, body=body, created_at=now) for i in user_ids]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Message.objects.bulk_create(messages)
+        else:
+            # MySQL does not return the ids of bulk-inserted rows, and re-reading them by timestamp
+            # could also match a concurrent identical send: one INSERT per recipient instead
+            for message in messages:
+                message.save(force_insert=True)
+        Conversation.record_messages(messages)
+        # bulk_create sends no post_save, so the sidebar signal handler does not run
+        transaction.on_commit(lambda: invalidate_sidebar(request.user.id, *user_ids))
+        transaction.on_commit(lambda: notify_users(request.user.id, *user_ids))
+
+    if len(messages) == 1:
+        return JsonResponse({'success': True, 'message': _serialize_message(messages[0])})
+    return JsonResponse({'success': True, 'messages': [_serialize_message(m) for m in messages]})
+
+def _conversation_state(request):
+    user_id = request.GET.get('user_id')
+    if not user_id or not user_id.isdigit():
+        return None
+    rows, last = collection_state(
+        Message.objects.filter(Q(sender=request.user, recipient_id=user_id) | Q(sender_id=user_id, recipient=request.user)),
+        'created_at',
+    )
+    # The other user's name and picture are in the body too
+    profile = User.objects.filter(pk=user_id).values_list('updated_at', flat=True).first()
+    return (request.user.pk, sorted(request.GET.items()), rows, last, profile), last
+
 
 @login_required
+@conditional(_conversation_state)
 def get_messages_api(request):
+    """
+    Return one page of the conversation with user_id, oldest first.
+    Without a cursor the newest page is returned; since_id returns messages
+    newer than that message (polling) and before_id older ones ("load older").
+    """
     user_id = request.GET.get('user_id')
     if not user_id:
         return JsonResponse({'error': 'user_id required'}, status=400)
     try:
         other_user = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
+    except (User.DoesNotExist, ValueError):
         return JsonResponse({'error': 'User not found'}, status=404)
-    messages = Message.objects.filter(
-        (models.Q(sender=request.user, recipient=other_user) |
-         models.Q(sender=other_user, recipient=request.user))
-    ).order_by('created_at')
-    data = [
-        {
-            'id': m.id,
-            'body': m.body,
-            'sender_id': m.sender_id,
-            'recipient_id': m.recipient_id,
-            'created_at': m.created_at.strftime('%Y-%m-%d %H:%M'),
-        }
-        for m in messages
-    ]
-    return JsonResponse({'messages': data, 'user': {
-        'id': other_user.id,
-        'fullname': other_user.fullname,
-        'profile_picture_url': other_user.get_profile_picture_url(),
-    }})
+
+    max_page_size = getattr(settings, 'MESSAGES_PAGE_SIZE', 50)
+    try:
+        limit = min(int(request.GET.get('limit', max_page_size)), max_page_size)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+    limit = max(limit, 1)
+
+    if not request.GET.get('before_id'):
+        # Opening or polling the conversation means the user has seen it
+        Conversation.mark_read(request.user, other_user)
+    since_id = request.GET.get('since_id')
+    before_id = request.GET.get('before_id')
+    cursor = None
+    if since_id or before_id:
+        # The cursor message may already have been moved to the archive
+        try:
+            cursor = find_conversation_cursor(request.user, other_user, since_id or before_id)
+        except ValueError:
+            pass
+        if cursor is None:
+            return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    page, has_more = get_conversation_page(
+        request.user, other_user, limit,
+        after=cursor if since_id else None,
+        before=cursor if before_id else None,
+    )
+
+    return JsonResponse({
+        'messages': [_serialize_message(m) for m in page],
+        'has_more': has_more,
+        'oldest_id': page[0].id if page else None,
+        'newest_id': page[-1].id if page else None,
+        'user': {
+            'id': other_user.id,
+            'fullname': other_user.fullname,
+            'profile_picture_url': other_user.get_profile_picture_url(80),
+        },
+    })
+
+
+@login_required
+def mark_read_api(request):
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST only')
+    try:
+        other_user = User.objects.get(pk=request.POST.get('user_id'))
+    except (User.DoesNotExist, ValueError, TypeError):
+        return JsonResponse({'error': 'User not found'}, status=404)
+    Conversation.mark_read(request.user, other_user)
+    return JsonResponse({'success': True})
+
+
+@login_required
+def search_messages_api(request):
+    """
+    Full-text search over the current user's conversations, newest first.
+    Page further by passing the returned next_before_id as before_id.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q required'}, status=400)
+    before_id = request.GET.get('before_id')
+    if before_id and not before_id.isdigit():
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+
+    max_page_size = getattr(settings, 'MESSAGE_SEARCH_PAGE_SIZE', 20)
+    try:
+        limit = max(min(int(request.GET.get('limit', max_page_size)), max_page_size), 1)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer'}, status=400)
+
+    results, has_more = search_messages(request.user, query, limit, before_id=before_id)
+    data = []
+    for m in results:
+        other_user = m.recipient if m.sender_id == request.user.id else m.sender
+        data.append({
+            **_serialize_message(m),
+            'snippet': highlight(m.body, query),
+            'other_user': {'id': other_user.id, 'fullname': other_user.fullname},
+        })
+    return JsonResponse({
+        'results': data,
+        'has_more': has_more,
+        'next_before_id': results[-1].id if has_more else None,
+    })
@@ -0,0 +1,115 @@
+"""
+Push delivery of direct messages.
+
+message_stream is a Server-Sent Events endpoint meant to be served by the
+ASGI application (setup/asgi.py); one event loop can hold many idle
+connections. message_poll is the long-poll fallback for browsers without
+EventSource.
+
+Both only wait under ASGI. A WSGI worker (gunicorn's default sync workers)
+would be held for the whole wait, and notify_users() never reaches other
+worker processes anyway, so there message_stream answers 204 (EventSource
+then stops reconnecting) and message_poll returns at once. The mensagens
+page polls get_messages_api every MESSAGE_POLL_INTERVAL_SECONDS instead.
+"""
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.db.models import Max, Q
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+
+from .message_events import Subscription
+from .models import Message
+from .views_message_api import _serialize_message
+
+
+def can_wait(request):
+    """True when the request is served by the ASGI application, where waiting holds no worker"""
+    return isinstance(request, ASGIRequest)
+
+
+def _recheck_seconds():
+    return getattr(settings, 'MESSAGE_PUSH_RECHECK_SECONDS', 5)
+
+
+def _user_messages(user_id):
+    return Message.objects.filter(Q(sender_id=user_id) | Q(recipient_id=user_id))
+
+
+async def _messages_after(user_id, after_id, limit=50):
+    return [m async for m in _user_messages(user_id).filter(id__gt=after_id).order_by('id')[:limit]]
+
+
+async def _initial_cursor(request, user_id):
+    """Resume from since_id / Last-Event-ID, or start at the user's newest message"""
+    cursor = request.GET.get('since_id') or request.headers.get('Last-Event-ID')
+    if cursor and cursor.isdigit():
+        return int(cursor)
+    result = await _user_messages(user_id).aaggregate(last_id=Max('id'))
+    return result['last_id'] or 0
+
+
+@login_required
+async def message_stream(request):
+    """Stream every message sent or received by the current user as SSE events"""
+    if not can_wait(request):
+        # 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    user = await request.auser()
+    last_id = await _initial_cursor(request, user.id)
+    max_seconds = getattr(settings, 'MESSAGE_STREAM_MAX_SECONDS', 300)
+    keepalive_seconds = getattr(settings, 'MESSAGE_STREAM_KEEPALIVE_SECONDS', 15)
+
+    async def events():
+        nonlocal last_id
+        started = last_write = time.monotonic()
+        # Browsers reconnect on their own (sending Last-Event-ID) when the stream ends
+        yield 'retry: 3000\n\n'
+        with Subscription(user.id) as subscription:
+            while time.monotonic() - started < max_seconds:
+                messages = await _messages_after(user.id, last_id)
+                for m in messages:
+                    last_id = m.id
+                    yield f'id: {m.id}\nevent: message\ndata: {json.dumps(_serialize_message(m))}\n\n'
+                if messages:
+                    last_write = time.monotonic()
+                    continue
+                await subscription.wait(_recheck_seconds())
+                if time.monotonic() - last_write >= keepalive_seconds:
+                    last_write = time.monotonic()
+                    yield ': keepalive\n\n'
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+async def message_poll(request):
+    """
+    Long-poll: return as soon as there are messages newer than since_id, or after the timeout.
+    Under WSGI it never waits (see the module docstring).
+    """
+    user = await request.auser()
+    last_id = await _initial_cursor(request, user.id)
+    timeout = getattr(settings, 'MESSAGE_POLL_TIMEOUT_SECONDS', 25) if can_wait(request) else 0
+    deadline = time.monotonic() + timeout
+
+    with Subscription(user.id) as subscription:
+        messages = await _messages_after(user.id, last_id)
+        while not messages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await subscription.wait(min(_recheck_seconds(), remaining))
+            messages = await _messages_after(user.id, last_id)
+
+    return JsonResponse({
+        'messages': [_serialize_message(m) for m in messages],
+        'last_id': messages[-1].id if messages else last_id,
+    })
@@ -0,0 +1,106 @@
+from django import forms
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseBadRequest, JsonResponse
+
+from .forms import validate_media_file
+from .upload_models import UploadSession
+from .uploads import append_chunk, chunk_size, discard_upload, finish_upload, start_upload
+
+
+def _serialize_upload(session):
+    return {
+        'upload_id': str(session.pk),
+        'offset': session.offset,
+        'size': session.size,
+        'status': session.status,
+        'chunk_size': chunk_size(),
+    }
+
+
+def _user_upload(request, upload_id):
+    return UploadSession.objects.filter(pk=upload_id, user=request.user).first()
+
+
+_NOT_FOUND = {'error': 'Upload not found'}
+
+
+@login_required
+def start_upload_api(request):
+    """
+    Start a chunked upload of one media file: filename, size, content_type and optionally the
+    sha256 checksum of the whole file. The chunks then go to upload_chunk_api.
+    """
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST only')
+    filename = request.POST.get('filename', '').strip()
+    size = request.POST.get('size', '')
+    content_type = request.POST.get('content_type', '')
+    checksum = request.POST.get('checksum', '').strip()
+    if not filename or not size.isdigit() or int(size) < 1:
+        return JsonResponse({'error': 'filename and size required'}, status=400)
+    if checksum and (len(checksum) != 64 or any(c not in '0123456789abcdefABCDEF' for c in checksum)):
+        return JsonResponse({'error': 'checksum must be a sha256 hex digest'}, status=400)
+    try:
+        validate_media_file(filename, int(size), content_type)
+    except forms.ValidationError as e:
+        return JsonResponse({'error': e.messages[0]}, status=400)
+
+    # Each session reserves staging disk space until it is used or expires
+    max_sessions = getattr(settings, 'UPLOAD_MAX_ACTIVE_SESSIONS', 20)
+    if UploadSession.objects.filter(user=request.user).count() >= max_sessions:
+        return JsonResponse({'error': 'Muitos envios em andamento. Publique ou cancele os atuais.'}, status=429)
+
+    session = start_upload(request.user, filename, int(size), content_type, checksum)
+    return JsonResponse(_serialize_upload(session), status=201)
+
+
+@login_required
+def upload_status_api(request, upload_id):
+    """Where an interrupted upload resumes: the number of bytes already stored"""
+    session = _user_upload(request, upload_id)
+    if session is None:
+        return JsonResponse(_NOT_FOUND, status=404)
+    return JsonResponse(_serialize_upload(session))
+
+
+@login_required
+def upload_chunk_api(request, upload_id):
+    """
+    Store the raw request body at byte X-Upload-Offset of the upload. The offset must be the one
+    the server has (409 with the right one otherwise); the last chunk triggers checksum verification.
+    """
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST only')
+    session = _user_upload(request, upload_id)
+    if session is None:
+        return JsonResponse(_NOT_FOUND, status=404)
+    if session.status != UploadSession.UPLOADING:
+        return JsonResponse(_serialize_upload(session), status=409)
+
+    offset = request.headers.get('X-Upload-Offset', '')
+    length = request.META.get('CONTENT_LENGTH', '')
+    if not offset.isdigit() or not length.isdigit():
+        return JsonResponse({'error': 'X-Upload-Offset and Content-Length required'}, status=400)
+    offset, length = int(offset), int(length)
+    if offset != session.offset:
+        return JsonResponse(_serialize_upload(session), status=409)
+    if length > chunk_size() or offset + length > session.size:
+        return JsonResponse({'error': f'Chunks are at most {chunk_size()} bytes and end at the file size'}, status=400)
+
+    # Read from the request stream piece by piece: the body is never loaded whole
+    append_chunk(session, offset, request, length)
+    if session.offset == session.size and not finish_upload(session):
+        return JsonResponse({**_serialize_upload(session), 'error': 'Checksum não confere; envie o arquivo novamente.'}, status=422)
+    return JsonResponse(_serialize_upload(session))
+
+
+@login_required
+def cancel_upload_api(request, upload_id):
+    if request.method != 'POST':
+        return HttpResponseBadRequest('POST only')
+    session = _user_upload(request, upload_id)
+    if session is None:
+        return JsonResponse(_NOT_FOUND, status=404)
+    discard_upload(session)
+    return JsonResponse({'success': True})
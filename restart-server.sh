@@ -48,6 +48,9 @@ python manage.py collectstatic --noinput
 print_status "Restarting Gunicorn via Supervisor..."
  systemctl restart innovasus
 
+print_status "Restarting background job worker..."
+systemctl restart innovasus-jobs || print_warning "innovasus-jobs not installed: set JOB_QUEUE_EAGER=true or install it (deploy-hostinger.sh)"
+
 print_status "Restarting Nginx..."
 sudo systemctl restart nginx
 
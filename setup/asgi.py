@@ -3,6 +3,11 @@ ASGI config for setup project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve it to enable push delivery of direct messages (Server-Sent Events at
+/feed/mensagens/api/stream/), e.g.:
+
+    gunicorn setup.asgi:application -k uvicorn.workers.UvicornWorker
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,10 +11,22 @@ from django.shortcuts import redirect
 logger = logging.getLogger(__name__)
 
 
+def is_background_request(request):
+    """
+    Requests a page makes on its own (message polling, an EventSource stream) rather than because
+    the user did something. They must not count as activity, or an open inbox would never time out.
+    """
+    return (
+        request.headers.get('X-Background-Request') == '1'
+        or 'text/event-stream' in request.headers.get('Accept', '')
+    )
+
+
 class InactivityLogoutMiddleware:
     """
     Logs out authenticated users after a period of inactivity.
     Configure timeout in settings: INACTIVITY_TIMEOUT_SECONDS (default 1800 = 30m).
+    Background requests (is_background_request) are checked but do not count as activity.
     """
     
     def __init__(self, get_response):
@@ -51,9 +63,10 @@ class InactivityLogoutMiddleware:
             else:
                 logger.debug(f"First request for user {request.user.id}, setting last_activity")
             
-            # Update last activity timestamp on every authenticated request
-            request.session['last_activity'] = now_ts
-            request.session.save()  # Force save session
+            # Update last activity timestamp on every authenticated request the user made
+            if request.user.is_authenticated and not is_background_request(request):
+                request.session['last_activity'] = now_ts
+                request.session.save()  # Force save session
         
         response = self.get_response(request)
         return response
\ No newline at end of file
@@ -65,6 +65,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'feed.context_processors.unread_messages',
+                'feed.context_processors.sidebar',
             ],
         },
     },
@@ -139,7 +141,7 @@ MEDIA_URL = "/media/"
 
 # Accept files up to 100MB for example
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100 * 1024 * 1024
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # larger files sent with a form are spooled to disk, not kept in RAM
 
 
 # Duplicate session settings removed - see configuration below
@@ -200,3 +202,98 @@ LOGGING = {
         },
     },
 }
+
+# Direct messages: maximum number of messages returned per get_messages_api page
+MESSAGES_PAGE_SIZE = 50
+# Recipients per send_message_api request (user_ids)
+MESSAGE_MAX_RECIPIENTS = 50
+
+# Push delivery (feed/views_message_stream.py), only when served by the ASGI app (setup/asgi.py)
+MESSAGE_STREAM_MAX_SECONDS = 300        # SSE connections are closed and re-opened by the browser after this
+MESSAGE_STREAM_KEEPALIVE_SECONDS = 15
+MESSAGE_POLL_TIMEOUT_SECONDS = 25       # long-poll fallback
+MESSAGE_POLL_INTERVAL_SECONDS = 10      # under WSGI the open conversation polls get_messages_api this often
+MESSAGE_PUSH_RECHECK_SECONDS = 5        # waiting views recheck the DB for messages stored by other workers
+
+# Cold storage (feed/archive_models.py, run `python manage.py archive_messages` from cron)
+MESSAGE_ARCHIVE_AFTER_DAYS = 180        # read direct and community messages older than this leave the hot tables
+MESSAGE_ARCHIVE_BATCH_SIZE = 1000       # rows moved per transaction
+COMMUNITY_ARCHIVE_PAGE_SIZE = 50        # archived community messages shown per "Ver mensagens antigas" page
+
+# Right sidebar cache (feed.context_processors.sidebar). Signals delete an entry when the sidebar changes,
+# which only reaches every worker through a shared CACHES backend (Redis, Memcached, database...), so
+# the sidebar is only cached with one; with the default per-process LocMemCache it is queried each time.
+SIDEBAR_CACHE_SECONDS = 300
+
+# Direct message search (feed/message_search.py): results per search_messages_api page
+MESSAGE_SEARCH_PAGE_SIZE = 20
+
+# Tradução feed: cards per page (first render and each media_feed_api page)
+MEDIA_FEED_PAGE_SIZE = 10
+
+# Paid media access (feed/media_access.py): lifetime of a user's cached set of granted posts. Only cached
+# with a shared CACHES backend; with the per-process LocMemCache the set is read from the database.
+MEDIA_ACCESS_CACHE_SECONDS = 3600
+
+# Like buffer for viral posts: when True, toggle_media_like appends to PendingMediaLike instead of writing
+# MediaLike and the post's like_count; run `manage.py flush_media_likes --every 5` to apply the buffer.
+MEDIA_LIKE_BUFFER = False
+
+# Media post comments: comments (or replies) per get_media_comments page
+MEDIA_COMMENTS_PAGE_SIZE = 20
+
+# Rendered media cards (feed.utils.render_media_cards): lifetime of a cached card. Entries are keyed by
+# MediaPost.render_version, so edits never show stale HTML; this only bounds how long unused cards linger.
+MEDIA_CARD_CACHE_SECONDS = 3600
+
+# Uploaded file metadata (feed/file_metadata.py): lifetime of a cached StoredFile lookup
+FILE_METADATA_CACHE_SECONDS = 3600
+# ... and of a name without a row yet, which another worker may record at any time
+FILE_METADATA_MISS_CACHE_SECONDS = 60
+
+# Image derivatives (feed/images.py): widths in px written at upload, per kind. Avatars (profile and
+# community pictures) are cropped square; media images keep their ratio and are never enlarged.
+IMAGE_DERIVATIVE_SIZES = {
+    'avatar': [40, 80, 120, 240],
+    'media': [640, 1280],
+}
+
+# Background jobs (feed/jobs.py), run by `manage.py run_jobs`. A failed job is retried after
+# JOB_RETRY_BASE_SECONDS, doubling each time up to JOB_RETRY_MAX_SECONDS, JOB_MAX_ATTEMPTS times in all;
+# a job locked for longer than JOB_LOCK_TIMEOUT_SECONDS is taken over (its worker died).
+# JOB_QUEUE_EAGER runs each job right after its request commits, for local development without a worker
+# (video transcoding still waits for run_jobs); deployments run run_jobs and turn it off (Procfile,
+# deploy-hostinger.sh's innovasus-jobs.service).
+JOB_QUEUE_EAGER = True
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 30
+JOB_RETRY_MAX_SECONDS = 3600
+JOB_LOCK_TIMEOUT_SECONDS = 600
+JOB_RETENTION_DAYS = 7
+
+# Chunked media uploads (feed/uploads.py): bytes per chunk, staging directory on local disk (default
+# <FILE_UPLOAD_TEMP_DIR or system temp>/chunked_uploads, shared by the web workers), how long an
+# upload not attached to a post is kept, and how many unfinished or unused uploads a user may have.
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+UPLOAD_STAGING_DIR = None
+UPLOAD_SESSION_TTL_SECONDS = 24 * 3600
+UPLOAD_MAX_ACTIVE_SESSIONS = 20
+
+# Protected files (feed/protected_media.py): how media post originals reach viewers who pass the access
+# check: 'django' (streamed here, with Range), 'x-accel' (nginx internal location at
+# PROTECTED_MEDIA_INTERNAL_PREFIX), 'x-sendfile' (Apache), or 'signed' (redirect to an expiring nginx
+# secure_link URL under PROTECTED_MEDIA_SIGNED_PREFIX, valid PROTECTED_MEDIA_URL_TTL seconds).
+PROTECTED_MEDIA_BACKEND = 'django'
+PROTECTED_MEDIA_INTERNAL_PREFIX = '/protected-media/'
+PROTECTED_MEDIA_SIGNED_PREFIX = '/signed-media/'
+PROTECTED_MEDIA_SIGNING_KEY = os.environ.get('PROTECTED_MEDIA_SIGNING_KEY', '')
+PROTECTED_MEDIA_URL_TTL = 300
+
+# Video renditions (feed/videos.py): the ffmpeg run by the transcode_video job, the largest width of the
+# web MP4 and its poster, the H.264 quality (CRF: lower is better and bigger) and how long ffmpeg may take
+# for one video, both runs together (keep it well under JOB_LOCK_TIMEOUT_SECONDS: copying and saving the
+# files count too, and past the lock another worker takes the job over). A run that times out is retried.
+FFMPEG_BINARY = 'ffmpeg'
+VIDEO_RENDITION_MAX_WIDTH = 1280
+VIDEO_RENDITION_CRF = 23
+VIDEO_TRANSCODE_TIMEOUT_SECONDS = 480
@@ -64,6 +64,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'feed.context_processors.unread_messages',
+                'feed.context_processors.sidebar',
             ],
         },
     },
@@ -161,7 +163,7 @@ LOGIN_REDIRECT_URL = '/artigos/'
 LOGOUT_REDIRECT_URL = '/register/'
 
 # File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # larger files are spooled to disk; media posts upload in chunks
 DATA_UPLOAD_MAX_MEMORY_SIZE = 104857600  # 100MB
 
 # Logging configuration
@@ -210,4 +212,12 @@ SESSION_SAVE_EVERY_REQUEST = False       # Don't extend session on every request
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False  # Keep session when browser closes
 SESSION_COOKIE_HTTPONLY = True           # Prevent JavaScript access to session cookie
 SESSION_COOKIE_SECURE = True             # Use HTTPS in production
-SESSION_COOKIE_SAMESITE = 'Lax'         # CSRF protection
\ No newline at end of file
+SESSION_COOKIE_SAMESITE = 'Lax'         # CSRF protection
+
+# Background jobs (feed/jobs.py): deploy-hostinger.sh runs `manage.py run_jobs` as innovasus-jobs.service.
+# Without that worker set JOB_QUEUE_EAGER=true, or e-mails and upload processing never run.
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER', 'False').lower() == 'true'
+
+# Paid media originals (feed/protected_media.py): after the access check nginx sends the file from its
+# internal /protected-media/ location (deploy-hostinger.sh), and /media/media_posts/ is not served
+PROTECTED_MEDIA_BACKEND = os.environ.get('PROTECTED_MEDIA_BACKEND', 'x-accel')
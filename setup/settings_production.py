@@ -69,6 +69,14 @@ else:
     STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
     STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# PROTECTED MEDIA: nginx sends access-checked files from its internal /protected-media/ location
+# (see HOSTINGER_DEPLOYMENT_GUIDE.md); files on S3 are streamed by Django
+PROTECTED_MEDIA_BACKEND = env('PROTECTED_MEDIA_BACKEND', default='django' if USE_S3 else 'x-accel')
+
+# BACKGROUND JOBS: run by a `manage.py run_jobs` worker (the Procfile's worker, see feed/jobs.py), not in
+# the request; JOB_QUEUE_EAGER=true runs them in the web process for a deploy without one
+JOB_QUEUE_EAGER = env.bool('JOB_QUEUE_EAGER', default=False)
+
 # SECURITY SETTINGS
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
@@ -65,6 +65,9 @@ class FeedVideoHandler {
     // Add click-to-seek functionality
     this.addClickToSeek(video);
 
+    // Load feed videos (preload="none", showing their poster) only when wanted
+    this.addLazyLoading(video);
+
     console.log("Enhanced video:", video.src || video.currentSrc);
   }
 
@@ -136,6 +139,29 @@ class FeedVideoHandler {
     });
   }
 
+  addLazyLoading(video) {
+    if (video.preload !== "none") return;
+
+    // A pointer over the video or focus on it: fetch the metadata so playing starts sooner
+    const warmUp = () => {
+      if (video.preload === "none") {
+        video.preload = "metadata";
+      }
+    };
+    ["pointerenter", "touchstart", "focus"].forEach((type) =>
+      video.addEventListener(type, warmUp, { once: true, passive: true })
+    );
+
+    // Once played, buffer ahead like any video
+    video.addEventListener(
+      "play",
+      () => {
+        video.preload = "auto";
+      },
+      { once: true }
+    );
+  }
+
   addKeyboardControls(video) {
     video.addEventListener("keydown", (e) => {
       // Only handle if video is focused
@@ -222,7 +248,10 @@ class FeedVideoHandler {
         video.currentTime = clampedTime;
         console.log("Seeked to:", clampedTime.toFixed(2), "seconds");
       } else {
-        // Wait for metadata and try again
+        // Wait for metadata (fetching it if the video was not loaded yet) and try again
+        if (video.preload === "none") {
+          video.preload = "metadata";
+        }
         video.addEventListener(
           "loadedmetadata",
           () => {
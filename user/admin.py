@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import User
 from .forms import CustomUserCreationForm, CustomUserChangeForm
-from django.core.mail import send_mail
+from feed.jobs import enqueue
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str    
@@ -75,11 +75,13 @@ class UserVerificationAdmin(admin.ModelAdmin):
                 reverse("user:auto_login", args=[uidb64, token])
             )
             
-            send_mail(
-                "Sua conta foi aprovada!",
-                f"Parabéns, {user.fullname}! Sua conta foi aprovada.\n\nClique no link abaixo para acessar sua conta:\n\n{login_url}\n\nO link expira em 24 horas.",
-                settings.EMAIL_HOST_USER,
-                [user.email],
+            # Sent by the job worker, so approving many users does not wait on SMTP
+            enqueue(
+                'send_email',
+                key=f'approval-email:{verification.pk}:{token}',
+                subject="Sua conta foi aprovada!",
+                message=f"Parabéns, {user.fullname}! Sua conta foi aprovada.\n\nClique no link abaixo para acessar sua conta:\n\n{login_url}\n\nO link expira em 24 horas.",
+                recipient_list=[user.email],
             )
         self.message_user(request, "Usuários aprovados e links de acesso enviados.")
 
@@ -87,11 +89,12 @@ class UserVerificationAdmin(admin.ModelAdmin):
         for verification in queryset:
             verification.status = "REJECTED"
             verification.save()
-            send_mail(
-                "Sua verificação foi rejeitada",
-                "Infelizmente seu cadastro não foi aprovado. Revise o link enviado ou contate o suporte.",
-                settings.EMAIL_HOST_USER,
-                [verification.user.email],
+            enqueue(
+                'send_email',
+                key=f'rejection-email:{verification.pk}',
+                subject="Sua verificação foi rejeitada",
+                message="Infelizmente seu cadastro não foi aprovado. Revise o link enviado ou contate o suporte.",
+                recipient_list=[verification.user.email],
             )
         self.message_user(request, "Usuários rejeitados e aviso enviado.")
 
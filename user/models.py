@@ -51,20 +51,16 @@ class User(AbstractUser):
         blank=True,
         null=True,    
     )
+    # Moves when the profile is saved (name, picture...) or its picture's derivatives are written
+    # (feed/images.py bump_cards); part of the ETags of responses that show the user
+    updated_at = models.DateTimeField(auto_now=True)
 
-    def get_profile_picture_url(self):
-        if self.profile_picture:
-            # Check if the file actually exists on disk
-            try:
-                if self.profile_picture.storage.exists(self.profile_picture.name):
-                    return self.profile_picture.url
-                else:
-                    # File doesn't exist (maybe moved to iCloud), return default
-                    return settings.STATIC_URL + "assets/img/no_pic.jpg"
-            except:
-                # Any error accessing the file, return default
-                return settings.STATIC_URL + "assets/img/no_pic.jpg"
-        return settings.STATIC_URL + "assets/img/no_pic.jpg"
+    def get_profile_picture_url(self, size=None):
+        # Existence comes from the metadata recorded at upload, not from the storage;
+        # size picks a square WebP derivative at least that many px wide (feed/images.py)
+        from feed.images import image_url
+
+        return image_url(self.profile_picture, size) or settings.STATIC_URL + "assets/img/no_pic.jpg"
     
     email_verified = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)  # Change default to False
@@ -1,7 +1,7 @@
 from django.db.models.signals import pre_save, post_delete
 from django.dispatch import receiver
 from .models import User
-import os
+from feed.jobs import enqueue
 
 # Delete old profile picture when updated
 @receiver(pre_save, sender=User)
@@ -16,13 +16,12 @@ def auto_delete_old_profile_pic_on_change(sender, instance, **kwargs):
 
     new_pic = instance.profile_picture
     if old_pic and old_pic != new_pic:
-        if os.path.isfile(old_pic.path):
-            os.remove(old_pic.path)
+        # Removed by the job worker once the save is committed (feed/tasks.py)
+        enqueue('delete_upload', key=f'delete:{old_pic.name}', requeue=True, name=old_pic.name)
 
 
 # Delete profile picture from disk if user deleted
 @receiver(post_delete, sender=User)
 def auto_delete_profile_pic_on_delete(sender, instance, **kwargs):
     if instance.profile_picture:
-        if os.path.isfile(instance.profile_picture.path):
-            os.remove(instance.profile_picture.path)
+        enqueue('delete_upload', key=f'delete:{instance.profile_picture.name}', requeue=True, name=instance.profile_picture.name)
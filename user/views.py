@@ -6,7 +6,7 @@ from .forms import ProfilePictureForm
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.contrib.auth import get_user_model, authenticate, login, logout
 from django.urls import reverse
-from django.core.mail import send_mail
+from feed.jobs import enqueue
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.auth.tokens import default_token_generator, PasswordResetTokenGenerator
@@ -89,7 +89,7 @@ def register(request):
                     reverse('user:verify_email', kwargs={'uidb64': uid, 'token': token})
                 )
                 
-                # Send email verification to user directly
+                # Email verification for the user
                 subject = "InnovaSus - Verifique seu email para ativar sua conta"
                 message = f"""
 Olá {user.fullname},
@@ -108,70 +108,23 @@ Atenciosamente,
 Equipe InnovaSus
                 """
                 
-                try:
-                    # Debug email settings
-                    print(f"📧 Attempting to send email:")
-                    print(f"   From: {settings.EMAIL_HOST_USER}")
-                    print(f"   To: {user.email}")
-                    print(f"   Host: {settings.EMAIL_HOST}:{settings.EMAIL_PORT}")
-                    print(f"   Password set: {bool(settings.EMAIL_HOST_PASSWORD)}")
-                    
-                    send_mail(
-                        subject=subject,
-                        message=message,
-                        from_email=settings.EMAIL_HOST_USER,
-                        recipient_list=[user.email],
-                        fail_silently=False
-                    )
-                    print("✅ Email sent successfully!")
-                    
-                    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                        return JsonResponse({
-                            'success': True, 
-                            'message': 'Cadastro realizado! Verifique seu email para ativar sua conta.'
-                        })
-                    messages.success(request, 'Cadastro realizado com sucesso! Verifique seu email para ativar sua conta.')
-                    return redirect('user:register')
-                    
-                except Exception as e:
-                    # Log detailed error information
-                    print(f"❌ Email sending failed: {str(e)}")
-                    print(f"   Error type: {type(e).__name__}")
-                    import traceback
-                    print(f"   Traceback: {traceback.format_exc()}")
-                    
-                    # TEMPORARY: Auto-activate user if email fails (for testing)
-                    # TODO: Remove this in production and fix email issue
-                    if 'test' in str(e).lower() or 'smtp' in str(e).lower():
-                        print("🔧 Auto-activating user due to email failure...")
-                        user.is_active = True
-                        user.email_verified = True
-                        user.save()
-                        verification.status = "APPROVED"
-                        verification.save()
-                        
-                        warning_msg = 'Cadastro realizado! (Email temporariamente indisponível - conta ativada automaticamente)'
-                        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                            return JsonResponse({
-                                'success': True, 
-                                'message': warning_msg
-                            })
-                        messages.warning(request, warning_msg)
-                        return redirect('user:register')
-                    
-                    # Delete the user if email sending fails
-                    user.delete()
-                    if verification:
-                        verification.delete()
-                    
-                    error_msg = f'Erro ao enviar email de verificação: {str(e)}'
-                    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                        return JsonResponse({
-                            'success': False, 
-                            'message': error_msg
-                        }, status=500)
-                    messages.error(request, error_msg)
-                    return redirect('user:register')
+                # Sent by the job worker (feed/tasks.py), so the response does not wait on SMTP;
+                # failures are retried there with backoff instead of undoing the registration
+                enqueue(
+                    'send_email',
+                    key=f'verify-email:{user.pk}',
+                    subject=subject,
+                    message=message,
+                    recipient_list=[user.email],
+                )
+
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({
+                        'success': True, 
+                        'message': 'Cadastro realizado! Verifique seu email para ativar sua conta.'
+                    })
+                messages.success(request, 'Cadastro realizado com sucesso! Verifique seu email para ativar sua conta.')
+                return redirect('user:register')
             # Form invalid → return all errors
             errors = [e for field in register_form.errors.values() for e in field]
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':